@@ -1,4 +1,6 @@
 # app.py (VERSÃO COMPLETA COM KPIs AVANÇADOS)
+import os
+import logging
 import numpy as np
 import streamlit as st
 import pandas as pd
@@ -6,17 +8,38 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from dateutil.relativedelta import relativedelta
-from src.config.data_provider import get_data
+from src.config.data_provider import get_anos_disponiveis, get_data, obter_perfil_pipeline, PAINEL_ADMIN
+from src.config.base_painel import (
+    obter_base_painel, obter_linhas, obter_outliers_periodo, obter_relatorio_memoria, limpar_base_painel
+)
+from src.config.monthly_cube import recortar_cubo
+from src.config.page_cache import chave_memo, memorizar, limpar_memo, estatisticas_memo
+from src.config.cache_warmup import estado_aquecimento
+from src.config.series_mensais import limpar_series
+from src.config.outlier_engine import SEGMENTOS_OUTLIER, outliers_do_segmento, recortar_outliers
+from src.config.render_timing import iniciar_pagina, finalizar_pagina, obter_tempos_pagina, plotly_chart
 from calculations import (
+    aplicar_estilos_globais,
     exibir_dashboard_executivo,
-    calcular_kpis_performance,
+    obter_kpis_performance,
     exibir_kpis_em_cartoes,
     exibir_graficos_performance_avancados,
     exibir_tendencias_mensais,
     exibir_kpis_operacionais_visao_geral
 )
+
+# Log estruturado do pipeline de dados (perfil das etapas) no console do servidor
+logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s')
+logging.getLogger('src.config').setLevel(os.getenv('NIVEL_LOG', 'INFO').upper())
+
+aplicar_estilos_globais()
+
 if st.button("🗑️ Limpar Cache"):
     st.cache_data.clear()
+    get_data.clear()  # dataset compartilhado (cache_resource)
+    limpar_base_painel()  # cubo, série mensal e recortes lidos do banco (FONTE_DADOS=sql)
+    limpar_memo()  # agregados e figuras das páginas
+    limpar_series()  # séries mensais reaproveitadas entre versões dos dados
     st.rerun()
     
 st.set_page_config(page_title="Dashboard FKM Gritsch", layout="wide", page_icon="🚚")      
@@ -24,15 +47,71 @@ st.set_page_config(page_title="Dashboard FKM Gritsch", layout="wide", page_icon=
         
 # --- CARREGAMENTO E FILTROS APRIMORADOS ---
 with st.spinner('🔄 Analisando dados da frota... Por favor, aguarde.'):
-    df = get_data()
-    # ADICIONAR ESTA LINHA:
-    df = df[df['ano'] == 2025] if not df.empty else df
+    anos_com_dados = get_anos_disponiveis()
     
-if not df.empty:
-    # Preparação dos dados
-    df['custo_combustivel_total'] = df['custo_combustivel'] + df['custo_arla']
-    df['custo_frota_total'] = df['valor'] + df['custo_combustivel_total']
+if anos_com_dados:
+    # Header principal
+    st.title("🚛 Dashboard FKM Gritsch - Controle de Frota")
+    st.markdown("Sistema Integrado de Gestão e Análise de Custos")
     
+    # Filtros aprimorados
+    with st.expander("🔍 Filtros Avançados de Análise", expanded=True):
+        col1, col2, col3, col4,  = st.columns(4)
+
+        with col1:
+            # Abre no ano mais recente
+            anos_disponiveis = ['Todos'] + sorted(anos_com_dados, reverse=True)
+            ano_selecionado = st.selectbox("📅 Ano", options=anos_disponiveis, index=1)
+
+    # Carrega só os anos necessários: o selecionado e o anterior (mês anterior de
+    # janeiro e janelas de 3/6/12 meses); "Todos" carrega o histórico inteiro
+    anos_carregados = None if ano_selecionado == 'Todos' else (ano_selecionado - 1, ano_selecionado)
+    with st.spinner('🔄 Analisando dados da frota... Por favor, aguarde.'):
+        base = obter_base_painel(anos_carregados)
+    if base is None:
+        st.stop()
+
+    versao = base.versao
+    opcoes = base.indice['opcoes']
+
+    mes_selecionado = 'Todos'
+    with col2:
+        if ano_selecionado != 'Todos':
+            meses_disponiveis = ['Todos'] + opcoes['meses_por_ano'].get(ano_selecionado, [])
+            mes_selecionado = st.selectbox("📆 Mês", options= meses_disponiveis)
+    
+    with col3:
+        regioes_disponiveis = ['Todos'] + opcoes['regioes']
+        regiao_selecionada = st.selectbox("🌍 Região", options=regioes_disponiveis)
+    
+    with col4:
+        if regiao_selecionada != 'Todos':
+            filiais_disponiveis = ['Todos'] + opcoes['filiais_por_regiao'].get(regiao_selecionada, [])
+            filial_selecionada = st.selectbox("🏢 Filial", options=filiais_disponiveis)
+        else:
+            filiais_disponiveis = ['Todos'] + opcoes['filiais']
+            filial_selecionada = st.selectbox("🏢 Filial", options=filiais_disponiveis)
+
+    # Aplicação dos filtros: posições pré-calculadas sobre o dataset em memória (sem
+    # cópia quando não há filtro) ou, com FONTE_DADOS=sql, só as linhas do recorte lidas do banco
+    filtros = {
+        'ano': ano_selecionado,
+        'mes_ano': mes_selecionado,
+        'regiao': regiao_selecionada,
+        'filial': filial_selecionada,
+    }
+    with st.spinner('🔄 Analisando dados da frota... Por favor, aguarde.'):
+        df_filtrado = obter_linhas(base, anos_carregados, filtros)
+    if df_filtrado is None:
+        st.stop()
+
+    # Cubo mensal pré-agregado (uma vez por versão dos dados) e seu recorte pelos filtros
+    cubo = base.cubo
+    cubo_filtrado = recortar_cubo(cubo, filtros)
+    chave_filtros = chave_memo(versao, filtros)
+    # KPIs de performance usam o histórico inteiro: dependem só do ano e do mês
+    chave_periodo = chave_memo(versao, {'ano': ano_selecionado, 'mes_ano': mes_selecionado})
+
     # Sidebar aprimorada
     with st.sidebar:
         st.title("🚛 FKM Gritsch")
@@ -46,50 +125,41 @@ if not df.empty:
         # Adicionar informações do sistema
         st.markdown("---")
         st.markdown("### 📈 Resumo Geral")
-        st.info(f"**Total de Registros:** {len(df):,}\n\n**Período:** {df['ano'].min()} - {df['ano'].max()}\n\n**Última Atualização:** {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M')}")
+        st.info(f"**Total de Registros:** {base.total_registros:,}\n\n**Período:** {base.ano_min} - {base.ano_max}\n\n**Última Atualização:** {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M')}")
+
+        # Memória ocupada pelo dataset (dimensões categóricas vs. o equivalente em texto)
+        with st.expander("🧠 Uso de Memória"):
+            relatorio_memoria = obter_relatorio_memoria(base, anos_carregados, df_filtrado, chave_filtros)
+            memoria_total = relatorio_memoria['Memória (MB)'].sum()
+            memoria_texto = relatorio_memoria['Como Texto (MB)'].sum()
+            st.metric("Dataset em Memória", f"{memoria_total:,.1f} MB",
+                      f"-{memoria_texto - memoria_total:,.1f} MB vs. texto", delta_color="inverse")
+            st.dataframe(relatorio_memoria, hide_index=True,
+                        column_config={
+                            "Memória (MB)": st.column_config.NumberColumn(format="%.2f"),
+                            "Como Texto (MB)": st.column_config.NumberColumn(format="%.2f")
+                        })
+
+        # Painel de administração: perfil das etapas do último processamento da planilha
+        if PAINEL_ADMIN:
+            with st.expander("🛠️ Perfil do Pipeline"):
+                perfil = obter_perfil_pipeline()
+                if perfil.empty:
+                    st.caption("Nenhum processamento da planilha neste processo (dados lidos do snapshot).")
+                else:
+                    st.metric("Tempo nas Etapas", f"{perfil['segundos'].sum():,.2f} s")
+                    st.dataframe(perfil, hide_index=True,
+                                column_config={
+                                    "etapa": "Etapa",
+                                    "chamadas": "Chamadas",
+                                    "segundos": st.column_config.NumberColumn("Tempo (s)", format="%.3f"),
+                                    "linhas_entrada": st.column_config.NumberColumn("Linhas (entrada)", format="%d"),
+                                    "linhas_saida": st.column_config.NumberColumn("Linhas (saída)", format="%d"),
+                                    "memoria_mb": st.column_config.NumberColumn("Δ Memória (MB)", format="%.2f")
+                                })
+            # Preenchido no fim do script, depois que a página foi desenhada
+            painel_tempos = st.empty()
 
-    # Header principal
-    st.title("🚛 Dashboard FKM Gritsch - Controle de Frota")
-    st.markdown("Sistema Integrado de Gestão e Análise de Custos")
-    
-    # Filtros aprimorados
-    with st.expander("🔍 Filtros Avançados de Análise", expanded=True):
-        col1, col2, col3, col4,  = st.columns(4)
-        
-        with col1:
-            anos_disponiveis = ['Todos'] + sorted(df['ano'].unique().tolist(), reverse=True)
-            ano_selecionado = st.selectbox("📅 Ano", options=anos_disponiveis)
-        
-        mes_selecionado = 'Todos'
-        with col2:
-            if ano_selecionado != 'Todos':
-                df_ano_filtrado = df[df['ano'] == ano_selecionado]
-                meses_disponiveis = ['Todos'] + sorted(df_ano_filtrado['mes_ano'].unique().tolist())
-                mes_selecionado = st.selectbox("📆 Mês", options= meses_disponiveis)
-        
-        with col3:
-            regioes_disponiveis = ['Todos'] + sorted(df['regiao'].unique().tolist())
-            regiao_selecionada = st.selectbox("🌍 Região", options=regioes_disponiveis)
-        
-        with col4:
-            if regiao_selecionada != 'Todos':
-                df_regiao_filtrada = df[df['regiao'] == regiao_selecionada]
-                filiais_disponiveis = ['Todos'] + sorted(df_regiao_filtrada['filial'].unique().tolist())
-                filial_selecionada = st.selectbox("🏢 Filial", options=filiais_disponiveis)
-            else:
-                filiais_disponiveis = ['Todos'] + sorted(df['filial'].unique().tolist())
-                filial_selecionada = st.selectbox("🏢 Filial", options=filiais_disponiveis)
-
-    # Aplicação dos filtros
-    df_filtrado = df.copy()
-    if ano_selecionado != 'Todos': 
-        df_filtrado = df_filtrado[df_filtrado['ano'] == ano_selecionado]
-    if mes_selecionado != 'Todos': 
-        df_filtrado = df_filtrado[df_filtrado['mes_ano'] == mes_selecionado]
-    if regiao_selecionada != 'Todos': 
-        df_filtrado = df_filtrado[df_filtrado['regiao'] == regiao_selecionada]
-    if filial_selecionada != 'Todos': 
-        df_filtrado = df_filtrado[df_filtrado['filial'] == filial_selecionada]
     
     # Informações do contexto atual
     if filial_selecionada == 'Todos':
@@ -99,11 +169,12 @@ if not df.empty:
     
     st.markdown("---")
     
+    iniciar_pagina(selected)
     if selected == "Visão Resumida":
         if df_filtrado.empty:
             st.error("❌ Nenhum dado encontrado para os filtros selecionados.")
         else:
-            exibir_dashboard_executivo(df_filtrado, df, "Resumo da Frota")
+            exibir_dashboard_executivo(cubo_filtrado, cubo, "Resumo da Frota", chave_filtros)
             st.markdown("---")
             
     
@@ -115,20 +186,20 @@ if not df.empty:
             st.error("❌ Nenhum dado encontrado para os filtros selecionados.")
         else:
             # Primeiro: Exibir KPIs Operacionais
-            exibir_kpis_operacionais_visao_geral(df_filtrado)
+            exibir_kpis_operacionais_visao_geral(cubo_filtrado, chave_filtros)
             st.markdown("---")
             
             
 
             # Segundo: Análise temporal ou por mês específico
             if ano_selecionado == 'Todos':
-                exibir_tendencias_mensais(df_filtrado, titulo_aba)
+                exibir_tendencias_mensais(cubo_filtrado, titulo_aba, chave_filtros)
             else:
-                kpis = calcular_kpis_performance(df, ano_selecionado, mes_selecionado, 'custo_frota_total')
+                kpis = obter_kpis_performance(base.historico_mensal, ano_selecionado, mes_selecionado, 'custo_frota_total', chave_periodo)
                 if kpis:
                     exibir_kpis_em_cartoes(kpis, titulo_aba)
                     st.markdown("---")
-                    exibir_graficos_performance_avancados(df, mes_selecionado, kpis, 'custo_frota_total', titulo_aba)
+                    exibir_graficos_performance_avancados(base.historico_mensal, mes_selecionado, kpis, 'custo_frota_total', titulo_aba, chave_periodo)
                 else:
                     st.info("ℹ️ Selecione um mês específico para ver a análise de performance mensal.")
 
@@ -183,12 +254,10 @@ if not df.empty:
 
             if mes_selecionado == 'Todos':
                 # --- VISÃO 1: COMPARATIVO ENTRE MESES (QUANDO "TODOS" ESTÁ SELECIONADO) ---
-                
-                g_col1, g_col2 = st.columns(2)
-                with g_col1:
-                    st.write("##### Evolução Mensal do Custo (Composição)")
+
+                def montar_composicao_mensal():
                     # Usa o dataframe com todos os meses para o gráfico de tendência
-                    custos_mensais = df_filtrado.groupby('mes_ano').agg(
+                    custos_mensais = df_filtrado.groupby('mes_ano', observed=True).agg(
                         Manutenção=('valor', 'sum'),
                         Combustível=('custo_combustivel_total', 'sum')
                     ).reset_index()
@@ -197,34 +266,36 @@ if not df.empty:
                     fig_evolucao.add_trace(go.Bar(name='Combustível', x=custos_mensais['mes_ano'], y=custos_mensais['Combustível'], marker_color='#28a745'))
                     fig_evolucao.add_trace(go.Bar(name='Manutenção', x=custos_mensais['mes_ano'], y=custos_mensais['Manutenção'], marker_color='#007bff'))
                     fig_evolucao.update_layout(barmode='stack', title_text="Custo Mensal (Combustível vs. Manutenção)", yaxis_title="Custo (R$)", xaxis_title="Mês")
-                    st.plotly_chart(fig_evolucao, use_container_width=True)
+
+                    df_comb_tipo = df_filtrado.groupby('TP.Comb', observed=True)['custo_combustivel_total'].sum().reset_index()
+                    fig_pie_comb = px.pie(df_comb_tipo, names='TP.Comb', values='custo_combustivel_total', title='Custo Total por Tipo de Combustível', hole=.4, color='TP.Comb', color_discrete_map={'Diesel': '#28a745', 'Gasolina': '#f97316'})
+                    fig_pie_comb.update_traces(textposition='outside', texttemplate='%{label}<br>R$ %{value:,.2s} (%{percent})')
+
+                    dados_manut = {'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Arla'], 'Custo': [df_filtrado['custo_manutencao_geral'].sum(), df_filtrado['custo_rodas_pneus'].sum(), df_filtrado['custo_lataria_pintura'].sum(), df_filtrado['custo_arla'].sum()]}
+                    df_manut_tipo = pd.DataFrame(dados_manut)
+                    fig_pie_manut = px.pie(df_manut_tipo, names='Categoria', values='Custo', title='Custo Total por Tipo de Manutenção', hole=.4, color='Categoria', color_discrete_map={'Manutenção Geral': '#007bff', 'Rodas e Pneus': '#f97316', 'Lataria e Pintura': '#eab308', 'Arla': '#6b7280'})
+                    fig_pie_manut.update_traces(textposition='outside', texttemplate='%{label}<br>R$ %{value:,.2s} (%{percent})')
+                    return fig_evolucao, fig_pie_comb, fig_pie_manut
+
+                fig_evolucao, fig_pie_comb, fig_pie_manut = memorizar('geral_composicao_mensal', chave_filtros, montar_composicao_mensal)
+
+                g_col1, g_col2 = st.columns(2)
+                with g_col1:
+                    st.write("##### Evolução Mensal do Custo (Composição)")
+                    plotly_chart(fig_evolucao, use_container_width=True)
 
                 with g_col2:
                     st.write("##### Detalhamento da Composição dos Custos")
                     tab_comb, tab_manut = st.tabs(["⛽ Combustível", "🛠️ Manutenção"])
                     with tab_comb:
-                        # (Código da aba de combustível... sem alterações)
-                        df_comb_tipo = df_filtrado.groupby('TP.Comb')['custo_combustivel_total'].sum().reset_index()
-                        fig_pie_comb = px.pie(df_comb_tipo, names='TP.Comb', values='custo_combustivel_total', title='Custo Total por Tipo de Combustível', hole=.4, color='TP.Comb', color_discrete_map={'Diesel': '#28a745', 'Gasolina': '#f97316'})
-                        fig_pie_comb.update_traces(textposition='outside', texttemplate='%{label}<br>R$ %{value:,.2s} (%{percent})')
-                        st.plotly_chart(fig_pie_comb, use_container_width=True)
+                        plotly_chart(fig_pie_comb, use_container_width=True)
                     with tab_manut:
-                        # (Código da aba de manutenção... sem alterações)
-                        dados_manut = {'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Arla'], 'Custo': [df_filtrado['custo_manutencao_geral'].sum(), df_filtrado['custo_rodas_pneus'].sum(), df_filtrado['custo_lataria_pintura'].sum(), df_filtrado['custo_arla'].sum()]}
-                        df_manut_tipo = pd.DataFrame(dados_manut)
-                        fig_pie_manut = px.pie(df_manut_tipo, names='Categoria', values='Custo', title='Custo Total por Tipo de Manutenção', hole=.4, color='Categoria', color_discrete_map={'Manutenção Geral': '#007bff', 'Rodas e Pneus': '#f97316', 'Lataria e Pintura': '#eab308', 'Arla': '#6b7280'})
-                        fig_pie_manut.update_traces(textposition='outside', texttemplate='%{label}<br>R$ %{value:,.2s} (%{percent})')
-                        st.plotly_chart(fig_pie_manut, use_container_width=True)
+                        plotly_chart(fig_pie_manut, use_container_width=True)
 
             else:
                 # --- VISÃO 2: RAIO-X DE UM MÊS ESPECÍFICO (QUANDO UM MÊS É FILTRADO) ---
-                
-                g_col1, g_col2 = st.columns([6, 4]) # Coluna do gráfico maior que a da tabela
 
-                with g_col1:
-                    # --- Gráfico de Barras com o Breakdown Detalhado ---
-                    st.write(f"##### Composição Detalhada dos Custos - {mes_selecionado}")
-                    
+                def montar_raio_x_mes():
                     # Prepara os dados para o gráfico
                     custos_detalhados = {
                         'Categoria': [
@@ -251,12 +322,7 @@ if not df.empty:
                         title=f"Raio-X dos Custos em {mes_selecionado}"
                     )
                     fig_detalhe.update_layout(yaxis_title=None, xaxis_title="Custo (R$)", showlegend=True)
-                    st.plotly_chart(fig_detalhe, use_container_width=True)
 
-                with g_col2:
-                    # --- Tabela de Detalhamento para Apoiar o Gráfico ---
-                    st.write("##### Resumo dos Custos")
-                    
                     # Reutiliza o df_grafico para a tabela
                     df_tabela = df_grafico[df_grafico['Custo'] > 0].sort_values('Custo', ascending=False)
                     total_custos = df_tabela['Custo'].sum()
@@ -265,9 +331,22 @@ if not df.empty:
                     # Adiciona a linha de total
                     total_row = pd.DataFrame([{'Categoria': 'TOTAL', 'Custo': total_custos, 'Percentual': 100}])
                     df_tabela = pd.concat([df_tabela, total_row], ignore_index=True)
-                    
+                    return fig_detalhe, df_tabela[['Categoria', 'Custo', 'Percentual']]
+
+                fig_detalhe, df_tabela = memorizar('geral_raio_x_mes', chave_filtros, montar_raio_x_mes)
+
+                g_col1, g_col2 = st.columns([6, 4]) # Coluna do gráfico maior que a da tabela
+
+                with g_col1:
+                    # --- Gráfico de Barras com o Breakdown Detalhado ---
+                    st.write(f"##### Composição Detalhada dos Custos - {mes_selecionado}")
+                    plotly_chart(fig_detalhe, nome='Raio-X dos Custos do Mês', use_container_width=True)
+
+                with g_col2:
+                    # --- Tabela de Detalhamento para Apoiar o Gráfico ---
+                    st.write("##### Resumo dos Custos")
                     st.dataframe(
-                        df_tabela[['Categoria', 'Custo', 'Percentual']],
+                        df_tabela,
                         use_container_width=True, hide_index=True,
                         column_config={
                             "Custo": st.column_config.NumberColumn(format="R$ %.2f"),
@@ -279,40 +358,43 @@ if not df.empty:
             st.markdown("---")
             st.subheader(f"📋 Relatório Detalhado por Veículo - {titulo_principal}")
             
-            # Relatório com mais informações
-            df_detalhado = df_filtrado.groupby('Placa').agg({
-                'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
-                'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
-                'Roteiro Principal': 'first', 'Motorista Principal': 'first',
-                'regiao': 'first', 'filial': 'first',
-                'custo_combustivel': 'sum',
-                'custo_manutencao_geral': 'sum', 'custo_rodas_pneus': 'sum', 
-                'custo_lataria_pintura': 'sum','custo_arla': 'sum', 
-            }).reset_index()
-            
-            df_detalhado['Custo Total'] = df_detalhado[['custo_combustivel', 'custo_arla', 
-                                                       'custo_manutencao_geral', 'custo_rodas_pneus', 
-                                                       'custo_lataria_pintura']].sum(axis=1)
-            
-            # Ranking dos veículos
-            df_detalhado['Ranking'] = df_detalhado['Custo Total'].rank(ascending=False).astype(int)
-            
-            df_detalhado.rename(columns={
-                'custo_combustivel': 'Valor Comb.', 'custo_arla': 'Arla', 
-                'custo_manutencao_geral': 'Manutenção em Geral', 
-                'custo_rodas_pneus': 'Rodas / Pneus', 
-                'custo_lataria_pintura': 'Lataria e Pintura', 
-                'contrato': 'Contrato', 'TP.Comb': 'Tipo Combustível', 
-                'TP.Rota': 'Tipo de Rota', 'regiao': 'Região', 'filial': 'Filial'
-            }, inplace=True)
-            
-            ordem_colunas_detalhado = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 
-                                     'Região', 'Filial', 'Tipo Combustível', 'Tipo de Rota', 
-                                     'Contrato', 'Roteiro Principal', 'Motorista Principal', 
-                                     'Valor Comb.', 'Arla', 'Manutenção em Geral', 
-                                     'Rodas / Pneus', 'Lataria e Pintura', 'Custo Total']
-            
-            st.dataframe(df_detalhado[ordem_colunas_detalhado], width='content', hide_index=True,
+            def montar_relatorio_veiculos():
+                # Relatório com mais informações
+                df_detalhado = df_filtrado.groupby('Placa', observed=True).agg({
+                    'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
+                    'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
+                    'Roteiro Principal': 'first', 'Motorista Principal': 'first',
+                    'regiao': 'first', 'filial': 'first',
+                    'custo_combustivel': 'sum',
+                    'custo_manutencao_geral': 'sum', 'custo_rodas_pneus': 'sum', 
+                    'custo_lataria_pintura': 'sum','custo_arla': 'sum', 
+                }).reset_index()
+                
+                df_detalhado['Custo Total'] = df_detalhado[['custo_combustivel', 'custo_arla', 
+                                                           'custo_manutencao_geral', 'custo_rodas_pneus', 
+                                                           'custo_lataria_pintura']].sum(axis=1)
+                
+                # Ranking dos veículos
+                df_detalhado['Ranking'] = df_detalhado['Custo Total'].rank(ascending=False).astype(int)
+                
+                df_detalhado.rename(columns={
+                    'custo_combustivel': 'Valor Comb.', 'custo_arla': 'Arla', 
+                    'custo_manutencao_geral': 'Manutenção em Geral', 
+                    'custo_rodas_pneus': 'Rodas / Pneus', 
+                    'custo_lataria_pintura': 'Lataria e Pintura', 
+                    'contrato': 'Contrato', 'TP.Comb': 'Tipo Combustível', 
+                    'TP.Rota': 'Tipo de Rota', 'regiao': 'Região', 'filial': 'Filial'
+                }, inplace=True)
+                
+                ordem_colunas_detalhado = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 
+                                         'Região', 'Filial', 'Tipo Combustível', 'Tipo de Rota', 
+                                         'Contrato', 'Roteiro Principal', 'Motorista Principal', 
+                                         'Valor Comb.', 'Arla', 'Manutenção em Geral', 
+                                         'Rodas / Pneus', 'Lataria e Pintura', 'Custo Total']
+                return df_detalhado[ordem_colunas_detalhado]
+
+            df_detalhado = memorizar('geral_relatorio_veiculos', chave_filtros, montar_relatorio_veiculos)
+            st.dataframe(df_detalhado, width='content', hide_index=True,
                         column_config={
                             "Custo Total": st.column_config.NumberColumn(format="R$ %.2f"),
                             "Valor Comb.": st.column_config.NumberColumn(format="R$ %.2f"),
@@ -330,13 +412,13 @@ if not df.empty:
             st.error("❌ Nenhum dado encontrado para os filtros selecionados.")
         else:
             if ano_selecionado == 'Todos':
-                exibir_tendencias_mensais(df_filtrado, titulo_aba)
+                exibir_tendencias_mensais(cubo_filtrado, titulo_aba, chave_filtros)
             else:
-                kpis = calcular_kpis_performance(df, ano_selecionado, mes_selecionado, 'valor')
+                kpis = obter_kpis_performance(base.historico_mensal, ano_selecionado, mes_selecionado, 'valor', chave_periodo)
                 if kpis:
                     exibir_kpis_em_cartoes(kpis, titulo_aba)
                     st.markdown("---")
-                    exibir_graficos_performance_avancados(df, mes_selecionado, kpis, 'valor', titulo_aba)
+                    exibir_graficos_performance_avancados(base.historico_mensal, mes_selecionado, kpis, 'valor', titulo_aba, chave_periodo)
                 else:
                     st.info("ℹ️ Selecione um mês específico para ver a análise de performance mensal.")
             
@@ -374,92 +456,105 @@ if not df.empty:
             with col2:
                 # Gráfico de Pizza (Donut) com a distribuição percentual
                 st.write("##### Distribuição Percentual dos Custos")
-                
-                dados_grafico = {
-                    'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Arla'],
-                    'Custo': [custo_manutencao, custo_rodas, custo_lataria, custo_arla]
-                }
-                df_grafico = pd.DataFrame(dados_grafico).sort_values('Custo', ascending=False)
-                
-                # Paleta de cores para o gráfico
-                mapa_cores = {
-                    'Manutenção Geral': '#007bff', 'Rodas e Pneus': '#f97316',
-                    'Lataria e Pintura': '#eab308', 'Arla': '#6b7280'
-                }
-
-                fig_pie = px.pie(
-                    df_grafico[df_grafico['Custo'] > 0], # Apenas mostra categorias com custo
-                    names='Categoria', 
-                    values='Custo',
-                    hole=.4,
-                    color='Categoria',
-                    color_discrete_map=mapa_cores
-                )
-                fig_pie.update_traces(
-                    textposition='outside',
-                    texttemplate='%{label}<br>R$ %{value:,.2s}<br>(%{percent})',
-                    hovertemplate='<b>%{label}</b><br>Custo: R$ %{value:,.2f}<br>Percentual: %{percent}'
-                )
-                fig_pie.update_layout(showlegend=False, margin=dict(t=20, b=20, l=20, r=20))
-                st.plotly_chart(fig_pie, use_container_width=True)
+
+                def montar_donut_manutencao():
+                    dados_grafico = {
+                        'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Arla'],
+                        'Custo': [custo_manutencao, custo_rodas, custo_lataria, custo_arla]
+                    }
+                    df_grafico = pd.DataFrame(dados_grafico).sort_values('Custo', ascending=False)
+                    
+                    # Paleta de cores para o gráfico
+                    mapa_cores = {
+                        'Manutenção Geral': '#007bff', 'Rodas e Pneus': '#f97316',
+                        'Lataria e Pintura': '#eab308', 'Arla': '#6b7280'
+                    }
+
+                    fig_pie = px.pie(
+                        df_grafico[df_grafico['Custo'] > 0], # Apenas mostra categorias com custo
+                        names='Categoria', 
+                        values='Custo',
+                        hole=.4,
+                        color='Categoria',
+                        color_discrete_map=mapa_cores
+                    )
+                    fig_pie.update_traces(
+                        textposition='outside',
+                        texttemplate='%{label}<br>R$ %{value:,.2s}<br>(%{percent})',
+                        hovertemplate='<b>%{label}</b><br>Custo: R$ %{value:,.2f}<br>Percentual: %{percent}'
+                    )
+                    fig_pie.update_layout(showlegend=False, margin=dict(t=20, b=20, l=20, r=20))
+                    return fig_pie
+
+                fig_pie = memorizar('manutencao_donut', chave_filtros, montar_donut_manutencao)
+                plotly_chart(fig_pie, nome='Distribuição Percentual (Total Manutenção)', use_container_width=True)
 
             # --- FIM DO BLOCO DE CÓDIGO ATUALIZADO ---
             
             st.markdown("---")
             st.subheader(f"📊 Análise Visual dos Custos - {titulo_principal}")
             
-            # Gráficos de manutenção existentes...
-            dados_grafico = {'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura'], 
-                           'Custo': [custo_manutencao, custo_rodas, custo_lataria]}
-            df_grafico = pd.DataFrame(dados_grafico).sort_values('Custo', ascending=False)
-            cores_vivas = ["#1b69a0", '#ff7f0e', '#2ca02c']
-            mapa_cores = {'Manutenção Geral': cores_vivas[0], 'Rodas e Pneus': cores_vivas[1], 'Lataria e Pintura': cores_vivas[2]}
-            
-            g_col1, g_col2 = st.columns(2)
-            with g_col1:
+            def montar_graficos_manutencao():
+                # Gráficos de manutenção existentes...
+                dados_grafico = {'Categoria': ['Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura'], 
+                               'Custo': [custo_manutencao, custo_rodas, custo_lataria]}
+                df_grafico = pd.DataFrame(dados_grafico).sort_values('Custo', ascending=False)
+                cores_vivas = ["#1b69a0", '#ff7f0e', '#2ca02c']
+                mapa_cores = {'Manutenção Geral': cores_vivas[0], 'Rodas e Pneus': cores_vivas[1], 'Lataria e Pintura': cores_vivas[2]}
+
                 fig_pie = px.pie(df_grafico, names='Categoria', values='Custo', 
                                title='Distribuição Percentual dos Custos', hole=.3, 
                                color='Categoria', color_discrete_map=mapa_cores)
                 fig_pie.update_traces(textposition='outside', textinfo='percent+label')
                 fig_pie.update_layout(legend_font_size=14, uniformtext_minsize=12, uniformtext_mode='hide')
-                st.plotly_chart(fig_pie, width='content')
-            
-            with g_col2:
+
                 fig_bar = px.bar(df_grafico, x='Categoria', y='Custo', text_auto='.2s', 
                                title='Comparativo de Custos por Categoria', 
                                color='Categoria', color_discrete_map=mapa_cores)
                 fig_bar.update_layout(showlegend=False)
                 fig_bar.update_traces(width=0.5, textangle=0, textposition="outside")
                 fig_bar.update_yaxes(range=[0, df_grafico['Custo'].max() * 1.1])
-                st.plotly_chart(fig_bar, width='content')
+                return fig_pie, fig_bar
+
+            fig_pie, fig_bar = memorizar('manutencao_categorias', chave_filtros, montar_graficos_manutencao)
+
+            g_col1, g_col2 = st.columns(2)
+            with g_col1:
+                plotly_chart(fig_pie, width='content')
+            
+            with g_col2:
+                plotly_chart(fig_bar, width='content')
             
             st.markdown("---")
             st.subheader(f"📋 Detalhamento por Veículo - {titulo_principal}")
             
-            # Relatório de veículos para manutenção
-            df_veiculos = df_filtrado.groupby('Placa').agg({
-                'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
-                'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
-                'Roteiro Principal': 'first', 'Motorista Principal': 'first',
-                'regiao': 'first', 'filial': 'first',
-                'custo_manutencao_geral': 'sum', 'custo_rodas_pneus': 'sum', 
-                'custo_lataria_pintura': 'sum', 'valor': 'sum'
-            }).reset_index()
-            
-            # Ranking e estatísticas
-            df_veiculos['Ranking'] = df_veiculos['valor'].rank(ascending=False).astype(int)
-            
-            df_veiculos.rename(columns={
-                'valor': 'Custo Total', 'custo_manutencao_geral': 'Manutenção Geral', 
-                'custo_rodas_pneus': 'Rodas e Pneus', 'custo_lataria_pintura': 'Lataria e Pintura', 
-                'contrato': 'Contrato', 'regiao': 'Região', 'filial': 'Filial'
-            }, inplace=True)
-            
-            ordem_colunas = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 'Região', 'Filial',
-                           'TP.Comb', 'TP.Rota', 'Contrato', 'Roteiro Principal', 'Motorista Principal', 
-                           'Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Custo Total']
-            
-            st.dataframe(df_veiculos[ordem_colunas], width='content', hide_index=True,
+            def montar_veiculos_manutencao():
+                # Relatório de veículos para manutenção
+                df_veiculos = df_filtrado.groupby('Placa', observed=True).agg({
+                    'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
+                    'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
+                    'Roteiro Principal': 'first', 'Motorista Principal': 'first',
+                    'regiao': 'first', 'filial': 'first',
+                    'custo_manutencao_geral': 'sum', 'custo_rodas_pneus': 'sum', 
+                    'custo_lataria_pintura': 'sum', 'valor': 'sum'
+                }).reset_index()
+                
+                # Ranking e estatísticas
+                df_veiculos['Ranking'] = df_veiculos['valor'].rank(ascending=False).astype(int)
+                
+                df_veiculos.rename(columns={
+                    'valor': 'Custo Total', 'custo_manutencao_geral': 'Manutenção Geral', 
+                    'custo_rodas_pneus': 'Rodas e Pneus', 'custo_lataria_pintura': 'Lataria e Pintura', 
+                    'contrato': 'Contrato', 'regiao': 'Região', 'filial': 'Filial'
+                }, inplace=True)
+                
+                ordem_colunas = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 'Região', 'Filial',
+                               'TP.Comb', 'TP.Rota', 'Contrato', 'Roteiro Principal', 'Motorista Principal', 
+                               'Manutenção Geral', 'Rodas e Pneus', 'Lataria e Pintura', 'Custo Total']
+                return df_veiculos[ordem_colunas]
+
+            df_veiculos = memorizar('manutencao_relatorio_veiculos', chave_filtros, montar_veiculos_manutencao)
+            st.dataframe(df_veiculos, width='content', hide_index=True,
                         column_config={
                             "Custo Total": st.column_config.NumberColumn(format="R$ %.2f"),
                             "Manutenção Geral": st.column_config.NumberColumn(format="R$ %.2f"),
@@ -475,13 +570,13 @@ if not df.empty:
             st.error("❌ Nenhum dado encontrado para os filtros selecionados.")
         else:
             if ano_selecionado == 'Todos':
-                exibir_tendencias_mensais(df_filtrado, titulo_aba)
+                exibir_tendencias_mensais(cubo_filtrado, titulo_aba, chave_filtros)
             else:
-                kpis = calcular_kpis_performance(df, ano_selecionado, mes_selecionado, 'custo_combustivel_total')
+                kpis = obter_kpis_performance(base.historico_mensal, ano_selecionado, mes_selecionado, 'custo_combustivel_total', chave_periodo)
                 if kpis:
                     exibir_kpis_em_cartoes(kpis, titulo_aba)
                     st.markdown("---")
-                    exibir_graficos_performance_avancados(df, mes_selecionado, kpis, 'custo_combustivel_total', titulo_aba)
+                    exibir_graficos_performance_avancados(base.historico_mensal, mes_selecionado, kpis, 'custo_combustivel_total', titulo_aba, chave_periodo)
                 else:
                     st.info("ℹ️ Selecione um mês específico para ver a análise de performance mensal.")
             
@@ -507,79 +602,92 @@ if not df.empty:
                 st.markdown("---")
                 st.subheader("🔍 Análise por Tipo de Combustível")
                 
-                analise_combustivel = df_filtrado.groupby('TP.Comb').agg({
-                    'custo_combustivel_total': 'sum',
-                    'Placa': 'nunique'
-                }).reset_index()
+                def montar_combustivel_tipo():
+                    analise_combustivel = df_filtrado.groupby('TP.Comb', observed=True).agg({
+                        'custo_combustivel_total': 'sum',
+                        'Placa': 'nunique'
+                    }).reset_index()
                 
-                analise_combustivel['Custo_por_Veiculo'] = (
-                    analise_combustivel['custo_combustivel_total'] / 
-                    analise_combustivel['Placa']
-                )
+                    analise_combustivel['Custo_por_Veiculo'] = (
+                        analise_combustivel['custo_combustivel_total'] / 
+                        analise_combustivel['Placa']
+                    )
                 
-                fig_combustivel_tipo = px.bar(
-                    analise_combustivel,
-                    x='TP.Comb',
-                    y='custo_combustivel_total',
-                    title='Custos por Tipo de Combustível',
-                    text='custo_combustivel_total',
-                    color='custo_combustivel_total',
-                    color_continuous_scale='viridis'
-                )
-                fig_combustivel_tipo.update_traces(texttemplate='%{text:.2s}', textposition='outside')
-                st.plotly_chart(fig_combustivel_tipo, width='content')
-            
-            # Gráficos existentes
-            dados_grafico_comb = {'Categoria': ['Combustível', 'Arla'], 'Custo': [custo_combustivel, custo_arla]}
-            df_grafico_comb = pd.DataFrame(dados_grafico_comb).sort_values('Custo', ascending=False)
-            cores_comb = ["#e02222", "#1410e0"] 
-            mapa_cores_comb = {'Combustível': cores_comb[0], 'Arla': cores_comb[1]}
+                    fig_combustivel_tipo = px.bar(
+                        analise_combustivel,
+                        x='TP.Comb',
+                        y='custo_combustivel_total',
+                        title='Custos por Tipo de Combustível',
+                        text='custo_combustivel_total',
+                        color='custo_combustivel_total',
+                        color_continuous_scale='viridis'
+                    )
+                    fig_combustivel_tipo.update_traces(texttemplate='%{text:.2s}', textposition='outside')
+                    return fig_combustivel_tipo
+
+                fig_combustivel_tipo = memorizar('combustivel_por_tipo', chave_filtros, montar_combustivel_tipo)
+                plotly_chart(fig_combustivel_tipo, width='content')
             
-            g_col1, g_col2 = st.columns(2)
-            with g_col1:
+            def montar_graficos_combustivel():
+                # Gráficos existentes
+                dados_grafico_comb = {'Categoria': ['Combustível', 'Arla'], 'Custo': [custo_combustivel, custo_arla]}
+                df_grafico_comb = pd.DataFrame(dados_grafico_comb).sort_values('Custo', ascending=False)
+                cores_comb = ["#e02222", "#1410e0"] 
+                mapa_cores_comb = {'Combustível': cores_comb[0], 'Arla': cores_comb[1]}
+
                 fig_pie_comb = px.pie(df_grafico_comb, names='Categoria', values='Custo', 
                                     title='Distribuição Percentual dos Custos', hole=.3, 
                                     color='Categoria', color_discrete_map=mapa_cores_comb)
                 fig_pie_comb.update_traces(textposition='outside', textinfo='percent+label')
                 fig_pie_comb.update_layout(legend_font_size=14, uniformtext_minsize=12, uniformtext_mode='hide')
-                st.plotly_chart(fig_pie_comb, width='content')
-            
-            with g_col2:
+
                 fig_bar_comb = px.bar(df_grafico_comb, x='Categoria', y='Custo', text_auto='.2s', 
                                     title='Comparativo de Custos por Categoria', 
                                     color='Categoria', color_discrete_map=mapa_cores_comb)
                 fig_bar_comb.update_layout(showlegend=False)
                 fig_bar_comb.update_traces(width=0.4, textangle=0, textposition="outside")
                 fig_bar_comb.update_yaxes(range=[0, df_grafico_comb['Custo'].max() * 1.1])
-                st.plotly_chart(fig_bar_comb, width='content')
+                return fig_pie_comb, fig_bar_comb
+
+            fig_pie_comb, fig_bar_comb = memorizar('combustivel_categorias', chave_filtros, montar_graficos_combustivel)
+
+            g_col1, g_col2 = st.columns(2)
+            with g_col1:
+                plotly_chart(fig_pie_comb, width='content')
+            
+            with g_col2:
+                plotly_chart(fig_bar_comb, width='content')
             
             # Relatório detalhado por veículo para combustível
             st.markdown("---")
             st.subheader(f"📋 Consumo Detalhado por Veículo - {titulo_principal}")
             
-            df_combustivel_veiculos = df_filtrado.groupby('Placa').agg({
-                'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
-                'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
-                'Roteiro Principal': 'first', 'Motorista Principal': 'first',
-                'regiao': 'first', 'filial': 'first',
-                'custo_combustivel': 'sum', 'custo_arla': 'sum', 
-                'custo_combustivel_total': 'sum'
-            }).reset_index()
-            
-            # Ranking por consumo
-            df_combustivel_veiculos['Ranking'] = df_combustivel_veiculos['custo_combustivel_total'].rank(ascending=False).astype(int)
-            
-            df_combustivel_veiculos.rename(columns={
-                'custo_combustivel': 'Combustível', 'custo_arla': 'Arla', 
-                'custo_combustivel_total': 'Total Combustível',
-                'contrato': 'Contrato', 'regiao': 'Região', 'filial': 'Filial'
-            }, inplace=True)
-            
-            ordem_colunas_comb = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 'Região', 'Filial',
-                                 'TP.Comb', 'TP.Rota', 'Contrato', 'Roteiro Principal', 'Motorista Principal', 
-                                 'Combustível', 'Arla', 'Total Combustível']
-            
-            st.dataframe(df_combustivel_veiculos[ordem_colunas_comb], width='content', hide_index=True,
+            def montar_veiculos_combustivel():
+                df_combustivel_veiculos = df_filtrado.groupby('Placa', observed=True).agg({
+                    'Modelo': 'first', 'grupocorreto': 'first', 'Marca': 'first', 
+                    'TP.Comb': 'first', 'TP.Rota': 'first', 'contrato': 'first', 
+                    'Roteiro Principal': 'first', 'Motorista Principal': 'first',
+                    'regiao': 'first', 'filial': 'first',
+                    'custo_combustivel': 'sum', 'custo_arla': 'sum', 
+                    'custo_combustivel_total': 'sum'
+                }).reset_index()
+            
+                # Ranking por consumo
+                df_combustivel_veiculos['Ranking'] = df_combustivel_veiculos['custo_combustivel_total'].rank(ascending=False).astype(int)
+            
+                df_combustivel_veiculos.rename(columns={
+                    'custo_combustivel': 'Combustível', 'custo_arla': 'Arla', 
+                    'custo_combustivel_total': 'Total Combustível',
+                    'contrato': 'Contrato', 'regiao': 'Região', 'filial': 'Filial'
+                }, inplace=True)
+            
+                ordem_colunas_comb = ['Ranking', 'Placa', 'Modelo', 'Marca', 'grupocorreto', 'Região', 'Filial',
+                                     'TP.Comb', 'TP.Rota', 'Contrato', 'Roteiro Principal', 'Motorista Principal', 
+                                     'Combustível', 'Arla', 'Total Combustível']
+                return df_combustivel_veiculos[ordem_colunas_comb]
+
+            df_combustivel_veiculos = memorizar('combustivel_relatorio_veiculos', chave_filtros, montar_veiculos_combustivel)
+            st.dataframe(df_combustivel_veiculos, width='content', hide_index=True,
                         column_config={
                             "Combustível": st.column_config.NumberColumn(format="R$ %.2f"),
                             "Arla": st.column_config.NumberColumn(format="R$ %.2f"),
@@ -592,14 +700,7 @@ if not df.empty:
         if df_filtrado.empty:
             st.error("❌ Nenhum dados encontrados para os filtros selecionados.")
         else:
-            # Análises cruzadas e insights avançados
-            st.subheader("🧠 Insights Avançados de Performance")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Análise de correlação entre custos
-                st.write("##### 📊 Matriz de Correlação de Custos")
+            def montar_correlacao_custos():
                 custos_correlacao = df_filtrado[['custo_combustivel', 'custo_arla', 'custo_manutencao_geral', 
                                                'custo_rodas_pneus', 'custo_lataria_pintura']].corr()
                 
@@ -608,12 +709,10 @@ if not df.empty:
                                    color_continuous_scale='RdBu_r',
                                    aspect="auto")
                 fig_corr.update_layout(width=500, height=400)
-                st.plotly_chart(fig_corr, width='content')
-            
-            with col2:
-                # Análise de eficiência por grupo de veículo
-                st.write("##### 🚛 Eficiência por Grupo de Veículo")
-                eficiencia_grupo = df_filtrado.groupby('grupocorreto').agg({
+                return fig_corr
+
+            def montar_eficiencia_grupo():
+                eficiencia_grupo = df_filtrado.groupby('grupocorreto', observed=True).agg({
                     'custo_frota_total': 'mean'
                 }).reset_index().sort_values('custo_frota_total', ascending=True)
                 
@@ -626,91 +725,119 @@ if not df.empty:
                                       color='custo_frota_total',
                                       color_continuous_scale='RdYlGn_r')
                 fig_eficiencia.update_traces(texttemplate='%{text:.2s}', textposition='outside')
-                st.plotly_chart(fig_eficiencia, width='content')
+                return fig_eficiencia
+
+            # Análises cruzadas e insights avançados
+            st.subheader("🧠 Insights Avançados de Performance")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Análise de correlação entre custos
+                st.write("##### 📊 Matriz de Correlação de Custos")
+                fig_corr = memorizar('detalhada_correlacao', chave_filtros, montar_correlacao_custos)
+                plotly_chart(fig_corr, width='content')
+            
+            with col2:
+                # Análise de eficiência por grupo de veículo
+                st.write("##### 🚛 Eficiência por Grupo de Veículo")
+                fig_eficiencia = memorizar('detalhada_eficiencia_grupo', chave_filtros, montar_eficiencia_grupo)
+                plotly_chart(fig_eficiencia, width='content')
             
             # Análise temporal se temos dados de múltiplos períodos
             if ano_selecionado != 'Todos' and len(df_filtrado['mes_ano'].unique()) > 1:
                 st.markdown("---")
                 st.subheader("📈 Análise de Tendências Temporais")
                 
-                # Evolução mensal dos custos
-                evolucao_temporal = df_filtrado.groupby('mes_ano').agg({
-                    'custo_frota_total': 'sum',
-                    'custo_combustivel_total': 'sum',
-                    'valor': 'sum',
-                    'Placa': 'nunique'
-                }).reset_index()
+                def montar_analise_temporal():
+                    # Evolução mensal dos custos
+                    evolucao_temporal = df_filtrado.groupby('mes_ano', observed=True).agg({
+                        'custo_frota_total': 'sum',
+                        'custo_combustivel_total': 'sum',
+                        'valor': 'sum',
+                        'Placa': 'nunique'
+                    }).reset_index()
                 
-                evolucao_temporal['custo_por_veiculo'] = (
-                    evolucao_temporal['custo_frota_total'] / 
-                    evolucao_temporal['Placa']
-                )
+                    evolucao_temporal['custo_por_veiculo'] = (
+                        evolucao_temporal['custo_frota_total'] / 
+                        evolucao_temporal['Placa']
+                    )
                 
-                fig_temporal = make_subplots(
-                    rows=2, cols=1,
-                    subplot_titles=('Evolução dos Custos Totais', 'Custo por Veículo'),
-                    vertical_spacing=0.15
-                )
+                    fig_temporal = make_subplots(
+                        rows=2, cols=1,
+                        subplot_titles=('Evolução dos Custos Totais', 'Custo por Veículo'),
+                        vertical_spacing=0.15
+                    )
                 
-                # Gráfico 1: Custos totais
-                fig_temporal.add_trace(
-                    go.Scatter(x=evolucao_temporal['mes_ano'], 
-                             y=evolucao_temporal['valor'],
-                             mode='lines+markers',
-                             name='Manutenção',
-                             line=dict(color='#ff7f0e')), 
-                    row=1, col=1
-                )
+                    # Gráfico 1: Custos totais
+                    fig_temporal.add_trace(
+                        go.Scatter(x=evolucao_temporal['mes_ano'], 
+                                 y=evolucao_temporal['valor'],
+                                 mode='lines+markers',
+                                 name='Manutenção',
+                                 line=dict(color='#ff7f0e')), 
+                        row=1, col=1
+                    )
                 
-                fig_temporal.add_trace(
-                    go.Scatter(x=evolucao_temporal['mes_ano'], 
-                             y=evolucao_temporal['custo_combustivel_total'],
-                             mode='lines+markers',
-                             name='Combustível',
-                             line=dict(color='#2ca02c')), 
-                    row=1, col=1
-                )
+                    fig_temporal.add_trace(
+                        go.Scatter(x=evolucao_temporal['mes_ano'], 
+                                 y=evolucao_temporal['custo_combustivel_total'],
+                                 mode='lines+markers',
+                                 name='Combustível',
+                                 line=dict(color='#2ca02c')), 
+                        row=1, col=1
+                    )
                 
-                # Gráfico 2: Custo por veículo
-                fig_temporal.add_trace(
-                    go.Scatter(x=evolucao_temporal['mes_ano'], 
-                             y=evolucao_temporal['custo_por_veiculo'],
-                             mode='lines+markers',
-                             name='Custo/Veículo',
-                             line=dict(color='#007bff')), 
-                    row=2, col=1
-                )
+                    # Gráfico 2: Custo por veículo
+                    fig_temporal.add_trace(
+                        go.Scatter(x=evolucao_temporal['mes_ano'], 
+                                 y=evolucao_temporal['custo_por_veiculo'],
+                                 mode='lines+markers',
+                                 name='Custo/Veículo',
+                                 line=dict(color='#007bff')), 
+                        row=2, col=1
+                    )
                 
-                fig_temporal.update_layout(height=600, title_text="Análise Temporal Completa")
-                st.plotly_chart(fig_temporal, width='content')
+                    fig_temporal.update_layout(height=600, title_text="Análise Temporal Completa")
+                    return fig_temporal
+
+                fig_temporal = memorizar('detalhada_temporal', chave_filtros, montar_analise_temporal)
+                plotly_chart(fig_temporal, width='content')
             
             # Análise de outliers
             st.markdown("---")
             st.subheader("🎯 Identificação de Outliers e Oportunidades")
             
-            # Veículos com custos anômalos
-            Q1 = df_filtrado.groupby('Placa')['custo_frota_total'].sum().quantile(0.25)
-            Q3 = df_filtrado.groupby('Placa')['custo_frota_total'].sum().quantile(0.75)
-            IQR = Q3 - Q1
-            limite_superior = Q3 + 1.5 * IQR
-            limite_inferior = Q1 - 1.5 * IQR
-            
-            custos_por_veiculo = df_filtrado.groupby('Placa')['custo_frota_total'].sum()
-            outliers_superiores = custos_por_veiculo[custos_por_veiculo > limite_superior]
-            outliers_inferiores = custos_por_veiculo[custos_por_veiculo < limite_inferior]
+            # Veículos com custos anômalos: cercas de IQR da frota inteira e de cada grupo, filial e
+            # modelo no período (memorizadas por ano e mês); região e filial só escolhem os veículos exibidos
+            outliers_periodo = obter_outliers_periodo(base, anos_carregados, filtros, chave_periodo)
+            if outliers_periodo is None:
+                st.stop()
+            outliers = memorizar('outliers_recorte', chave_filtros, recortar_outliers, outliers_periodo, df_filtrado['Placa'])
+            segmento = st.radio("Comparar cada veículo com", options=list(SEGMENTOS_OUTLIER), horizontal=True,
+                                help="Frota: todos os veículos da frota no período. Grupo, Filial e Modelo: "
+                                     "os veículos do mesmo segmento em toda a frota.")
+            classificacao = outliers_do_segmento(outliers, segmento)
+            outliers_superiores = classificacao[classificacao['situacao'] == 'alto']
+            outliers_inferiores = classificacao[classificacao['situacao'] == 'baixo']
+            if segmento == 'Frota' and not classificacao.empty:
+                limites = classificacao.iloc[0]
+                ajuda_superior = f"Veículos com custo acima de R$ {limites['limite_superior']:,.2f}"
+                ajuda_inferior = f"Veículos com custo abaixo de R$ {limites['limite_inferior']:,.2f}"
+            else:
+                ajuda_superior = f"Veículos com custo acima de Q3 + 1,5 × IQR do seu segmento ({segmento})"
+                ajuda_inferior = f"Veículos com custo abaixo de Q1 - 1,5 × IQR do seu segmento ({segmento})"
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("🚨 Veículos Alto Custo", len(outliers_superiores),
-                         help=f"Veículos com custo acima de R$ {limite_superior:,.2f}")
+                st.metric("🚨 Veículos Alto Custo", len(outliers_superiores), help=ajuda_superior)
             
             with col2:
-                st.metric("✅ Veículos Baixo Custo", len(outliers_inferiores),
-                         help=f"Veículos com custo abaixo de R$ {limite_inferior:,.2f}")
+                st.metric("✅ Veículos Baixo Custo", len(outliers_inferiores), help=ajuda_inferior)
             
             with col3:
-                economia_potencial = outliers_superiores.sum() - (len(outliers_superiores) * custos_por_veiculo.median())
+                economia_potencial = (outliers_superiores['custo_frota_total'] - outliers_superiores['mediana']).sum()
                 st.metric("💰 Economia Potencial", f"R$ {economia_potencial:,.2f}",
                          help="Economia se veículos alto custo chegassem à mediana")
             
@@ -718,18 +845,12 @@ if not df.empty:
             if len(outliers_superiores) > 0:
                 st.write("##### 🚨 Veículos que Requerem Atenção (Alto Custo)")
                 
-                outliers_info = df_filtrado[df_filtrado['Placa'].isin(outliers_superiores.index)].groupby('Placa').agg({
-                    'Modelo': 'first',
-                    'Marca': 'first', 
-                    'grupocorreto': 'first',
-                    'regiao': 'first',
-                    'filial': 'first',
-                    'custo_frota_total': 'sum',
-                    'Motorista Principal': 'first'
-                }).reset_index()
-                
-                outliers_info['Economia_Potencial'] = outliers_info['custo_frota_total'] - custos_por_veiculo.median()
-                outliers_info = outliers_info.sort_values('custo_frota_total', ascending=False)
+                outliers_info = outliers_superiores.assign(
+                    Economia_Potencial=outliers_superiores['custo_frota_total'] - outliers_superiores['mediana']
+                ).sort_values('custo_frota_total', ascending=False)[[
+                    'Placa', 'Modelo', 'Marca', 'grupocorreto', 'regiao', 'filial',
+                    'custo_frota_total', 'Motorista Principal', 'Economia_Potencial'
+                ]]
                 
                 st.dataframe(outliers_info.rename(columns={
                     'custo_frota_total': 'Custo Total',
@@ -755,12 +876,13 @@ if not df.empty:
             if total_manutencao > total_combustivel:
                 recomendacoes.append("🔧 **Foco na Manutenção**: Os custos de manutenção superam os de combustível. Considere implementar manutenção preventiva.")
             
-            if len(outliers_superiores) > len(custos_por_veiculo) * 0.1:
-                recomendacoes.append(f"🚨 **Gestão de Outliers**: {len(outliers_superiores)} veículos ({len(outliers_superiores)/len(custos_por_veiculo)*100:.1f}%) apresentam custos elevados. Investigação necessária.")
+            total_veiculos = len(outliers.veiculos)
+            if len(outliers_superiores) > total_veiculos * 0.1:
+                recomendacoes.append(f"🚨 **Gestão de Outliers**: {len(outliers_superiores)} veículos ({len(outliers_superiores)/total_veiculos*100:.1f}%) apresentam custos elevados. Investigação necessária.")
             
             # Análise regional
             if len(df_filtrado['regiao'].unique()) > 1:
-                custos_regionais = df_filtrado.groupby('regiao')['custo_frota_total'].sum()
+                custos_regionais = df_filtrado.groupby('regiao', observed=True)['custo_frota_total'].sum()
                 regiao_mais_cara = custos_regionais.idxmax()
                 regiao_mais_barata = custos_regionais.idxmin()
                 diferenca = custos_regionais.max() - custos_regionais.min()
@@ -770,7 +892,7 @@ if not df.empty:
             
             # Análise de eficiência de combustível por tipo
             if 'TP.Comb' in df_filtrado.columns:
-                eficiencia_combustivel = df_filtrado.groupby('TP.Comb')['custo_combustivel_total'].mean()
+                eficiencia_combustivel = df_filtrado.groupby('TP.Comb', observed=True)['custo_combustivel_total'].mean()
                 if len(eficiencia_combustivel) > 1:
                     combustivel_mais_eficiente = eficiencia_combustivel.idxmin()
                     recomendacoes.append(f"⛽ **Otimização de Combustível**: Veículos {combustivel_mais_eficiente} apresentam melhor custo-benefício em combustível.")
@@ -781,6 +903,47 @@ if not df.empty:
             else:
                 st.info("🎯 A operação está dentro dos padrões esperados. Continue o monitoramento regular.")
 
+    finalizar_pagina()
+
+    # Painel de administração: tempos de cálculo e de serialização das seções da página
+    if PAINEL_ADMIN:
+        with painel_tempos.container():
+            with st.expander("⏱️ Tempos da Página"):
+                tempos = obter_tempos_pagina(selected)
+                st.caption(f"{selected}: último rerun e percentis das execuções desta sessão, em ms.")
+                st.dataframe(tempos, hide_index=True,
+                            column_config={
+                                "secao": "Seção",
+                                "tipo": "Tipo",
+                                "amostras": "Execuções",
+                                "computo_ms": st.column_config.NumberColumn("Cálculo", format="%.1f"),
+                                "serializacao_ms": st.column_config.NumberColumn("Serialização", format="%.1f"),
+                                "computo_p50": st.column_config.NumberColumn("Cálculo p50", format="%.1f"),
+                                "computo_p90": st.column_config.NumberColumn("Cálculo p90", format="%.1f"),
+                                "computo_p99": st.column_config.NumberColumn("Cálculo p99", format="%.1f"),
+                                "serializacao_p50": st.column_config.NumberColumn("Serialização p50", format="%.1f"),
+                                "serializacao_p90": st.column_config.NumberColumn("Serialização p90", format="%.1f"),
+                                "serializacao_p99": st.column_config.NumberColumn("Serialização p99", format="%.1f")
+                            })
+            with st.expander("🗄️ Memo das Páginas"):
+                memo = estatisticas_memo()
+                st.caption("Agregados e figuras memorizados por estado de filtro, compartilhados entre as sessões.")
+                m_col1, m_col2 = st.columns(2)
+                m_col1.metric("Acertos", f"{memo['acertos']:,}", f"{memo['taxa_acerto']:.0%}", delta_color="off")
+                m_col2.metric("Faltas", f"{memo['faltas']:,}")
+                m_col1.metric("Itens", f"{memo['itens']:,}")
+                m_col2.metric("Descartes (LRU)", f"{memo['descartes']:,}")
+                st.progress(min(memo['memoria_mb'] / memo['limite_mb'], 1.0) if memo['limite_mb'] else 0.0,
+                            text=f"Memória: {memo['memoria_mb']:,.1f} de {memo['limite_mb']:,.0f} MB")
+                aquecimento = estado_aquecimento()
+                if aquecimento['erro']:
+                    st.warning(f"Aquecimento falhou: {aquecimento['erro']}")
+                elif aquecimento['segundos'] is not None:
+                    st.caption(f"Aquecimento: {aquecimento['combinacoes']} combinações em {aquecimento['segundos']:,.1f} s "
+                               f"(rodada {aquecimento['execucoes']}, iniciada às {aquecimento['inicio']:%H:%M}).")
+                elif aquecimento['ativo']:
+                    st.caption("Aquecimento em andamento...")
+
 else:
     st.error("❌ Erro ao carregar os dados. Verifique a conexão com a fonte de dados.")
     st.info("💡 Dica: Verifique se o arquivo de dados está disponível e acessível.")
@@ -0,0 +1,91 @@
+"""
+Benchmark do ajuste de Km/L (filtrar_outliers_de_kml).
+
+Compara a implementação vetorizada com a lógica linha a linha original
+(df.apply(axis=1)) numa frota sintética e confere que os resultados são
+idênticos. Uso, a partir da raiz do projeto:
+
+    python -m benchmarks.bench_ajuste_kml --linhas 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.data_provider import filtrar_outliers_de_kml
+
+LIMITE_MINIMO_KML = 2.5
+LIMITE_MAXIMO_KML = 35.0
+
+
+def gerar_frota(n_linhas, seed=42):
+    rng = np.random.default_rng(seed)
+    kml = rng.uniform(3, 15, n_linhas)
+    # ~10% de leituras absurdas e ~2% sem leitura
+    kml = np.where(rng.random(n_linhas) < 0.10, rng.uniform(0, 80, n_linhas), kml)
+    kml = np.where(rng.random(n_linhas) < 0.02, np.nan, kml)
+    modelos = np.array([f"Modelo {i}" for i in range(300)] + [None], dtype=object)
+    grupos = np.array(['Leve', 'Médio', 'Pesado', 'Caminhão', 'Outros', 'Moto'], dtype=object)
+    return pd.DataFrame({
+        'media_km_litro': kml,
+        'grupocorreto': rng.choice(grupos, n_linhas),
+        'Modelo': rng.choice(modelos, n_linhas),
+    })
+
+
+def ajuste_kml_linha_a_linha(df):
+    """Lógica original, linha a linha, usada como referência."""
+    df['media_km_litro_ajustado'] = pd.to_numeric(df['media_km_litro'], errors='coerce')
+    df['grupocorreto'] = df['grupocorreto'].astype(str).str.upper()
+    df_validos = df[
+        (df['media_km_litro_ajustado'] >= LIMITE_MINIMO_KML) &
+        (df['media_km_litro_ajustado'] <= LIMITE_MAXIMO_KML) &
+        (df['grupocorreto'] != 'MOTO')
+    ]
+    media_por_modelo = df_validos.groupby('Modelo')['media_km_litro_ajustado'].mean()
+    media_geral_fallback = df_validos['media_km_litro_ajustado'].mean()
+
+    def ajustar_linha(row):
+        kml_original = row['media_km_litro_ajustado']
+        if pd.isna(kml_original):
+            return np.nan
+        if row['grupocorreto'] == 'MOTO':
+            return kml_original
+        if kml_original < LIMITE_MINIMO_KML or kml_original > LIMITE_MAXIMO_KML:
+            return media_por_modelo.get(row['Modelo'], media_geral_fallback)
+        return kml_original
+
+    df['media_km_litro_ajustado'] = df.apply(ajustar_linha, axis=1)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = gerar_frota(args.linhas)
+
+    inicio = time.perf_counter()
+    referencia = ajuste_kml_linha_a_linha(df.copy())
+    tempo_referencia = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vetorizado = filtrar_outliers_de_kml(df.copy())
+    tempo_vetorizado = time.perf_counter() - inicio
+
+    pd.testing.assert_series_equal(
+        referencia['media_km_litro_ajustado'], vetorizado['media_km_litro_ajustado'], check_exact=True
+    )
+
+    print(f"Linhas:               {args.linhas:,}")
+    print(f"Linha a linha:        {tempo_referencia:8.3f} s")
+    print(f"Vetorizado:           {tempo_vetorizado:8.3f} s")
+    print(f"Ganho:                {tempo_referencia / tempo_vetorizado:8.1f}x")
+    print("Motivos de ajuste:")
+    print(vetorizado['motivo_ajuste_kml'].value_counts(dropna=False).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Benchmark do pipeline de limpeza, das agregações e dos KPIs dos painéis.
+
+Roda sem o Streamlit sobre a frota sintética de benchmarks.gerador_frota, em
+um ou mais tamanhos (10k, 100k, 1M, 10M linhas). Mede:
+
+  - cada etapa da limpeza (pelo perfil de @etapa_pipeline do data_provider);
+  - as agregações (índice de filtros, cubo mensal e seus recortes, série mensal);
+  - os KPIs (performance mensal e operacionais, sem filtro e filtrados).
+
+Cada medição é o menor tempo de --repeticoes execuções (como no timeit) e vem com a assinatura do
+resultado (hash dos valores, floats arredondados em 6 casas). A comparação com
+benchmarks/baseline.json aponta resultados diferentes (o comando termina com
+código 1) e tempos acima da tolerância (código 1 só com --estrito, já que os
+tempos dependem da máquina e da carga). Uso, a partir da raiz do projeto:
+
+    python -m benchmarks.bench_pipeline                        # 10k e 100k
+    python -m benchmarks.bench_pipeline --tamanhos 1M 10M --repeticoes 1
+    python -m benchmarks.bench_pipeline --gravar-baseline      # atualiza o baseline
+"""
+import argparse
+import dataclasses
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit.logger
+
+# Sem o servidor do Streamlit, os módulos do app avisam a cada chamada de st.*
+streamlit.logger.set_log_level('error')
+
+from benchmarks.gerador_frota import gerar_abas_cadastro, gerar_frota, gerar_lotes_bd
+from src.config.data_provider import _medir_iteracao, _preparar_juncoes, iniciar_perfil, limpar_lotes, obter_perfil_pipeline
+from src.config.filter_index import aplicar_filtros, construir_indice_filtros
+from src.config.monthly_cube import construir_cubo_mensal, contar_placas, km_por_placa, recortar_cubo, somar_por
+from src.config.kpi_engine import (
+    agregar_historico_mensal, calcular_evolucao_performance, calcular_kpis_operacionais, calcular_kpis_performance,
+    series_historico
+)
+from src.config.outlier_engine import detectar_outliers
+
+TAMANHOS = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# Tempos abaixo deste limiar (s) não são apontados como regressão: o ruído domina
+LIMIAR_ABSOLUTO = 0.02
+COLUNAS_KPI = ['custo_frota_total', 'valor', 'custo_combustivel_total']
+
+
+def _normalizar(obj):
+    """Converte o resultado em algo serializável e estável para a assinatura."""
+    if dataclasses.is_dataclass(obj):
+        return _normalizar(dataclasses.asdict(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        if isinstance(obj, pd.Index):
+            obj = obj.to_series(index=range(len(obj)))
+        if isinstance(obj, pd.DataFrame):
+            obj = obj.apply(lambda col: col.round(6) if pd.api.types.is_float_dtype(col) else col)
+        elif pd.api.types.is_float_dtype(obj):
+            obj = obj.round(6)
+        return int(pd.util.hash_pandas_object(obj).sum() % (2 ** 61))
+    if isinstance(obj, dict):
+        return {str(chave): _normalizar(valor) for chave, valor in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalizar(valor) for valor in obj]
+    if isinstance(obj, (float, np.floating)):
+        return None if np.isnan(obj) else round(float(obj), 6)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    return obj if obj is None or isinstance(obj, (str, int, bool)) else str(obj)
+
+
+def assinatura(resultado):
+    return hashlib.sha256(json.dumps(_normalizar(resultado), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def medir(funcao, repeticoes):
+    """Menor tempo de `repeticoes` chamadas e o resultado da última."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def medir_limpeza(n_linhas, repeticoes, seed):
+    """
+    Tempo de cada etapa da limpeza (o menor entre as repetições) e o df_final.
+    A geração dos lotes sintéticos é medida à parte e descontada do total.
+    """
+    frota = gerar_frota(n_linhas, seed)
+    abas = gerar_abas_cadastro(frota, seed)
+    df_frota_join, df_filiais_join = _preparar_juncoes(abas['FROTA'], abas['Filiais'])
+
+    tempos = {}
+    for _ in range(repeticoes):
+        iniciar_perfil()
+        inicio = time.perf_counter()
+        lotes = _medir_iteracao('gerar_lotes_bd', gerar_lotes_bd(frota, n_linhas, seed))
+        df_final = limpar_lotes(lotes, df_frota_join, df_filiais_join)
+        total = time.perf_counter() - inicio
+        perfil = obter_perfil_pipeline().set_index('etapa')['segundos']
+        tempos.setdefault('limpeza (total)', []).append(total - perfil.get('gerar_lotes_bd', 0.0))
+        for etapa, segundos in perfil.drop('gerar_lotes_bd', errors='ignore').items():
+            tempos.setdefault(f"limpeza: {etapa}", []).append(segundos)
+
+    medicoes = {nome: {'segundos': min(valores)} for nome, valores in tempos.items()}
+    medicoes['limpeza (total)']['assinatura'] = assinatura(df_final)
+    return medicoes, df_final
+
+
+def medir_calculos(df, repeticoes):
+    """Agregações e KPIs sobre o df_final, sem filtro e com o recorte do último mês e da maior região."""
+    ultimo_mes = df['data'].max().strftime('%Y-%m')
+    ano = int(ultimo_mes[:4])
+    regiao = df['regiao'].value_counts().index[0]
+    filtros = {'ano': ano, 'mes_ano': ultimo_mes, 'regiao': regiao, 'filial': 'Todos'}
+
+    indice = construir_indice_filtros(df)
+    cubo = construir_cubo_mensal(df)
+    cubo_filtrado = recortar_cubo(cubo, filtros)
+    historico = agregar_historico_mensal(df, COLUNAS_KPI)
+    series = series_historico(historico, COLUNAS_KPI)
+
+    casos = {
+        'agregação: construir_indice_filtros': lambda: construir_indice_filtros(df)['opcoes'],
+        'agregação: aplicar_filtros': lambda: aplicar_filtros(df, indice, filtros),
+        'agregação: construir_cubo_mensal': lambda: construir_cubo_mensal(df),
+        'agregação: recortar_cubo': lambda: recortar_cubo(cubo, filtros),
+        'agregação: somar_por (mes_ano)': lambda: somar_por(cubo, 'mes_ano', COLUNAS_KPI),
+        'agregação: contar_placas (regiao)': lambda: contar_placas(cubo, 'regiao'),
+        'agregação: km_por_placa': lambda: km_por_placa(cubo),
+        'agregação: agregar_historico_mensal': lambda: agregar_historico_mensal(df, COLUNAS_KPI),
+        'agregação: series_historico': lambda: series_historico(historico, COLUNAS_KPI),
+        'kpi: calcular_kpis_performance': lambda: calcular_kpis_performance(historico, ano, ultimo_mes, 'custo_frota_total'),
+        'kpi: calcular_kpis_performance (3 colunas)': lambda: calcular_kpis_performance(historico, ano, ultimo_mes, COLUNAS_KPI),
+        'kpi: calcular_evolucao_performance': lambda: calcular_evolucao_performance(series, ultimo_mes, 'custo_frota_total'),
+        'kpi: calcular_kpis_operacionais': lambda: calcular_kpis_operacionais(cubo),
+        'kpi: calcular_kpis_operacionais (filtrado)': lambda: calcular_kpis_operacionais(cubo_filtrado),
+        'kpi: detectar_outliers': lambda: detectar_outliers(df),
+    }
+    medicoes = {}
+    for nome, funcao in casos.items():
+        segundos, resultado = medir(funcao, repeticoes)
+        medicoes[nome] = {'segundos': segundos, 'assinatura': assinatura(resultado)}
+    return medicoes
+
+
+def comparar(medicoes, referencia, tolerancia):
+    """Linhas do relatório, se algum resultado mudou e se algum tempo passou da tolerância."""
+    linhas, divergente, lento = [], False, False
+    for nome, medicao in medicoes.items():
+        base = referencia.get(nome)
+        situacao, variacao = 'sem baseline', ''
+        if base:
+            variacao = f"{(medicao['segundos'] / base['segundos'] - 1) * 100:+.0f}%" if base['segundos'] else ''
+            if medicao.get('assinatura') != base.get('assinatura'):
+                situacao, divergente = 'RESULTADO DIFERENTE', True
+            elif (medicao['segundos'] > base['segundos'] * (1 + tolerancia)
+                  and medicao['segundos'] - base['segundos'] > LIMIAR_ABSOLUTO):
+                situacao, lento = 'MAIS LENTO', True
+            else:
+                situacao = 'ok'
+        linhas.append(f"  {nome:<48} {medicao['segundos']:10.4f} s"
+                      f" {base['segundos'] if base else float('nan'):10.4f} s {variacao:>7}  {situacao}")
+    return linhas, divergente, lento
+
+
+def ambiente():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', nargs='+', choices=list(TAMANHOS), default=['10k', '100k'])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tolerancia', type=float, default=0.30,
+                        help='aumento de tempo aceito em relação ao baseline (fração, padrão 0.30)')
+    parser.add_argument('--estrito', action='store_true',
+                        help='termina com código 1 também quando algum tempo passa da tolerância')
+    parser.add_argument('--baseline', default=ARQUIVO_BASELINE)
+    parser.add_argument('--gravar-baseline', action='store_true',
+                        help='grava as medições como baseline dos tamanhos executados')
+    args = parser.parse_args()
+
+    baseline = {'ambiente': {}, 'tamanhos': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    divergente = lento = False
+    for tamanho in args.tamanhos:
+        n_linhas = TAMANHOS[tamanho]
+        medicoes, df_final = medir_limpeza(n_linhas, args.repeticoes, args.seed)
+        medicoes.update(medir_calculos(df_final, args.repeticoes))
+        del df_final
+
+        print(f"\n{tamanho} linhas ({n_linhas:,}), melhor de {args.repeticoes} execução(ões):")
+        print(f"  {'medição':<48} {'atual':>12} {'baseline':>12} {'var.':>7}  situação")
+        linhas, divergente_tamanho, lento_tamanho = comparar(
+            medicoes, baseline['tamanhos'].get(tamanho, {}), args.tolerancia
+        )
+        print('\n'.join(linhas))
+        divergente |= divergente_tamanho
+        lento |= lento_tamanho
+
+        if args.gravar_baseline:
+            baseline['tamanhos'][tamanho] = medicoes
+
+    if args.gravar_baseline:
+        baseline['ambiente'] = ambiente()
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline gravado em {args.baseline}")
+    elif baseline['ambiente'] and baseline['ambiente'] != ambiente():
+        print(f"\nAVISO: baseline medido em outro ambiente ({baseline['ambiente']}); compare os tempos com cautela.")
+
+    falhou = divergente or (lento and args.estrito)
+    sys.exit(1 if falhou and not args.gravar_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
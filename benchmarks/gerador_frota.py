@@ -0,0 +1,173 @@
+"""
+Gerador de uma frota sintética para os benchmarks.
+
+Produz as abas de origem como a leitura da planilha as entrega (a aba BD em
+lotes, com as mesmas colunas e tipos de ler_aba_em_lotes, e as abas FROTA e
+Filiais), com a sujeira que a limpeza trata: grafias variadas de grupo,
+combustível, rota e contrato, textos em colunas numéricas, Km/L absurdos,
+placas sem cadastro na FROTA e filiais sem nome. O df_final sintético sai do
+próprio pipeline de limpeza aplicado a essas abas, então tem exatamente as
+colunas e os tipos do df_final real.
+
+Tudo é determinístico para uma mesma semente e tamanho de lote.
+"""
+import numpy as np
+import pandas as pd
+
+from src.config.data_provider import TAMANHO_LOTE_LEITURA, _preparar_juncoes, limpar_lotes
+
+MESES = pd.date_range('2023-01-01', periods=36, freq='MS')
+SERIAIS_MESES = (MESES - pd.Timestamp('1899-12-30')).days.to_numpy()
+DIAS_UTEIS_MES = np.array([20, 21, 22, 23])[np.arange(len(MESES)) % 4]
+
+N_FILIAIS = 45
+REGIOES = ['Sul', 'Sudeste', 'Centro-Oeste', 'Nordeste', 'Norte', 'sudeste']
+
+# Grafias encontradas na planilha para cada grupo (a limpeza unifica)
+GRAFIAS_GRUPO = {
+    'Leve': ['Leve', 'LEVE', ' leve '],
+    'Médio': ['Médio', 'MEDIO', 'Kombi'],
+    'Pesado': ['Pesado', 'PESADO'],
+    'Caminhão': ['Caminhão Toco', 'CAMINHAO TRUCK', 'caminhão 3/4'],
+    'Moto': ['Moto', 'MOTO'],
+    'Vazio': ['', '0'],
+}
+PESOS_GRUPO = [0.45, 0.2, 0.1, 0.15, 0.07, 0.03]
+GRAFIAS_DIESEL = ['Diesel', 'DIESEL S10', 'Diesel S500', 'DÍESEL']
+GRAFIAS_GASOLINA = ['Gasolina', 'GASOLINA E ETANOL', 'Etanol']
+GRAFIAS_ROTA = ['Urbano', 'urbano', 'Rodoviário', 'rodoviário', 'Urbano e Rodoviário', 'Urbano E Rodoviário']
+CONTRATOS = [
+    'FEBRABAN SP', 'ECT SUL', 'ECT NORDESTE', 'LATAM CARGO', 'ADMINISTRATIVO', 'CARGAS GERAIS',
+    'LEROY MERLIN', 'DHL', 'BANCOOB', 'BASSO', 'FAHECE', 'ESTRUTURAL', 'OUTRA FILIAL', 'SPOT', 'CONT', '',
+]
+MARCAS = ['Volkswagen', 'Fiat', 'Ford', 'Mercedes-Benz', 'Renault', 'Iveco', 'Honda']
+N_MODELOS = 300
+N_ROTEIROS = 500
+
+
+def _placas(n):
+    """Placas no padrão Mercosul (AAA0A00), distintas e determinísticas."""
+    letras = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    i = np.arange(n)
+    final, i = (i % 100).astype(str), i // 100
+    quinta, i = letras[i % 26], i // 26
+    quarta, i = (i % 10).astype(str), i // 10
+    prefixo = letras[i // 676 % 26].astype(object) + letras[i // 26 % 26] + letras[i % 26]
+    return (prefixo + quarta + quinta + np.char.zfill(final, 2)).astype(object)
+
+
+def gerar_frota(n_linhas, seed=42):
+    """
+    Veículos da frota sintética (um por placa), com atributos fixos por veículo.
+    O número de placas cresce com o de linhas (cerca de uma linha por veículo e
+    mês, mais os lançamentos extras), limitado a 30 mil veículos.
+    """
+    rng = np.random.default_rng(seed)
+    n_placas = int(np.clip(n_linhas // 40, 50, 30_000))
+
+    grupos = rng.choice(list(GRAFIAS_GRUPO), n_placas, p=PESOS_GRUPO)
+    grafia_grupo = np.array([rng.choice(GRAFIAS_GRUPO[grupo]) for grupo in grupos], dtype=object)
+    modelo = rng.integers(0, N_MODELOS, n_placas)
+    diesel = np.isin(grupos, ['Pesado', 'Caminhão']) | (rng.random(n_placas) < 0.1)
+    combustivel = np.where(diesel, rng.choice(GRAFIAS_DIESEL, n_placas), rng.choice(GRAFIAS_GASOLINA, n_placas))
+    kml_base = np.select(
+        [grupos == 'Moto', grupos == 'Caminhão', grupos == 'Pesado', grupos == 'Médio'], [30.0, 3.5, 5.0, 8.0], 11.0
+    ) * rng.uniform(0.85, 1.15, n_placas)
+    km_mes = np.select([grupos == 'Caminhão', grupos == 'Pesado'], [6000.0, 4500.0], 2500.0)
+
+    return pd.DataFrame({
+        'Placa': _placas(n_placas),
+        'Ano': rng.integers(2008, 2026, n_placas),
+        'GrupoCorreto': grafia_grupo,
+        'Modelo': np.array([f"Modelo {i:03d}" for i in range(N_MODELOS)], dtype=object)[modelo],
+        'Marca': np.array(MARCAS, dtype=object)[modelo % len(MARCAS)],
+        'TP.Comb': combustivel.astype(object),
+        'TP.Rota': rng.choice(GRAFIAS_ROTA, n_placas).astype(object),
+        'Contrato': rng.choice(CONTRATOS, n_placas).astype(object),
+        'ID Filial': rng.integers(1, N_FILIAIS + 1, n_placas),
+        'Motorista Principal': np.array([f"Motorista {i}" for i in rng.permutation(n_placas)], dtype=object),
+        'kml_base': kml_base,
+        'km_mes': km_mes,
+    })
+
+
+def gerar_abas_cadastro(frota, seed=42):
+    """Abas FROTA (3% das placas sem cadastro) e Filiais (algumas filiais sem nome)."""
+    rng = np.random.default_rng([seed, 1])
+    cadastradas = frota[rng.random(len(frota)) >= 0.03]
+    ids = np.arange(1, N_FILIAIS + 1)
+    return {
+        'FROTA': cadastradas[['Placa', 'Ano']].reset_index(drop=True),
+        'Filiais': pd.DataFrame({
+            'ID Filial': ids,
+            'Filial': np.where(ids % 17 == 0, '', np.char.add('FILIAL ', ids.astype(str))).astype(object),
+            'Regiao': np.array(REGIOES, dtype=object)[ids % len(REGIOES)],
+        }),
+    }
+
+
+def _lote_bd(frota, n, rng):
+    veiculo = rng.integers(0, len(frota), n)
+    mes = rng.integers(0, len(MESES), n)
+    v = frota.iloc[veiculo].reset_index(drop=True)
+
+    km = (v['km_mes'].to_numpy() * rng.gamma(4, 0.25, n)).round()
+    km_inicial = rng.integers(0, 400_000, n)
+    # ~2% de odômetros invertidos (Km Final < Km Inicial)
+    km_final = np.where(rng.random(n) < 0.02, km_inicial - 100, km_inicial + km)
+    kml = v['kml_base'].to_numpy() * rng.uniform(0.9, 1.1, n)
+    litros = km / kml
+    valor_comb = (litros * np.where(v['TP.Comb'].str.upper().str.contains('DI'), 6.1, 5.8)).round(2)
+    # ~8% de leituras absurdas de Km/L e ~2% sem leitura
+    kml = np.where(rng.random(n) < 0.08, rng.uniform(0, 80, n), kml)
+    kml = np.where(rng.random(n) < 0.02, np.nan, kml)
+    manutencao = rng.gamma(1.2, 700, n).round(2)
+    # ~1% de textos ('-') na coluna de lataria, como na planilha
+    lataria = np.where(rng.random(n) < 0.85, 0.0, rng.gamma(1, 1500, n).round(2)).astype(object)
+    lataria[rng.random(n) < 0.01] = '-'
+    dias_uteis = DIAS_UTEIS_MES[mes]
+
+    return pd.DataFrame({
+        'Mês': SERIAIS_MESES[mes],
+        'Placa': v['Placa'],
+        'ID Filial': v['ID Filial'],
+        'GrupoCorreto': v['GrupoCorreto'],
+        'Contrato': v['Contrato'],
+        'Modelo': v['Modelo'],
+        'Marca': v['Marca'],
+        'TP.Comb': v['TP.Comb'],
+        'TP.Rota': v['TP.Rota'],
+        'Roteiro Principal': np.char.add('Rota ', rng.integers(1, N_ROTEIROS, n).astype(str)).astype(object),
+        'Motorista Principal': v['Motorista Principal'],
+        'Lataria e Pintura': lataria,
+        'Manutenção': manutencao,
+        'Rodas / Pneus': np.where(rng.random(n) < 0.7, 0.0, rng.gamma(1, 600, n).round(2)),
+        'Valor Comb.': valor_comb,
+        'Arla': np.where(v['TP.Comb'].str.upper().str.contains('DI'), (litros * 0.05 * 3.9).round(2), 0.0),
+        'Km Inicial': km_inicial,
+        'Km Final': km_final,
+        'Total de Km': np.where(rng.random(n) < 0.05, np.nan, km),
+        'Média Km/l': kml,
+        'Comb / Km': np.where(km > 0, valor_comb / np.maximum(km, 1), np.nan),
+        'Litros Comb.': litros.round(2),
+        'Man / Km': np.where(km > 0, manutencao / np.maximum(km, 1), np.nan),
+        'Dias Úteis': dias_uteis,
+        'DUC': rng.integers(0, dias_uteis + 1),
+        'DUK': rng.integers(0, dias_uteis + 1),
+        'DUL': rng.integers(0, dias_uteis + 1),
+    })
+
+
+def gerar_lotes_bd(frota, n_linhas, seed=42, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """Aba BD sintética em lotes de até `tamanho_lote` linhas, como ler_aba_em_lotes."""
+    for i, inicio in enumerate(range(0, n_linhas, tamanho_lote)):
+        rng = np.random.default_rng([seed, 2, i])
+        yield _lote_bd(frota, min(tamanho_lote, n_linhas - inicio), rng)
+
+
+def gerar_df_final(n_linhas, seed=42):
+    """df_final sintético: as abas geradas passadas pelo pipeline de limpeza."""
+    frota = gerar_frota(n_linhas, seed)
+    abas = gerar_abas_cadastro(frota, seed)
+    df_frota_join, df_filiais_join = _preparar_juncoes(abas['FROTA'], abas['Filiais'])
+    return limpar_lotes(gerar_lotes_bd(frota, n_linhas, seed), df_frota_join, df_filiais_join)
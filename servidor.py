@@ -0,0 +1,21 @@
+# servidor.py
+# Ponto de entrada do servidor: `streamlit run servidor.py` serve o app.py e, no
+# lifespan do st.App (quando o processo sobe, antes da primeira sessão), inicia
+# o aquecimento dos caches em segundo plano. Com `streamlit run app.py` o app
+# funciona igual, só que sem o aquecimento.
+import os
+import logging
+from contextlib import asynccontextmanager
+import streamlit as st
+from src.config.cache_warmup import iniciar_aquecimento
+
+# Mesmo log do app.py, já configurado para a primeira rodada do aquecimento
+logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s')
+logging.getLogger('src.config').setLevel(os.getenv('NIVEL_LOG', 'INFO').upper())
+
+@asynccontextmanager
+async def lifespan(app):
+    iniciar_aquecimento()
+    yield
+
+app = st.App('app.py', lifespan=lifespan)
@@ -0,0 +1,147 @@
+# src/config/base_painel.py
+from dataclasses import dataclass
+from typing import Optional
+import pandas as pd
+import streamlit as st
+from src.config import sql_provider
+from src.config.data_provider import (
+    FONTE_DADOS, get_data, get_recorte_sql, get_relatorio_memoria, relatorio_memoria,
+    versao_dados, converter_para_categorico
+)
+from src.config.filter_index import obter_indice_filtros, aplicar_filtros
+from src.config.monthly_cube import (
+    COLUNAS_SOMA, DIMENSOES_CUBO, MEDIDAS_CUBO, construir_cubo_agregado, obter_cubo_mensal
+)
+from src.config.kpi_engine import COLUNAS_PERFORMANCE, agregar_historico_mensal
+from src.config.outlier_engine import ATRIBUTOS_VEICULO, classificar_veiculos, detectar_outliers
+from src.config.page_cache import memorizar
+
+# --- BASE DAS PÁGINAS POR RECORTE DE ANOS ---
+# Tudo o que as páginas usam além das linhas filtradas: a versão dos dados, o
+# índice dos filtros, o cubo mensal e a série mensal dos KPIs de performance.
+# Com a planilha, sai do dataset em memória (get_data). Com FONTE_DADOS=sql, o
+# cubo e a série mensal são agregados no banco (sql_provider.agregar_mensal) e
+# as páginas leem só as linhas do estado de filtro atual, com os filtros no
+# WHERE (get_recorte_sql): a tabela de fatos do período não fica em memória.
+
+@dataclass(frozen=True)
+class BasePainel:
+    """Versão, índice de filtros, cubo e série mensal de um recorte de anos."""
+    versao: str
+    # filter_index; com SQL, construído sobre as células do cubo (só as opções são usadas)
+    indice: dict
+    cubo: dict
+    # Série mensal do histórico (kpi_engine.agregar_historico_mensal das COLUNAS_PERFORMANCE)
+    historico_mensal: pd.DataFrame
+    total_registros: int
+    ano_min: int
+    ano_max: int
+    # Linhas do recorte de anos (só com a planilha; com SQL, None)
+    df: Optional[pd.DataFrame] = None
+
+def _base_planilha(anos):
+    df = get_data(anos)
+    if df.empty:
+        return None
+    versao = versao_dados(df)
+    return BasePainel(
+        versao=versao,
+        indice=obter_indice_filtros(df, versao),
+        cubo=obter_cubo_mensal(df, versao),
+        historico_mensal=memorizar('historico_mensal', (versao,), agregar_historico_mensal, df, COLUNAS_PERFORMANCE),
+        total_registros=len(df),
+        ano_min=int(df['ano'].min()),
+        ano_max=int(df['ano'].max()),
+        df=df,
+    )
+
+def _historico_mensal_sql(engine, anos):
+    """Série mensal das COLUNAS_PERFORMANCE somadas no banco, no formato de agregar_historico_mensal."""
+    mensal = sql_provider.agregar_mensal(engine, COLUNAS_PERFORMANCE, anos=anos,
+                                         medidas={'dias_uteis': ('min', 'Dias Úteis')})
+    mensal = mensal.set_index(mensal['mes_ano'].astype(str))[COLUNAS_PERFORMANCE + ['placas', 'dias_uteis']]
+    # Sem a ordem das linhas no banco, o Dias Úteis "da primeira linha" do mês é o menor do mês
+    mensal.insert(len(COLUNAS_PERFORMANCE) + 1, 'dias_uteis_primeira_linha', mensal['dias_uteis'])
+    mensal.index.name = 'mes_ano'
+    return mensal.sort_index()
+
+@st.cache_resource(ttl=3600, max_entries=4)
+def _base_sql(anos):
+    """Base montada com consultas agregadas; guardada uma vez por processo, como get_data."""
+    engine = sql_provider.obter_engine()
+    versao = sql_provider.assinatura_dados(engine, anos)
+    agregado = sql_provider.agregar_mensal(
+        engine, COLUNAS_SOMA, por=DIMENSOES_CUBO + ['ano', 'Placa'], anos=anos, medidas=MEDIDAS_CUBO
+    )
+    if agregado.empty:
+        return None
+    cubo = construir_cubo_agregado(converter_para_categorico(agregado))
+    celulas = cubo['celulas']
+    return BasePainel(
+        versao=versao,
+        indice=obter_indice_filtros(celulas, versao),
+        cubo=cubo,
+        historico_mensal=_historico_mensal_sql(engine, anos),
+        total_registros=int(celulas['n_registros'].sum()),
+        ano_min=int(celulas['ano'].min()),
+        ano_max=int(celulas['ano'].max()),
+    )
+
+def obter_base_painel(anos=None):
+    """Base das páginas para o recorte de anos (tupla; None = todos), ou None se não houver dados."""
+    if FONTE_DADOS != 'sql':
+        return _base_planilha(anos)
+    try:
+        return _base_sql(anos)
+    except Exception as e:
+        st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
+        return None
+
+def obter_linhas(base, anos, filtros):
+    """
+    Linhas do estado de filtro: recorte do dataset em memória (planilha) ou
+    consulta com os filtros no WHERE (SQL). None se a leitura falhar.
+    """
+    if base.df is not None:
+        return aplicar_filtros(base.df, base.indice, filtros)
+    try:
+        return get_recorte_sql(anos, filtros, base.versao)
+    except Exception as e:
+        st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
+        return None
+
+def obter_relatorio_memoria(base, anos, df_filtrado, chave_filtros):
+    """Memória do dataset carregado (planilha) ou das linhas do estado de filtro (SQL)."""
+    if base.df is not None:
+        return get_relatorio_memoria(anos)
+    return memorizar('relatorio_memoria', chave_filtros, relatorio_memoria, df_filtrado)
+
+def _veiculos_sql(engine, anos, periodo):
+    """Custo total e atributos de cada veículo no período, agregados no banco (formato de totais_por_veiculo)."""
+    # Sem a ordem das linhas no banco, o atributo "primeiro" de cada veículo é o maior valor
+    veiculos = sql_provider.agregar_mensal(engine, ['custo_frota_total'], por=['Placa'], anos=anos, filtros=periodo,
+                                           medidas={col: ('max', col) for col in ATRIBUTOS_VEICULO})
+    veiculos = veiculos.dropna(subset=['Placa'])
+    return veiculos[['Placa'] + ATRIBUTOS_VEICULO + ['custo_frota_total']].reset_index(drop=True)
+
+def _outliers_periodo(base, anos, periodo):
+    if base.df is not None:
+        return detectar_outliers(aplicar_filtros(base.df, base.indice, periodo))
+    return classificar_veiculos(_veiculos_sql(sql_provider.obter_engine(), anos, periodo))
+
+def obter_outliers_periodo(base, anos, filtros, chave_periodo):
+    """
+    Outliers de custo da frota inteira no ano e mês dos filtros (região e filial
+    não entram), memorizados por chave_periodo. None se a leitura falhar.
+    """
+    periodo = {'ano': filtros['ano'], 'mes_ano': filtros['mes_ano']}
+    try:
+        return memorizar('outliers_custo', chave_periodo, _outliers_periodo, base, anos, periodo)
+    except Exception as e:
+        st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
+        return None
+
+def limpar_base_painel():
+    """Descarta as bases e recortes guardados (o dataset da planilha é limpo por get_data.clear())."""
+    _base_sql.clear()
+    get_recorte_sql.clear()
@@ -0,0 +1,114 @@
+# src/config/cache_warmup.py
+import os
+import json
+import time
+import logging
+import threading
+import pandas as pd
+from src.config.data_provider import get_anos_disponiveis
+from src.config.base_painel import obter_base_painel
+from src.config.monthly_cube import recortar_cubo
+from src.config.page_cache import chave_memo
+from src.config.kpi_engine import COLUNAS_PERFORMANCE
+from calculations import obter_resumo_executivo, obter_kpis_operacionais, obter_kpis_performance, obter_series_historico
+
+# --- AQUECIMENTO DOS CACHES ---
+# Uma thread em segundo plano carrega o dataset do ano mais recente (o que o app
+# abre por padrão) e pré-calcula, pelos mesmos caches das páginas, as séries
+# mensais do histórico e o resumo, os KPIs operacionais e os de performance das
+# combinações de filtro mais usadas: visão consolidada e cada região (ano
+# inteiro e último mês) e cada filial no seu último mês com dados. A thread é
+# iniciada quando o servidor sobe, pelo lifespan do st.App em servidor.py (antes
+# da primeira sessão), e repete o aquecimento a cada AQUECIMENTO_INTERVALO_MIN
+# minutos (abaixo do TTL de 1 h de get_data), para que os caches não esfriem
+# entre um acesso e outro.
+logger = logging.getLogger(__name__)
+AQUECER_CACHE = os.getenv('AQUECER_CACHE', '1').strip().lower() in ('1', 'true', 'sim')
+INTERVALO_AQUECIMENTO_MIN = float(os.getenv('AQUECIMENTO_INTERVALO_MIN', '50'))
+
+_trava = threading.Lock()
+_thread = None
+_estado = {'execucoes': 0, 'inicio': None, 'segundos': None, 'combinacoes': 0, 'erro': None}
+
+def combinacoes_aquecimento(cubo, opcoes, ano):
+    """Filtros a pré-calcular no ano: consolidado e regiões (ano e último mês) e filiais no último mês."""
+    meses = opcoes['meses_por_ano'].get(ano, [])
+    if not meses:
+        return []
+    ultimo_mes = meses[-1]
+
+    combinacoes = []
+    for regiao in ['Todos'] + opcoes['regioes']:
+        for mes in ('Todos', ultimo_mes):
+            combinacoes.append({'ano': ano, 'mes_ano': mes, 'regiao': regiao, 'filial': 'Todos'})
+
+    celulas = cubo['celulas']
+    ultimos_meses = celulas.loc[celulas['ano'] == ano, ['filial', 'mes_ano']].astype(str).groupby('filial')['mes_ano'].max()
+    for filial, mes in ultimos_meses.items():
+        combinacoes.append({'ano': ano, 'mes_ano': mes, 'regiao': 'Todos', 'filial': filial})
+    return combinacoes
+
+def aquecer_caches():
+    """Carrega o dataset padrão e pré-calcula as combinações de filtro; retorna quantas foram calculadas."""
+    anos = get_anos_disponiveis()
+    if not anos:
+        return 0
+    ano = max(anos)
+    # Mesmo recorte de anos que o app carrega para o ano selecionado
+    base = obter_base_painel((ano - 1, ano))
+    if base is None:
+        return 0
+
+    versao, cubo = base.versao, base.cubo
+    combinacoes = combinacoes_aquecimento(cubo, base.indice['opcoes'], ano)
+
+    obter_series_historico(base.historico_mensal, chave_memo(versao, {'ano': ano}))
+    periodos = set()
+    for filtros in combinacoes:
+        chave_filtros = chave_memo(versao, filtros)
+        cubo_filtrado = recortar_cubo(cubo, filtros)
+        obter_resumo_executivo(cubo_filtrado, cubo, chave_filtros)
+        obter_kpis_operacionais(cubo_filtrado, chave_filtros)
+
+        # KPIs de performance dependem só do ano e do mês (histórico inteiro)
+        if filtros['mes_ano'] not in periodos:
+            periodos.add(filtros['mes_ano'])
+            chave_periodo = chave_memo(versao, {'ano': ano, 'mes_ano': filtros['mes_ano']})
+            for coluna in COLUNAS_PERFORMANCE:
+                obter_kpis_performance(base.historico_mensal, ano, filtros['mes_ano'], coluna, chave_periodo)
+    return len(combinacoes)
+
+def _executar():
+    while True:
+        inicio = time.perf_counter()
+        with _trava:
+            _estado['inicio'] = pd.Timestamp.now()
+        try:
+            combinacoes, erro = aquecer_caches(), None
+        except Exception as e:
+            combinacoes, erro = 0, str(e)
+            logger.warning(f"Falha no aquecimento dos caches: {e}")
+        segundos = time.perf_counter() - inicio
+        with _trava:
+            _estado.update(combinacoes=combinacoes, erro=erro, segundos=segundos, execucoes=_estado['execucoes'] + 1)
+        logger.info(json.dumps({
+            'evento': 'aquecimento_cache', 'combinacoes': combinacoes, 'segundos': round(segundos, 3), 'erro': erro
+        }, ensure_ascii=False))
+        if INTERVALO_AQUECIMENTO_MIN <= 0:
+            return
+        time.sleep(INTERVALO_AQUECIMENTO_MIN * 60)
+
+def iniciar_aquecimento():
+    """Inicia a thread de aquecimento, uma única vez por processo (chamadas seguintes não fazem nada)."""
+    global _thread
+    if not AQUECER_CACHE:
+        return
+    with _trava:
+        if _thread is None:
+            _thread = threading.Thread(target=_executar, name='aquecimento-cache', daemon=True)
+            _thread.start()
+
+def estado_aquecimento():
+    """Execuções, início e duração da última rodada, combinações aquecidas e o último erro."""
+    with _trava:
+        return dict(_estado, ativo=_thread is not None and _thread.is_alive())
@@ -1,8 +1,92 @@
 import os
+import sys
+import json
+import time
+import hashlib
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import streamlit as st
 from datetime import datetime
+from pandas.api.types import infer_dtype, union_categoricals
+from pandas.io.parsers import TextParser
+from pyxlsb import open_workbook
+from dotenv import load_dotenv
+from src.config import sql_provider
+
+# --- PERFIL DAS ETAPAS DO PIPELINE ---
+# Cada etapa registra tempo, linhas de entrada/saída e a variação de memória do
+# DataFrame (rasa: sem o conteúdo dos textos). PERFIL_ETAPAS guarda o último
+# processamento da planilha; na leitura em lotes cada etapa acumula todos os lotes.
+# Ao final, o perfil vai para o log, uma linha JSON por etapa.
+logger = logging.getLogger(__name__)
+PERFIL_ETAPAS = {}
+
+def _linhas(obj):
+    """Linhas de um DataFrame (ou soma das linhas dos DataFrames de um dict/tupla); None se não houver."""
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    itens = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, (list, tuple)) else []
+    frames = [item for item in itens if isinstance(item, pd.DataFrame)]
+    return sum(len(frame) for frame in frames) if frames else None
+
+def _memoria(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    itens = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, (list, tuple)) else []
+    return sum(_memoria(item) for item in itens if isinstance(item, pd.DataFrame))
+
+def _registrar_etapa(nome, segundos, linhas_entrada, memoria_entrada, saida):
+    registro = PERFIL_ETAPAS.setdefault(nome, {
+        'etapa': nome, 'chamadas': 0, 'segundos': 0.0,
+        'linhas_entrada': None, 'linhas_saida': None, 'memoria_mb': 0.0,
+    })
+    registro['chamadas'] += 1
+    registro['segundos'] += segundos
+    linhas_saida = _linhas(saida)
+    if linhas_entrada is not None:
+        registro['linhas_entrada'] = (registro['linhas_entrada'] or 0) + linhas_entrada
+    if linhas_saida is not None:
+        registro['linhas_saida'] = (registro['linhas_saida'] or 0) + linhas_saida
+    registro['memoria_mb'] += (_memoria(saida) - memoria_entrada) / 1024 ** 2
+
+def etapa_pipeline(funcao):
+    """Registra no perfil cada chamada da função (o primeiro argumento é a entrada da etapa)."""
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        entrada = args[0] if args else None
+        linhas_entrada, memoria_entrada = _linhas(entrada), _memoria(entrada)
+        inicio = time.perf_counter()
+        saida = funcao(*args, **kwargs)
+        _registrar_etapa(funcao.__name__, time.perf_counter() - inicio, linhas_entrada, memoria_entrada, saida)
+        return saida
+    return medida
+
+def _medir_iteracao(nome, iteravel):
+    """Repassa os itens do iterável, registrando na etapa `nome` o tempo gasto para produzir cada um."""
+    iterador = iter(iteravel)
+    while True:
+        inicio = time.perf_counter()
+        item = next(iterador, None)
+        if item is None:
+            return
+        _registrar_etapa(nome, time.perf_counter() - inicio, None, 0, item)
+        yield item
+
+def iniciar_perfil():
+    PERFIL_ETAPAS.clear()
+
+def registrar_perfil():
+    """Envia o perfil do processamento ao log (uma linha JSON por etapa)."""
+    for registro in PERFIL_ETAPAS.values():
+        logger.info(json.dumps({'evento': 'etapa_pipeline', **registro}, ensure_ascii=False))
+
+def obter_perfil_pipeline():
+    """Perfil do último processamento da planilha neste processo, uma linha por etapa."""
+    colunas = ['etapa', 'chamadas', 'segundos', 'linhas_entrada', 'linhas_saida', 'memoria_mb']
+    return pd.DataFrame(list(PERFIL_ETAPAS.values()), columns=colunas)
 
 def clean_col_names(df):
     cols = df.columns
@@ -10,6 +94,7 @@ def clean_col_names(df):
     df.columns = new_cols
     return df
 
+@etapa_pipeline
 def limpar_dados_combustivel(df):
     """Padroniza os tipos de combustível"""
     if 'TP.Comb' not in df.columns:
@@ -44,6 +129,7 @@ def limpar_dados_combustivel(df):
     
     return df
 
+@etapa_pipeline
 def limpar_dados_tp_rota(df):
     """Padroniza os tipos de rota"""
     if 'TP.Rota' not in df.columns:
@@ -65,6 +151,40 @@ def limpar_dados_tp_rota(df):
     df['TP.Rota'] = df['TP.Rota'].replace(mapeamento_rota)
     return df
 
+# Regras de classificação dos grupos de veículo (valores comparados em maiúsculas):
+#   vazios -> grupo padrão sem aviso; contem -> palavra-chave contida no valor
+#   (tem prioridade); exatos -> valor idêntico; o resto cai no grupo padrão.
+# Novos grupos são cadastrados no JSON, sem alterar o código.
+ARQUIVO_REGRAS_GRUPO_VEICULO = os.path.join(os.path.dirname(__file__), 'grupos_veiculo.json')
+
+def carregar_regras_grupo_veiculo(caminho=ARQUIVO_REGRAS_GRUPO_VEICULO):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+REGRAS_GRUPO_VEICULO = carregar_regras_grupo_veiculo()
+
+def classificar_grupos_veiculo(grupos, regras=REGRAS_GRUPO_VEICULO):
+    """
+    Classifica valores distintos de grupo segundo as regras. Retorna a série de
+    grupos padronizados e a máscara dos valores que não casaram com nenhuma regra.
+    """
+    grupo_clean = grupos.str.upper().str.strip()
+    classificados = pd.Series(regras['padrao'], index=grupos.index, dtype=object)
+    resolvido = grupo_clean.isin(regras['vazios'])
+
+    for palavra_chave, grupo in regras['contem'].items():
+        mask = ~resolvido & grupo_clean.str.contains(palavra_chave, regex=False)
+        classificados[mask] = grupo
+        resolvido |= mask
+
+    exatos = grupo_clean.map(regras['exatos'])
+    mask = ~resolvido & exatos.notna()
+    classificados[mask] = exatos[mask]
+    resolvido |= mask
+
+    return classificados, ~resolvido
+
+@etapa_pipeline
 def limpar_dados_grupo_veiculo(df):
     """Padroniza e agrupa os tipos de veículo em 4 categorias"""
     if 'grupocorreto' not in df.columns:
@@ -73,39 +193,64 @@ def limpar_dados_grupo_veiculo(df):
     # Converter para string, limpar espaços e padronizar
     df['grupocorreto'] = df['grupocorreto'].astype(str).str.strip()
 
-    # Criar nova coluna com grupos padronizados
-    def classificar_veiculo(grupo):
-        if pd.isna(grupo) or grupo == 'nan' or str(grupo).strip() == '' or str(grupo) == '0':
-            return 'Outros'
-
-        grupo_clean = str(grupo).upper().strip()
-
-        # Verificar caminhões (qualquer coisa que contenha "CAMINHAO" ou "CAMINHÃO")
-        if 'CAMINHÃO' in grupo_clean or 'CAMINHAO' in grupo_clean:
-            return 'Caminhão'
-
-        # Verificar tipos específicos
-        elif grupo_clean == 'KOMBI':
-            return 'Médio'
-        elif grupo_clean == 'MOTO':
-            return 'Leve'
-        elif grupo_clean == 'LEVE':
-            return 'Leve'
-        elif grupo_clean in ['MÉDIO', 'MEDIO']:
-            return 'Médio'
-        elif grupo_clean == 'PESADO':
-            return 'Pesado'
-        elif grupo_clean == '0' or grupo_clean == 'NAN':
-            return 'Outros'
-        else:
-            print(f"Valor não classificado: '{grupo}' -> '{grupo_clean}'")
-            return 'Outros'
+    # Classifica uma vez por valor distinto e devolve o resultado como categórico
+    codigos, valores = pd.factorize(df['grupocorreto'])
+    classificados, nao_classificados = classificar_grupos_veiculo(pd.Series(valores))
+
+    categorias = sorted(set(classificados))
+    codigos_grupo = pd.Categorical(classificados, categories=categorias).codes
+    df['grupocorreto'] = pd.Categorical.from_codes(codigos_grupo[codigos], categories=categorias)
 
-    # Aplicar a classificação
-    df['grupocorreto'] = df['grupocorreto'].apply(classificar_veiculo)
+    if nao_classificados.any():
+        contagem = pd.Series(np.bincount(codigos, minlength=len(valores)), index=valores)[nao_classificados.to_numpy()]
+        resumo = ", ".join(f"'{valor}' ({qtd})" for valor, qtd in contagem.sort_values(ascending=False).items())
+        print(f"AVISO: {int(contagem.sum())} registros com grupo de veículo não classificado, agrupados em "
+              f"'{REGRAS_GRUPO_VEICULO['padrao']}': {resumo}")
 
     return df
 
+# Regras de agrupamento de contratos, avaliadas em ordem: vale a primeira
+# palavra-chave encontrada no nome do contrato (já em maiúsculas).
+REGRAS_CONTRATO = [
+    ('FEBRABAN', 'FEBRABAN'),
+    ('ECT', 'ECT'),
+    ('LATAM', 'LATAM'),
+    ('ADMINISTRATIVO', 'ADMINISTRATIVO'),
+    ('CARGAS', 'CARGAS'),
+    ('LEROY', 'LEROY MERLIN'),
+    ('DHL', 'DHL'),
+    ('BANCOOB', 'BANCOOB'),
+    ('BASSO', 'BASSO'),
+    ('FAHECE', 'FAHECE'),
+    ('ESTRUTURAL', 'ESTRUTURAL'),
+    ('OUTRA FILIAL', 'OUTRA FILIAL'),
+]
+CONTRATOS_NAO_INFORMADOS = ['NAN', 'CONT', '']
+FILIAIS_NAO_INFORMADAS = ['NÃO INFORMADO', 'NAN', '']
+
+def classificar_contratos(contratos, filiais):
+    """
+    Classifica pares (contrato, filial) já únicos em 'Categoria - Filial'
+    (Title Case), avaliando REGRAS_CONTRATO de forma vetorizada.
+    """
+    contrato_clean = contratos.str.upper().str.strip()
+    filial_clean = filiais.str.upper().str.strip()
+
+    # --- Parte 1: Determinar a Categoria Base ---
+    condicoes = [contrato_clean.isin(CONTRATOS_NAO_INFORMADOS)]
+    categorias = ['Contrato Não Informado']
+    for palavra_chave, categoria in REGRAS_CONTRATO:
+        condicoes.append(contrato_clean.str.contains(palavra_chave, regex=False))
+        categorias.append(categoria)
+    categoria_base = np.select(condicoes, categorias, default='Outros')
+
+    # --- Parte 2: Preparar a Filial ("penaliza" os dados não preenchidos) ---
+    filial_formatada = filial_clean.where(~filial_clean.isin(FILIAIS_NAO_INFORMADAS), 'Filial Não Informada')
+
+    # --- Parte 3: Junta categoria e filial, sempre, em Title Case ---
+    return (pd.Series(categoria_base, index=contratos.index) + ' - ' + filial_formatada).str.title()
+
+@etapa_pipeline
 def limpar_dados_contratos(df):
     """
     Padroniza e agrupa os contratos, fazendo o merge obrigatório com a filial
@@ -120,60 +265,29 @@ def limpar_dados_contratos(df):
     df['contrato'] = df['contrato'].astype(str).str.strip()
     df['filial'] = df['filial'].astype(str).str.strip()
 
-    def classificar_e_juntar_com_filial(row):
-        contrato_clean = str(row['contrato']).upper().strip()
-        filial_clean = str(row['filial']).upper().strip()
-
-        # --- Parte 1: Determinar a Categoria Base (Lógica simplificada e corrigida) ---
-        categoria_base = ''
-        if pd.isna(contrato_clean) or contrato_clean in ['NAN', 'CONT', '']:
-            categoria_base = 'Contrato Não Informado'
-        elif 'FEBRABAN' in contrato_clean:
-            categoria_base = 'FEBRABAN'
-        elif 'ECT' in contrato_clean:
-            categoria_base = 'ECT'
-        elif 'LATAM' in contrato_clean:
-            categoria_base = 'LATAM'
-        elif 'ADMINISTRATIVO' in contrato_clean:
-            categoria_base = 'ADMINISTRATIVO'
-        elif 'CARGAS' in contrato_clean:
-            categoria_base = 'CARGAS'
-        elif 'LEROY' in contrato_clean:
-            categoria_base = 'LEROY MERLIN'
-        elif 'DHL' in contrato_clean:
-            categoria_base = 'DHL'
-        elif 'BANCOOB' in contrato_clean:
-            categoria_base = 'BANCOOB'
-        elif 'BASSO' in contrato_clean:
-            categoria_base = 'BASSO'
-        elif 'FAHECE' in contrato_clean:
-            categoria_base = 'FAHECE'
-        elif 'ESTRUTURAL' in contrato_clean:
-            categoria_base = 'ESTRUTURAL'
-        elif 'OUTRA FILIAL' in contrato_clean:
-            categoria_base = 'OUTRA FILIAL'
-        else:
-            categoria_base = 'Outros'
-
-        # --- Parte 2: Preparar a Filial e Fazer o Merge Obrigatório ---
-        filial_formatada = ''
-        if pd.isna(filial_clean) or filial_clean in ['NÃO INFORMADO', 'NAN', '']:
-            # "Penaliza" os dados não preenchidos como solicitado
-            filial_formatada = 'Filial Não Informada'
-        else:
-            filial_formatada = filial_clean
-
-        # Junta a categoria e a filial, sempre
-        resultado_final = f"{categoria_base} - {filial_formatada}"
+    # Classifica uma vez por par (contrato, filial) distinto e devolve o resultado a cada linha
+    codigos_contrato, contratos = pd.factorize(df['contrato'])
+    codigos_filial, filiais = pd.factorize(df['filial'])
+    codigos_par, pares = pd.factorize(codigos_contrato * len(filiais) + codigos_filial)
+    agrupados = classificar_contratos(
+        pd.Series(contratos[pares // len(filiais)]),
+        pd.Series(filiais[pares % len(filiais)])
+    )
+    df['contrato_agrupado'] = agrupados.to_numpy()[codigos_par]
 
-        # --- Parte 3: Aplicar a Formatação para Title Case ---
-        return resultado_final.title()
+    return df
 
-    # Aplica a função para cada linha do DataFrame
-    df['contrato_agrupado'] = df.apply(classificar_e_juntar_com_filial, axis=1)
+def _maiusculas(serie):
+    """Equivale a astype(str).str.upper(); em colunas categóricas opera só sobre as categorias."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories.astype(str).str.upper()
+        if categorias.is_unique:
+            return serie.cat.rename_categories(categorias)
+    return serie.astype(str).str.upper()
 
-    return df
+MOTIVOS_AJUSTE_KML = ['Original (Moto)', 'Ajustado pela Média do Modelo', 'Original (Valido)']
 
+@etapa_pipeline
 def filtrar_outliers_de_kml(df):
     
     # Verifica se as colunas essenciais para a nova lógica existem
@@ -191,167 +305,907 @@ def filtrar_outliers_de_kml(df):
     df['media_km_litro_ajustado'] = pd.to_numeric(df['media_km_litro'], errors='coerce')
     
     # Garante que a coluna 'grupocorreto' esteja limpa e em maiúsculas para a verificação
-    df['grupocorreto'] = df['grupocorreto'].astype(str).str.upper()
+    df['grupocorreto'] = _maiusculas(df['grupocorreto'])
 
     # --- 2. CÁLCULO DAS MÉDIAS DE REFERÊNCIA ---
-    # Primeiro, criamos um dataframe apenas com os dados "bons" para calcular as médias
-    df_validos = df[
+    # Considera apenas os dados "bons", sem copiar o DataFrame
+    mask_referencia = (
         (df['media_km_litro_ajustado'] >= LIMITE_MINIMO_KML) &
         (df['media_km_litro_ajustado'] <= LIMITE_MAXIMO_KML) &
         (df['grupocorreto'] != 'MOTO') # Exclui motos do cálculo da média
-    ].copy()
+    )
+    kml_validos = df.loc[mask_referencia, 'media_km_litro_ajustado']
 
     # Calcula a média de Km/L para cada modelo de veículo
-    media_por_modelo = df_validos.groupby('Modelo')['media_km_litro_ajustado'].mean()
+    media_por_modelo = kml_validos.groupby(df.loc[mask_referencia, 'Modelo']).mean()
     
     # Calcula uma média geral de fallback, caso um modelo não tenha nenhum dado válido
-    media_geral_fallback = df_validos['media_km_litro_ajustado'].mean()
-
-    # --- 3. APLICAÇÃO DA LÓGICA DE AJUSTE (LINHA A LINHA) ---
-    def ajustar_linha(row):
-        kml_original = row['media_km_litro_ajustado']
-        grupo = row['grupocorreto']
-        modelo = row['Modelo']
-        ajustes_aplicados = []
-
-        # Se o valor original for nulo, retorna nulo para não interferir
-        if pd.isna(kml_original):
-            return np.nan
-
-        # REGRA 1: Se for MOTO, retorna o valor original sem alteração
-        if grupo == 'MOTO':
-            ajustes_aplicados.append("Original (Moto)")
-            return kml_original
-
-        # REGRA 2: Se o valor estiver fora dos limites (e não for moto)
-        if kml_original < LIMITE_MINIMO_KML or kml_original > LIMITE_MAXIMO_KML:
-            ajustes_aplicados.append("Ajustado pela Média do Modelo")
-            return media_por_modelo.get(modelo, media_geral_fallback)
-        
-        # REGRA 3: Se o valor estiver dentro dos limites, retorna o valor original
+    media_geral_fallback = kml_validos.mean()
+
+    # --- 3. APLICAÇÃO DA LÓGICA DE AJUSTE (VETORIZADA) ---
+    kml_original = df['media_km_litro_ajustado']
+    mask_nulo = kml_original.isna()
+    # REGRA 1: MOTO mantém o valor original
+    mask_moto = ~mask_nulo & (df['grupocorreto'] == 'MOTO')
+    # REGRA 2: fora dos limites (e não é moto) recebe a média do modelo
+    mask_fora = ~mask_nulo & ~mask_moto & ((kml_original < LIMITE_MINIMO_KML) | (kml_original > LIMITE_MAXIMO_KML))
+    # REGRA 3: dentro dos limites mantém o valor original
+    mask_valido = ~mask_nulo & ~mask_moto & ~mask_fora
+
+    media_do_modelo = df['Modelo'].map(media_por_modelo).fillna(media_geral_fallback)
+    df['media_km_litro_ajustado'] = kml_original.mask(mask_fora, media_do_modelo)
+
+    # Registra qual regra foi aplicada em cada linha (nulo quando não há Km/L)
+    codigos_motivo = np.select([mask_moto, mask_fora, mask_valido], [0, 1, 2], default=-1)
+    df['motivo_ajuste_kml'] = pd.Categorical.from_codes(codigos_motivo, categories=MOTIVOS_AJUSTE_KML)
+
+    return df
+
+# --- SNAPSHOT EM DISCO (PARQUET) ---
+# O df_final limpo é gravado em data/cache, um arquivo por ano, e reaproveitado
+# enquanto a planilha de origem não mudar; só os anos pedidos são lidos.
+# Incremente VERSAO_PIPELINE sempre que a saída do pipeline mudar, para
+# invalidar os snapshots antigos.
+VERSAO_PIPELINE = 7
+PASTA_CACHE = os.path.join('data', 'cache')
+
+def _caminhos_snapshot(file_path):
+    nome_base = os.path.splitext(os.path.basename(file_path))[0]
+    pasta_anos = os.path.join(PASTA_CACHE, f"{nome_base}_anos")
+    caminho_meta = os.path.join(PASTA_CACHE, f"{nome_base}.snapshot.json")
+    return pasta_anos, caminho_meta
+
+def _caminho_ano(pasta_anos, ano):
+    return os.path.join(pasta_anos, f"{ano}.parquet")
+
+def _hash_arquivo(file_path, tamanho_bloco=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _assinatura_arquivo(file_path, incluir_hash=True):
+    """Identifica a versão da planilha por mtime, tamanho e hash do conteúdo."""
+    stat = os.stat(file_path)
+    assinatura = {
+        'versao_pipeline': VERSAO_PIPELINE,
+        # 'Idade' é calculada a partir do ano corrente, então o snapshot vence na virada do ano
+        'ano_referencia': datetime.now().year,
+        'mtime': stat.st_mtime,
+        'tamanho': stat.st_size,
+    }
+    if incluir_hash:
+        assinatura['sha256'] = _hash_arquivo(file_path)
+    return assinatura
+
+def normalizar_tipos_para_snapshot(df):
+    """
+    Garante um schema Arrow estável para o Parquet: colunas object só com
+    números viram numéricas e colunas de texto que misturam tipos (ex.: placas
+    numéricas) viram texto.
+    """
+    for col in df.select_dtypes(include='object').columns:
+        tipos = set(df[col].dropna().map(type).unique())
+        if tipos and tipos <= {int, float}:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif str in tipos and len(tipos) > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def _versao_da_assinatura(assinatura):
+    return f"{assinatura['versao_pipeline']}-{assinatura['ano_referencia']}-{assinatura['sha256'][:16]}"
+
+def versao_dados(df):
+    """
+    Identificador da versão do dataset, usado como chave dos caches derivados dele
+    (índice de filtros etc.). Vem da assinatura do snapshot; na falta dela, usa o
+    hash do conteúdo.
+    """
+    versao = df.attrs.get('versao_dados')
+    if versao is None:
+        versao = f"hash-{pd.util.hash_pandas_object(df, index=True).sum()}"
+    return versao
+
+def _marcar_versao(df, assinatura, anos):
+    """Versão do recorte carregado: assinatura da planilha + anos presentes."""
+    df.attrs['versao_dados'] = f"{_versao_da_assinatura(assinatura)}-{'_'.join(map(str, anos))}"
+    return df
+
+def validar_snapshot(file_path):
+    """
+    Retorna a assinatura gravada (com a lista de anos) se o snapshot em disco
+    corresponder à planilha atual, ou None se for preciso reprocessar.
+    """
+    pasta_anos, caminho_meta = _caminhos_snapshot(file_path)
+    if not os.path.exists(caminho_meta):
+        return None
+
+    try:
+        with open(caminho_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+
+        atual = _assinatura_arquivo(file_path, incluir_hash=False)
+        for chave in ('versao_pipeline', 'ano_referencia', 'tamanho'):
+            if meta.get(chave) != atual[chave]:
+                return None
+        if not all(os.path.exists(_caminho_ano(pasta_anos, ano)) for ano in meta.get('anos', [])):
+            return None
+
+        # mtime diferente (ex.: arquivo copiado/salvo sem alterações): confirma pelo hash
+        if meta.get('mtime') != atual['mtime']:
+            if meta.get('sha256') != _hash_arquivo(file_path):
+                return None
+            meta['mtime'] = atual['mtime']
+            with open(caminho_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+        return meta
+    except Exception as e:
+        print(f"AVISO: Snapshot em cache ignorado ({e}). Reprocessando a planilha.")
+        return None
+
+def carregar_snapshot(file_path, anos=None):
+    """
+    Lê do snapshot só os anos pedidos (None = todos). Retorna None se o
+    snapshot não corresponder à planilha atual.
+    """
+    meta = validar_snapshot(file_path)
+    if meta is None:
+        return None
+
+    pasta_anos, _ = _caminhos_snapshot(file_path)
+    anos_lidos = [ano for ano in meta['anos'] if anos is None or ano in anos]
+    try:
+        partes = [pd.read_parquet(_caminho_ano(pasta_anos, ano)) for ano in anos_lidos]
+    except Exception as e:
+        print(f"AVISO: Snapshot em cache ignorado ({e}). Reprocessando a planilha.")
+        return None
+
+    if not partes:
+        return _marcar_versao(pd.DataFrame(), meta, anos_lidos)
+    df_final = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+    # Cada arquivo traz só as categorias presentes no ano; unifica após juntar
+    return _marcar_versao(converter_para_categorico(df_final), meta, anos_lidos)
+
+def _remover_anos_antigos(pasta_anos, anos):
+    """Apaga os Parquet de anos que não estão mais na planilha (e temporários de gravações interrompidas)."""
+    mantidos = {os.path.basename(_caminho_ano(pasta_anos, ano)) for ano in anos}
+    for nome in os.listdir(pasta_anos):
+        if nome.endswith(('.parquet', '.parquet.tmp')) and nome not in mantidos:
+            try:
+                os.remove(os.path.join(pasta_anos, nome))
+            except OSError as e:
+                print(f"AVISO: Não foi possível remover {nome} do snapshot em cache ({e}).")
+
+def salvar_snapshot(df_final, file_path):
+    """
+    Grava o df_final (um Parquet por ano) e a assinatura da planilha de origem em
+    data/cache. Retorna a assinatura gravada, ou None se não foi possível gravar.
+    """
+    pasta_anos, caminho_meta = _caminhos_snapshot(file_path)
+    assinatura = _assinatura_arquivo(file_path)
+    assinatura['anos'] = sorted(int(ano) for ano in df_final['ano'].unique())
+    _marcar_versao(df_final, assinatura, assinatura['anos'])
+    temporarios = [_caminho_ano(pasta_anos, ano) + '.tmp' for ano in assinatura['anos']] + [caminho_meta + '.tmp']
+    try:
+        os.makedirs(pasta_anos, exist_ok=True)
+        # Escreve em arquivos temporários e troca no final para nunca deixar um snapshot parcial
+        for ano, df_ano in df_final.groupby('ano'):
+            df_ano.reset_index(drop=True).to_parquet(_caminho_ano(pasta_anos, ano) + '.tmp')
+        with open(caminho_meta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(assinatura, f)
+        for ano in assinatura['anos']:
+            os.replace(_caminho_ano(pasta_anos, ano) + '.tmp', _caminho_ano(pasta_anos, ano))
+        os.replace(caminho_meta + '.tmp', caminho_meta)
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar o snapshot em cache ({e}).")
+        return None
+    finally:
+        for caminho in temporarios:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    _remover_anos_antigos(pasta_anos, assinatura['anos'])
+    return assinatura
+
+# --- TIPOS CATEGÓRICOS E USO DE MEMÓRIA ---
+# Dimensões de baixa cardinalidade usadas em filtros e agrupamentos
+COLUNAS_CATEGORICAS = [
+    'grupocorreto', 'regiao', 'filial', 'contrato', 'contrato_agrupado',
+    'TP.Comb', 'TP.Rota', 'Modelo', 'Marca', 'mes_ano', 'Placa'
+]
+
+def converter_para_categorico(df, colunas=COLUNAS_CATEGORICAS):
+    """Converte as dimensões para Categorical com categorias ordenadas (estáveis entre cargas)."""
+    for col in colunas:
+        if col in df.columns:
+            categorias = sorted(df[col].dropna().unique())
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                # astype não reordena: dtypes não ordenados com as mesmas categorias são iguais
+                df[col] = df[col].cat.set_categories(categorias)
+            else:
+                df[col] = df[col].astype(pd.CategoricalDtype(categorias))
+    return df
+
+def relatorio_memoria(df):
+    """
+    Memória ocupada por coluna, comparando as colunas categóricas com o que
+    ocupariam como texto (object), estimado a partir das contagens por categoria.
+    """
+    linhas = []
+    for col in df.columns:
+        serie = df[col]
+        memoria = serie.memory_usage(deep=True, index=False)
+        memoria_texto = memoria
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            contagens = np.bincount(codigos[codigos >= 0], minlength=len(serie.cat.categories))
+            tamanhos = np.array([sys.getsizeof(c) for c in serie.cat.categories], dtype=np.int64)
+            nulos = int((codigos < 0).sum())
+            memoria_texto = 8 * len(serie) + int((contagens * tamanhos).sum()) + nulos * sys.getsizeof(np.nan)
+        linhas.append({
+            'Coluna': col,
+            'Tipo': str(serie.dtype),
+            'Memória (MB)': memoria / 1024 ** 2,
+            'Como Texto (MB)': memoria_texto / 1024 ** 2,
+        })
+    return pd.DataFrame(linhas)
+
+# --- LEITURA DA PLANILHA ---
+# Colunas lidas de cada aba (nomes já normalizados por clean_col_names). Na aba BD
+# ficam só as usadas pela limpeza e as que chegam ao df_final; o resto da aba não é
+# convertido em DataFrame.
+ABA_BD = 'BD 2023'
+COLUNAS_ABAS = {
+    ABA_BD: [
+        'Mês', 'Placa', 'ID Filial', 'GrupoCorreto', 'Contrato', 'Modelo', 'Marca', 'TP.Comb', 'TP.Rota',
+        'Roteiro Principal', 'Motorista Principal',
+        'Lataria e Pintura', 'Manutenção', 'Rodas / Pneus', 'Valor Comb.', 'Arla',
+        'Km Inicial', 'Km Final', 'Total de Km', 'Total de KM', 'Média Km/l', 'Comb / Km', 'Litros Comb.',
+        'Man / Km', 'Dias Úteis', 'DUC', 'DUK', 'DUL',
+    ],
+    'FROTA': ['Placa', 'Ano'],
+    'Filiais': ['ID Filial', 'Filial', 'Regiao'],
+}
+
+def _nome_coluna(col):
+    return str(col).strip().replace('  ', ' ')
+
+def _coluna_usada(colunas, col):
+    return _nome_coluna(col) in colunas
+
+# A aba BD é lida linha a linha pelo pyxlsb e convertida em DataFrames de no máximo
+# TAMANHO_LOTE_LEITURA linhas, em vez de materializar a aba inteira como listas de
+# objetos Python antes de montar o DataFrame (o pico de memória do read_excel).
+TAMANHO_LOTE_LEITURA = 50_000
+# Colunas de texto da aba BD, lidas sempre como object para que o tipo não dependa
+# de quais linhas caíram em cada lote (ex.: um lote só com placas numéricas)
+COLUNAS_TEXTO_BD = [
+    'Placa', 'GrupoCorreto', 'Contrato', 'Modelo', 'Marca', 'TP.Comb', 'TP.Rota',
+    'Roteiro Principal', 'Motorista Principal'
+]
+
+def _valor_celula(valor):
+    """Mesma conversão do leitor pyxlsb do pandas: célula vazia -> '' e float inteiro -> int."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and int(valor) == valor:
+        return int(valor)
+    return valor
+
+def ler_aba_em_lotes(file_path, aba=ABA_BD, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Itera a aba em DataFrames de até `tamanho_lote` linhas, só com as colunas de
+    COLUNAS_ABAS e com os tipos que o read_excel daria. Sempre gera ao menos um
+    lote (vazio, se a aba não tiver dados) para preservar as colunas.
+    """
+    with open_workbook(file_path) as wb, wb.get_sheet(aba) as sheet:
+        linhas = ([_valor_celula(celula.v) for celula in row] for row in sheet.rows(sparse=True))
+        cabecalho = next(linhas, [])
+        usadas = [i for i, col in enumerate(cabecalho) if _coluna_usada(frozenset(COLUNAS_ABAS[aba]), col)]
+        cabecalho = [cabecalho[i] for i in usadas]
+        tipos = {col: object for col in cabecalho if _nome_coluna(col) in COLUNAS_TEXTO_BD}
+
+        def montar(lote):
+            return clean_col_names(TextParser([cabecalho] + lote, header=0, dtype=tipos).read())
+
+        lote = []
+        gerou = False
+        for linha in linhas:
+            valores = [linha[i] if i < len(linha) else '' for i in usadas]
+            # Linhas sem nenhum valor nas colunas usadas seriam descartadas pela limpeza (sem 'Mês')
+            if any(valor != '' for valor in valores):
+                lote.append(valores)
+            if len(lote) == tamanho_lote:
+                yield montar(lote)
+                lote, gerou = [], True
+        if lote or not gerou:
+            yield montar(lote)
+
+def _compactar(lote, colunas=None):
+    """Converte para categórico as colunas de texto (só strings) do lote, por padrão todas."""
+    for col in lote.columns if colunas is None else [col for col in colunas if col in lote.columns]:
+        if lote[col].dtype == object and infer_dtype(lote[col], skipna=True) in ('string', 'empty'):
+            lote[col] = lote[col].astype('category')
+    return lote
+
+def _descompactar(df):
+    """Volta as colunas categóricas a object, com os mesmos valores."""
+    for col in df.select_dtypes(include='category').columns:
+        df[col] = df[col].astype(object)
+    return df
+
+def juntar_lotes(lotes):
+    """
+    Junta os lotes coluna a coluna. Colunas categóricas em todos os lotes são
+    unidas com union_categoricals, sem passar por texto; as demais são concatenadas.
+    """
+    lotes = list(lotes)
+    if len(lotes) == 1:
+        return lotes[0]
+    colunas = {}
+    for col in lotes[0].columns:
+        partes = [lote[col] for lote in lotes]
+        if all(isinstance(parte.dtype, pd.CategoricalDtype) for parte in partes):
+            colunas[col] = pd.Series(union_categoricals(partes))
         else:
-            ajustes_aplicados.append("Original (Valido)")
-            return kml_original
+            partes = [parte.astype(object) if isinstance(parte.dtype, pd.CategoricalDtype) else parte for parte in partes]
+            colunas[col] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+def ler_aba(file_path, aba):
+    """Lê uma aba de cadastro da planilha só com as colunas listadas em COLUNAS_ABAS (a BD é lida por ler_aba_em_lotes)."""
+    usecols = functools.partial(_coluna_usada, frozenset(COLUNAS_ABAS[aba]))
+    return clean_col_names(pd.read_excel(file_path, sheet_name=aba, engine='pyxlsb', usecols=usecols))
+
+def iniciar_leitura_abas(file_path, abas):
+    """
+    Começa a ler as abas em paralelo, uma por processo (o parse do pyxlsb é
+    limitado pela CPU, então threads não ajudariam), enquanto o processo
+    principal segue com outro trabalho, como a aba BD em lotes. O resultado é
+    recebido com aguardar_abas. Se o pool de processos não puder ser usado, as
+    abas são lidas em sequência em aguardar_abas.
+    """
+    futuros = None
+    if (os.cpu_count() or 1) > 1:
+        try:
+            pool = ProcessPoolExecutor(max_workers=min(len(abas), os.cpu_count()))
+            futuros = {aba: pool.submit(ler_aba, file_path, aba) for aba in abas}
+            # Não espera: os futuros já enviados continuam até o fim
+            pool.shutdown(wait=False)
+        except (OSError, RuntimeError) as e:
+            print(f"AVISO: Leitura paralela indisponível ({e}). Lendo as abas em sequência.")
+    return {'file_path': file_path, 'abas': abas, 'futuros': futuros}
 
-    # Aplica a função de ajuste para criar a coluna final
-    df['media_km_litro_ajustado'] = df.apply(ajustar_linha, axis=1)
+@etapa_pipeline
+def aguardar_abas(leitura):
+    """Abas iniciadas por iniciar_leitura_abas ({aba: DataFrame}); o tempo registrado é só o da espera."""
+    if leitura['futuros'] is not None:
+        try:
+            return {aba: futuro.result() for aba, futuro in leitura['futuros'].items()}
+        except (OSError, RuntimeError) as e:
+            print(f"AVISO: Leitura paralela falhou ({e}). Lendo as abas em sequência.")
+    return {aba: ler_aba(leitura['file_path'], aba) for aba in leitura['abas']}
 
+def _preparar_juncoes(df_frota, df_filiais):
+    df_frota_join = df_frota[['Placa', 'Ano']].copy()
+    df_filiais_join = df_filiais[['ID Filial', 'Filial', 'Regiao']].copy()
+    df_filiais_join.rename(columns={'Filial': 'Filial Padronizada', 'Regiao': 'Regiao Padronizada'}, inplace=True)
+    return df_frota_join, df_filiais_join
+
+# --- ESQUEMA DAS COLUNAS ---
+# Colunas numéricas da aba BD: tipo no df_final e valor para nulos e textos inválidos.
+# Os tipos reduzidos (int32/float32) só são aplicados quando a conversão não perde
+# informação; colunas somadas nos painéis com valores fracionários (custos, km
+# total, litros) ficam em float64, pois somas em float32 perdem precisão.
+ESQUEMA_NUMERICO_BD = {
+    'Lataria e Pintura': ('float64', 0),
+    'Manutenção': ('float64', 0),
+    'Rodas / Pneus': ('float64', 0),
+    'Valor Comb.': ('float64', 0),
+    'Arla': ('float64', 0),
+    'Km Inicial': ('int32', 0),
+    'Km Final': ('int32', 0),
+    'Total de Km': ('float64', 0),
+    'Média Km/l': ('float64', 0),
+    'Comb / Km': ('float64', 0),
+    'Litros Comb.': ('float64', 0),
+    'Dias Úteis': ('int32', 0),
+    'DUC': ('int32', 0),
+    'DUK': ('int32', 0),
+    'DUL': ('int32', 0),
+}
+
+RENOMEAR_BD = {
+    'Mês': 'data',
+    'Total Geral Manutenção': 'valor',
+    'GrupoCorreto': 'grupocorreto',
+    'Regiao Padronizada': 'regiao',
+    'Filial Padronizada': 'filial',
+    'Contrato': 'contrato',
+    'Lataria e Pintura': 'custo_lataria_pintura',
+    'Manutenção': 'custo_manutencao_geral',
+    'Rodas / Pneus': 'custo_rodas_pneus',
+    'Valor Comb.': 'custo_combustivel',
+    'Arla': 'custo_arla',
+    'Km Inicial': 'km_inicial',
+    'Km Final': 'km_final',
+    'Total de Km': 'total_km',
+    'Média Km/l': 'media_km_litro',
+    'Comb / Km': 'custo_comb_por_km',
+    'Litros Comb.': 'litros_combustivel',
+    'Man / Km': 'manutencao_por_km'
+}
+
+# Tipos reduzidos do df_final (nomes já renomeados), incluindo colunas calculadas
+TIPOS_REDUZIDOS = {
+    **{RENOMEAR_BD.get(col, col): tipo for col, (tipo, _) in ESQUEMA_NUMERICO_BD.items() if tipo != 'float64'},
+    'KM_Rodados': 'int32',
+    'Idade': 'float32',
+}
+
+# Dimensões normalizadas (sem espaços nas pontas, em maiúsculas) e o valor dos vazios
+DIMENSOES_MAIUSCULAS = {col: 'NÃO INFORMADO' for col in ['grupocorreto', 'regiao', 'filial', 'contrato']}
+
+@etapa_pipeline
+def coagir_numericas(df, esquema=ESQUEMA_NUMERICO_BD):
+    """
+    Converte as colunas numéricas do esquema de uma vez: só as colunas de texto
+    passam por to_numeric, e o preenchimento e a conversão para float64 são
+    feitos sobre o bloco inteiro.
+    """
+    colunas = [col for col in esquema if col in df.columns]
+    if not colunas:
+        return df
+    bloco = df[colunas]
+    texto = [col for col in colunas if not pd.api.types.is_numeric_dtype(bloco[col])]
+    if texto:
+        bloco = bloco.assign(**{col: pd.to_numeric(bloco[col], errors='coerce') for col in texto})
+    df[colunas] = bloco.astype('float64').fillna({col: esquema[col][1] for col in colunas})
     return df
 
-@st.cache_data(ttl=3600)
-def get_data():
-    file_path = os.path.join('data', 'raw', 'Evolução.xlsb')
+def normalizar_maiusculas(serie, vazio):
+    """
+    Equivale a astype(str).str.strip().str.upper() com 'NAN' -> `vazio`, aplicado
+    uma vez por valor distinto e devolvido a cada linha.
+    """
+    codigos, valores = pd.factorize(serie, use_na_sentinel=False)
+    normalizados = pd.Index(valores).astype(str).str.strip().str.upper()
+    normalizados = normalizados.where(normalizados != 'NAN', vazio)
+    return pd.Series(normalizados.to_numpy(dtype=object)[codigos], index=serie.index)
+
+def _cabe_em(valores, tipo):
+    """Se os valores cabem no tipo sem perda (inteiros na faixa do int32; floats idênticos em float32)."""
+    if np.dtype(tipo).kind == 'i':
+        info = np.iinfo(tipo)
+        return bool(np.isfinite(valores).all() and (valores == np.round(valores)).all()
+                    and (valores.size == 0 or (valores.min() >= info.min and valores.max() <= info.max)))
+    return bool(np.array_equal(valores.astype(tipo).astype(valores.dtype), valores, equal_nan=True))
+
+def reduzir_tipos(df, tipos=TIPOS_REDUZIDOS):
+    """Aplica os tipos reduzidos às colunas cujos valores cabem neles; as demais ficam como estão."""
+    for col, tipo in tipos.items():
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and df[col].dtype != tipo:
+            if _cabe_em(df[col].to_numpy(dtype='float64'), tipo):
+                df[col] = df[col].astype(tipo)
+    return df
+
+@etapa_pipeline
+def juntar_frota_filiais(df_bd, df_frota_join, df_filiais_join):
+    df_bd = pd.merge(df_bd, df_frota_join, on='Placa', how='left')
+    return pd.merge(df_bd, df_filiais_join, on='ID Filial', how='left')
+
+@etapa_pipeline
+def calcular_km_e_manutencao(df_bd):
+    """KM rodados, total de km (com KM rodados como fallback) e total de manutenção."""
+    # Calcular KM rodados se temos Km Inicial e Final
+    if 'Km Inicial' in df_bd.columns and 'Km Final' in df_bd.columns:
+        df_bd['KM_Rodados'] = df_bd['Km Final'] - df_bd['Km Inicial']
+        df_bd['KM_Rodados'] = df_bd['KM_Rodados'].where(df_bd['KM_Rodados'] >= 0, 0)
+
+    # Verificar se existe coluna 'Total de Km' ou 'Total de KM' e usar KM_Rodados como fallback
+    if 'Total de Km' in df_bd.columns:
+        # Usar a coluna existente, mas verificar se tem valores válidos
+        df_bd['Total de Km'] = df_bd['Total de Km'].fillna(df_bd.get('KM_Rodados', 0))
+    elif 'Total de KM' in df_bd.columns:
+        df_bd['Total de Km'] = df_bd['Total de KM']
+    else:
+        # Criar coluna usando KM_Rodados
+        df_bd['Total de Km'] = df_bd.get('KM_Rodados', 0)
+
+    df_bd['Total Geral Manutenção'] = df_bd[['Lataria e Pintura', 'Manutenção', 'Rodas / Pneus', 'Arla']].sum(axis=1)
+    return df_bd
+
+@etapa_pipeline
+def converter_datas(df_bd):
+    """Converte o serial de data do Excel; linhas sem data são descartadas."""
+    df_bd['data'] = pd.to_datetime(df_bd['data'], unit='D', origin='1899-12-30')
+    df_bd.dropna(subset=['data'], inplace=True)
+    df_bd['valor'] = pd.to_numeric(df_bd['valor'], errors='coerce').fillna(0)
+    df_bd['ano'] = df_bd['data'].dt.year
+    df_bd['mes_ano'] = df_bd['data'].dt.strftime('%Y-%m')
+    return df_bd
+
+@etapa_pipeline
+def padronizar_dimensoes(df_bd):
+    for col, vazio in DIMENSOES_MAIUSCULAS.items():
+        if col in df_bd.columns:
+            df_bd[col] = normalizar_maiusculas(df_bd[col], vazio)
+    return df_bd
+
+@etapa_pipeline
+def calcular_colunas_derivadas(df_bd):
+    df_bd['Idade'] = datetime.now().year - pd.to_numeric(df_bd['Ano'], errors='coerce')
+
+    # Calcular colunas derivadas importantes
+    df_bd['custo_combustivel_total'] = df_bd['custo_combustivel'] + df_bd['custo_arla']
+    df_bd['custo_frota_total'] = df_bd['valor'] + df_bd['custo_combustivel_total']
+    return df_bd
+
+def limpar_linhas_bd(df_bd, df_frota_join, df_filiais_join):
+    """
+    Etapas do pipeline que só dependem da própria linha (junções, tipos, datas,
+    padronizações e colunas derivadas). Podem ser aplicadas a qualquer recorte
+    da aba BD, como um mês isolado.
+    """
+    df_bd = juntar_frota_filiais(df_bd, df_frota_join, df_filiais_join)
+    df_bd = coagir_numericas(df_bd)
+    df_bd = calcular_km_e_manutencao(df_bd)
+    df_bd.rename(columns=RENOMEAR_BD, inplace=True)
+    df_bd = converter_datas(df_bd)
+
+    # APLICAR LIMPEZA DOS DADOS AQUI (ANTES DAS OUTRAS TRANSFORMAÇÕES)
+    df_bd = limpar_dados_combustivel(df_bd)
+    df_bd = limpar_dados_tp_rota(df_bd)
+    df_bd = limpar_dados_grupo_veiculo(df_bd)
+    df_bd = limpar_dados_contratos(df_bd)
+    df_bd = padronizar_dimensoes(df_bd)
+
+    return calcular_colunas_derivadas(df_bd)
+
+def finalizar_dataset(df_bd):
+    """
+    Etapas que dependem do conjunto completo (médias de Km/L por modelo) e a
+    seleção/tipagem final das colunas.
+    """
+    # O ajuste de Km/L usa médias de toda a base, por isso roda depois de juntar os meses
+    df_bd = filtrar_outliers_de_kml(df_bd)
+    return projetar_colunas_finais(df_bd)
+
+@etapa_pipeline
+def projetar_colunas_finais(df_bd):
+    """Seleção das colunas do df_final e tipos finais (reduzidos e categóricos)."""
+
+    # Lista final de colunas incluindo dados de quilometragem e eficiência
+    colunas_finais = [
+        'data', 'valor', 'grupocorreto', 'regiao', 'filial',
+        'contrato', 'contrato_agrupado', 'ano', 'mes_ano', 'Placa', 'Idade',
+        'custo_lataria_pintura', 'custo_manutencao_geral', 'custo_rodas_pneus',
+        'custo_combustivel', 'custo_arla', 'custo_combustivel_total', 'custo_frota_total',
+        'Modelo', 'Marca', 'TP.Comb', 'TP.Rota',
+        'Roteiro Principal', 'Motorista Principal',
+        'Dias Úteis', 'DUC', 'DUK', 'DUL',
+        'km_inicial', 'km_final', 'total_km', 'media_km_litro', 'custo_comb_por_km',
+        'litros_combustivel', 'manutencao_por_km', 'KM_Rodados', 'media_km_litro_ajustado',
+        'motivo_ajuste_kml'
+    ]
+    df_final = df_bd[[col for col in colunas_finais if col in df_bd.columns]].reset_index(drop=True)
+    df_final = reduzir_tipos(normalizar_tipos_para_snapshot(df_final))
+    return converter_para_categorico(df_final)
+
+# Dimensões compactadas nos lotes já limpos. 'Modelo' continua texto até o ajuste
+# de Km/L, que mapeia as médias por modelo sobre ela.
+COLUNAS_COMPACTAS_LOTE = [col for col in COLUNAS_CATEGORICAS if col != 'Modelo']
 
+def limpar_lotes(lotes, df_frota_join, df_filiais_join):
+    """Limpa cada lote da aba BD assim que ele chega, junta os lotes limpos e finaliza o df_final."""
+    lotes_limpos = (
+        _compactar(limpar_linhas_bd(lote, df_frota_join, df_filiais_join), COLUNAS_COMPACTAS_LOTE)
+        for lote in lotes
+    )
+    return finalizar_dataset(juntar_lotes(lotes_limpos))
+
+# --- INGESTÃO INCREMENTAL POR MÊS ---
+# A aba BD cresce um mês por vez. Cada mês (coluna 'Mês') é limpo uma única vez e
+# guardado em data/cache/<planilha>_meses/; numa nova carga só os meses cujo hash
+# das linhas mudou (ou os meses novos) passam de novo por limpar_linhas_bd.
+# A aba é lida em lotes (ler_aba_em_lotes) e cada lote é repartido por mês assim
+# que chega: linhas de meses novos ou alterados são limpas na hora, e as de um mês
+# que ainda pode estar igual ao da partição ficam brutas só até o mês completar o
+# número de linhas do manifesto e o hash ser conferido. A aba inteira nunca fica
+# em memória sem limpar.
+# As partições usam pickle: antes da normalização final as colunas de texto ainda
+# podem misturar tipos, o que o Parquet não representa.
+
+def _pasta_particoes(file_path):
+    nome_base = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(PASTA_CACHE, f"{nome_base}_meses")
+
+def _hash_linhas(df):
+    """Hash das linhas (em ordem) e dos nomes das colunas de um DataFrame."""
+    sha = hashlib.sha256('|'.join(map(str, df.columns)).encode('utf-8'))
+    sha.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return sha.hexdigest()
+
+def _carregar_manifesto(pasta):
     try:
-        abas = ['BD 2023', 'FROTA', 'Filiais']
-        dfs = pd.read_excel(file_path, sheet_name=abas, engine='pyxlsb')
-        df_bd, df_frota, df_filiais = (clean_col_names(dfs['BD 2023']),
-                                      clean_col_names(dfs['FROTA']),
-                                      clean_col_names(dfs['Filiais']))
-        
-        df_frota_join = df_frota[['Placa', 'Ano']].copy()
-        df_bd = pd.merge(df_bd, df_frota_join, on='Placa', how='left')
-        df_filiais_join = df_filiais[['ID Filial', 'Filial', 'Regiao']].copy()
-        df_filiais_join.rename(columns={'Filial': 'Filial Padronizada', 'Regiao': 'Regiao Padronizada'}, inplace=True)
-        df_bd = pd.merge(df_bd, df_filiais_join, on='ID Filial', how='left')
-
-        colunas_custo = ['Lataria e Pintura', 'Manutenção', 'Rodas / Pneus', 'Valor Comb.', 'Arla']
-        for col in colunas_custo:
-            if col in df_bd.columns:
-                df_bd[col] = pd.to_numeric(df_bd[col], errors='coerce').fillna(0)
-
-        # Colunas de quilometragem e eficiência
-        colunas_km = ['Km Inicial', 'Km Final', 'Total de Km', 'Média Km/l', 'Comb / Km', 'Litros Comb.']
-        for col in colunas_km:
-            if col in df_bd.columns:
-                df_bd[col] = pd.to_numeric(df_bd[col], errors='coerce').fillna(0)
-
-        # Colunas de dias úteis e operacionais
-        colunas_operacionais = ['Dias Úteis', 'DUC', 'DUK', 'DUL']
-        for col in colunas_operacionais:
-            if col in df_bd.columns:
-                df_bd[col] = pd.to_numeric(df_bd[col], errors='coerce').fillna(0)
-
-        # Calcular KM rodados se temos Km Inicial e Final
-        if 'Km Inicial' in df_bd.columns and 'Km Final' in df_bd.columns:
-            df_bd['KM_Rodados'] = df_bd['Km Final'] - df_bd['Km Inicial']
-            df_bd['KM_Rodados'] = df_bd['KM_Rodados'].where(df_bd['KM_Rodados'] >= 0, 0)
-
-        # Verificar se existe coluna 'Total de Km' ou 'Total de KM' e usar KM_Rodados como fallback
-        if 'Total de Km' in df_bd.columns:
-            # Usar a coluna existente, mas verificar se tem valores válidos
-            df_bd['Total de Km'] = df_bd['Total de Km'].fillna(df_bd.get('KM_Rodados', 0))
-        elif 'Total de KM' in df_bd.columns:
-            df_bd['Total de Km'] = df_bd['Total de KM']
+        with open(os.path.join(pasta, 'manifesto.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_json_atomico(caminho, conteudo):
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f)
+    os.replace(caminho + '.tmp', caminho)
+
+def _meses_das_linhas(lote):
+    """Posições das linhas do lote por mês, com a mesma conversão de data do pipeline (linhas sem data ficam de fora)."""
+    meses = pd.to_datetime(lote['Mês'], unit='D', origin='1899-12-30').dt.strftime('%Y-%m')
+    return meses.groupby(meses.to_numpy()).indices
+
+def processar_planilha_incremental(file_path):
+    """
+    Lê a planilha de origem e executa todo o pipeline de limpeza, reaproveitando
+    os meses já limpos. Mesmo resultado de limpar_lotes sobre os lotes da aba BD.
+
+    As abas FROTA e Filiais são lidas em outros processos enquanto a aba BD é
+    lida em lotes; só a limpeza (e a conferência de uma partição) espera por
+    elas, já que o hash dos meses não depende das junções.
+
+    O manifesto guarda o hash e o número de linhas de cada mês, uma chave geral
+    (versão do pipeline, ano de referência da 'Idade', colunas da aba BD e
+    tamanho do lote de leitura) e o hash das tabelas FROTA/Filiais usadas nas
+    junções; se a chave ou as junções mudarem, todos os meses são reprocessados.
+    O hash de um mês é acumulado lote a lote sobre as linhas como foram lidas
+    (com os tipos do lote).
+    """
+    iniciar_perfil()
+    leitura_cadastros = iniciar_leitura_abas(file_path, ['FROTA', 'Filiais'])
+    pasta = _pasta_particoes(file_path)
+    manifesto = _carregar_manifesto(pasta)
+
+    @functools.cache
+    def juncoes():
+        dfs = aguardar_abas(leitura_cadastros)
+        df_frota_join, df_filiais_join = _preparar_juncoes(dfs['FROTA'], dfs['Filiais'])
+        return df_frota_join, df_filiais_join, _hash_linhas(df_frota_join) + _hash_linhas(df_filiais_join)
+
+    def juncoes_iguais():
+        return manifesto.get('hash_juncoes') == juncoes()[2]
+
+    def limpar(parte):
+        df_frota_join, df_filiais_join, _ = juncoes()
+        return _compactar(limpar_linhas_bd(parte, df_frota_join, df_filiais_join), COLUNAS_COMPACTAS_LOTE)
+
+    def carregar_particao(mes):
+        try:
+            return pd.read_pickle(os.path.join(pasta, f"{mes}.pkl"))
+        except Exception as e:
+            print(f"AVISO: Partição {mes} ignorada ({e}). Reprocessando o mês.")
+            return None
+
+    # Por mês: hash acumulado, linhas lidas, posições na aba, linhas brutas à espera
+    # da conferência (None depois dela) e partes já limpas. 'alterado' marca os meses
+    # que precisam de partição nova.
+    meses = {}
+    particoes = None
+    inicio = 0
+    for lote in _medir_iteracao('ler_aba_em_lotes', ler_aba_em_lotes(file_path, ABA_BD)):
+        if particoes is None:
+            chave = {
+                'versao_pipeline': VERSAO_PIPELINE,
+                'ano_referencia': datetime.now().year,
+                'colunas_bd': list(map(str, lote.columns)),
+                'tamanho_lote': TAMANHO_LOTE_LEITURA,
+            }
+            particoes = manifesto.get('particoes', {}) if manifesto.get('chave') == chave else {}
+            lote_vazio = lote.iloc[:0].copy()
+
+        for mes, posicoes in _meses_das_linhas(lote).items():
+            registro = particoes.get(mes)
+            estado = meses.get(mes)
+            if estado is None:
+                sha = hashlib.sha256('|'.join(map(str, lote.columns)).encode('utf-8'))
+                estado = meses[mes] = {
+                    'sha': sha, 'linhas': 0, 'posicoes': [], 'pendentes': [] if registro else None,
+                    'limpos': [], 'alterado': registro is None,
+                }
+            parte = lote.iloc[posicoes].reset_index(drop=True)
+            estado['sha'].update(pd.util.hash_pandas_object(parte, index=False).to_numpy().tobytes())
+            # '_linha' liga cada linha limpa à sua linha de origem no mês
+            parte['_linha'] = np.arange(estado['linhas'], estado['linhas'] + len(parte))
+            estado['linhas'] += len(parte)
+            estado['posicoes'].append(inicio + posicoes)
+
+            if estado['pendentes'] is None:
+                # Mês novo, alterado ou já conferido (que ganhou linhas: as anteriores são as da partição)
+                estado['alterado'] = True
+                estado['limpos'].append(limpar(parte))
+                continue
+
+            estado['pendentes'].append(parte)
+            if estado['linhas'] < registro['linhas']:
+                continue
+            particao = None
+            if (estado['linhas'] == registro['linhas'] and estado['sha'].hexdigest() == registro['hash']
+                    and juncoes_iguais()):
+                particao = carregar_particao(mes)
+            if particao is None:
+                estado['limpos'] = [limpar(pendente) for pendente in estado['pendentes']]
+                estado['alterado'] = True
+            else:
+                estado['limpos'] = [particao]
+            estado['pendentes'] = None
+        inicio += len(lote)
+
+    os.makedirs(pasta, exist_ok=True)
+    partes = []
+    novas_particoes = {}
+    for mes, estado in sorted(meses.items()):
+        if estado['pendentes'] is not None:
+            # O mês terminou com menos linhas que a partição
+            estado['limpos'] = [limpar(pendente) for pendente in estado['pendentes']]
+            estado['alterado'] = True
+        parte = juntar_lotes(estado['limpos'])
+        if estado['alterado']:
+            caminho = os.path.join(pasta, f"{mes}.pkl")
+            try:
+                parte.to_pickle(caminho + '.tmp')
+                os.replace(caminho + '.tmp', caminho)
+            except Exception as e:
+                print(f"AVISO: Não foi possível gravar a partição {mes} ({e}).")
+        novas_particoes[mes] = {'hash': estado['sha'].hexdigest(), 'linhas': estado['linhas']}
+        if not parte.empty:
+            # Posição da linha na aba BD atual, para manter a ordem original da planilha
+            posicoes = np.concatenate(estado['posicoes'])
+            partes.append(parte.assign(_linha=posicoes[parte['_linha'].to_numpy()]))
+
+    # Remove partições de meses que não existem mais na planilha
+    for mes in set(manifesto.get('particoes', {})) - set(novas_particoes):
+        try:
+            os.remove(os.path.join(pasta, f"{mes}.pkl"))
+        except OSError:
+            pass
+    try:
+        _gravar_json_atomico(os.path.join(pasta, 'manifesto.json'),
+                             {'chave': chave, 'hash_juncoes': juncoes()[2], 'particoes': novas_particoes})
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar o manifesto das partições ({e}).")
+
+    if partes:
+        df_linhas = juntar_lotes(partes).sort_values('_linha', kind='stable').reset_index(drop=True)
+    else:
+        df_linhas = limpar(lote_vazio.assign(_linha=0))
+    df_final = finalizar_dataset(df_linhas.drop(columns='_linha'))
+    registrar_perfil()
+    return df_final
+
+
+# --- FONTES DE DADOS ---
+# A fonte é escolhida por FONTE_DADOS no .env: 'planilha' (padrão, data/raw/Evolução.xlsb)
+# ou 'sql' (tabela de fatos no banco, ver src/config/sql_provider.py). Toda fonte
+# oferece as mesmas duas operações: listar os anos e carregar o dataset limpo de
+# alguns anos, com os mesmos tipos e a versão em df.attrs['versao_dados'].
+load_dotenv()
+FONTE_DADOS = os.getenv('FONTE_DADOS', 'planilha').strip().lower()
+# Exibe na sidebar o painel de administração (perfil das etapas do pipeline)
+PAINEL_ADMIN = os.getenv('PAINEL_ADMIN', '0').strip().lower() in ('1', 'true', 'sim')
+CAMINHO_PLANILHA = os.path.join('data', 'raw', 'Evolução.xlsb')
+
+def _anos_planilha():
+    """Anos da planilha; reprocessa e grava o snapshot se ele estiver desatualizado."""
+    meta = validar_snapshot(CAMINHO_PLANILHA)
+    if meta is None:
+        df_final = processar_planilha_incremental(CAMINHO_PLANILHA)
+        meta = salvar_snapshot(df_final, CAMINHO_PLANILHA)
+        if meta is None:
+            return sorted(int(ano) for ano in df_final['ano'].unique())
+    return meta['anos']
+
+def _dados_planilha(anos):
+    file_path = CAMINHO_PLANILHA
+    df_final = carregar_snapshot(file_path, anos)
+    if df_final is None:
+        df_final = processar_planilha_incremental(file_path)
+        assinatura = salvar_snapshot(df_final, file_path) or _assinatura_arquivo(file_path)
+        # Mesma ordem de linhas do snapshot (ano a ano)
+        df_final = df_final.sort_values('ano', kind='stable').reset_index(drop=True)
+        if anos is not None:
+            df_final = df_final[df_final['ano'].isin(anos)].reset_index(drop=True)
+        _marcar_versao(df_final, assinatura, sorted(int(ano) for ano in df_final['ano'].unique()))
+    return df_final
+
+def _anos_sql():
+    return sql_provider.anos_disponiveis(sql_provider.obter_engine())
+
+def _fatos_sql(engine, anos, filtros=None):
+    """Registros do recorte (anos e filtros aplicados no banco) com os tipos do df_final."""
+    df_final = converter_para_categorico(reduzir_tipos(sql_provider.ler_fatos(engine, anos, filtros)))
+    # O texto vem compactado em categorias; fora das dimensões, volta a object como no df_final da planilha
+    for col in df_final.select_dtypes(include='category').columns:
+        if col not in COLUNAS_CATEGORICAS + ['motivo_ajuste_kml']:
+            df_final[col] = df_final[col].astype(object)
+    if 'motivo_ajuste_kml' in df_final.columns:
+        df_final['motivo_ajuste_kml'] = pd.Categorical(df_final['motivo_ajuste_kml'], categories=MOTIVOS_AJUSTE_KML)
+    return df_final
+
+def _dados_sql(anos):
+    """Só os anos pedidos saem do banco; os tipos categóricos são montados após juntar os lotes."""
+    engine = sql_provider.obter_engine()
+    df_final = _fatos_sql(engine, anos)
+    df_final.attrs['versao_dados'] = sql_provider.assinatura_dados(engine, anos)
+    return df_final
+
+FONTES = {
+    'planilha': (_anos_planilha, _dados_planilha),
+    'sql': (_anos_sql, _dados_sql),
+}
+
+def _fonte():
+    if FONTE_DADOS not in FONTES:
+        raise ValueError(f"FONTE_DADOS inválida: '{FONTE_DADOS}' (use {', '.join(FONTES)}).")
+    return FONTES[FONTE_DADOS]
+
+@st.cache_data(ttl=3600)
+def get_anos_disponiveis():
+    """Anos com dados na fonte configurada."""
+    try:
+        listar_anos, _ = _fonte()
+        return listar_anos()
+
+    except Exception as e:
+        st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
+        return []
+
+def congelar_dataset(df):
+    """
+    Mesmo DataFrame, montado com um array por coluna marcado como somente leitura
+    (sem copiar os dados). Escritas nos valores passam a falhar, então o objeto
+    pode ser compartilhado entre sessões; recortes via iloc e agregações criam
+    objetos novos normalmente.
+    """
+    colunas = {}
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # .codes já é uma visão somente leitura dos códigos
+            valores = pd.Categorical.from_codes(serie.array.codes, dtype=serie.dtype)
         else:
-            # Criar coluna usando KM_Rodados
-            df_bd['Total de Km'] = df_bd.get('KM_Rodados', 0)
-
-        df_bd['Total Geral Manutenção'] = df_bd[['Lataria e Pintura', 'Manutenção', 'Rodas / Pneus', 'Arla']].sum(axis=1)
-
-        rename_map = {
-            'Mês': 'data',
-            'Total Geral Manutenção': 'valor',
-            'GrupoCorreto': 'grupocorreto',
-            'Regiao Padronizada': 'regiao',
-            'Filial Padronizada': 'filial',
-            'Contrato': 'contrato',
-            'Lataria e Pintura': 'custo_lataria_pintura',
-            'Manutenção': 'custo_manutencao_geral',
-            'Rodas / Pneus': 'custo_rodas_pneus',
-            'Valor Comb.': 'custo_combustivel',
-            'Arla': 'custo_arla',
-            'Km Inicial': 'km_inicial',
-            'Km Final': 'km_final',
-            'Total de Km': 'total_km',
-            'Média Km/l': 'media_km_litro',
-            'Comb / Km': 'custo_comb_por_km',
-            'Litros Comb.': 'litros_combustivel',
-            'Man / Km': 'manutencao_por_km'
-        }
-        df_bd.rename(columns=rename_map, inplace=True)
-
-        df_bd['data'] = pd.to_datetime(df_bd['data'], unit='D', origin='1899-12-30')
-        df_bd.dropna(subset=['data'], inplace=True)
-        df_bd['valor'] = pd.to_numeric(df_bd['valor'], errors='coerce').fillna(0)
-        df_bd['ano'] = df_bd['data'].dt.year
-        df_bd = df_bd[df_bd['ano'] == 2025]
-        df_bd['mes_ano'] = df_bd['data'].dt.strftime('%Y-%m')
-        
-        # APLICAR LIMPEZA DOS DADOS AQUI (ANTES DAS OUTRAS TRANSFORMAÇÕES)
-        df_bd = limpar_dados_combustivel(df_bd)
-        df_bd = limpar_dados_tp_rota(df_bd)
-        df_bd = limpar_dados_grupo_veiculo(df_bd)
-        df_bd = limpar_dados_contratos(df_bd)
-        df_bd = filtrar_outliers_de_kml(df_bd)
-        
-        df_bd['Idade'] = datetime.now().year - pd.to_numeric(df_bd['Ano'], errors='coerce')
-
-        for col in ['grupocorreto', 'regiao', 'filial', 'contrato']:
-            if col in df_bd.columns:
-                df_bd[col] = df_bd[col].astype(str).str.strip().str.upper().replace('NAN', 'NÃO INFORMADO')
-
-        # Calcular colunas derivadas importantes
-        df_bd['custo_combustivel_total'] = df_bd['custo_combustivel']
-        df_bd['custo_frota_total'] = df_bd['valor'] + df_bd['custo_combustivel_total']
-
-        # Lista final de colunas incluindo dados de quilometragem e eficiência
-        colunas_finais = [
-            'data', 'valor', 'grupocorreto', 'regiao', 'filial',
-            'contrato', 'contrato_agrupado', 'ano', 'mes_ano', 'Placa', 'Idade',
-            'custo_lataria_pintura', 'custo_manutencao_geral', 'custo_rodas_pneus',
-            'custo_combustivel', 'custo_arla', 'custo_combustivel_total', 'custo_frota_total',
-            'Modelo', 'Marca', 'TP.Comb', 'TP.Rota',
-            'Roteiro Principal', 'Motorista Principal',
-            'Dias Úteis', 'DUC', 'DUK', 'DUL',
-            'km_inicial', 'km_final', 'total_km', 'media_km_litro', 'custo_comb_por_km',
-            'litros_combustivel', 'manutencao_por_km', 'KM_Rodados', 'media_km_litro_ajustado'
-        ]
-        df_final = df_bd[[col for col in colunas_finais if col in df_bd.columns]].copy()
-    
-        return df_final
+            valores = serie.to_numpy()
+            # Arrays object ficam graváveis: rotinas Cython do pandas (ex.: memory_usage deep) os recusam somente leitura
+            if valores.dtype != object:
+                valores.flags.writeable = False
+        colunas[col] = valores
+    congelado = pd.DataFrame(colunas, index=df.index, copy=False)
+    congelado.attrs.update(df.attrs)
+    return congelado
 
+# O dataset de cada recorte de anos é mantido uma única vez por processo e
+# compartilhado (somente leitura) por todas as sessões; cada sessão guarda só os
+# seus recortes filtrados.
+@st.cache_resource(ttl=3600, max_entries=4)
+def get_data(anos=None):
+    """Dataset limpo, só com os anos pedidos (tupla de anos; None = todos)."""
+    try:
+        _, carregar_dados = _fonte()
+        return congelar_dataset(carregar_dados(anos))
 
     except Exception as e:
-        st.error(f"Ocorreu um erro crítico ao processar a planilha: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
+        return pd.DataFrame()
+
+# Com FONTE_DADOS=sql as páginas não carregam os anos inteiros: cada estado de
+# filtro lê só as suas linhas, com os filtros no WHERE (ver src/config/base_painel.py).
+# A versão dos dados entra na chave para que uma tabela atualizada não sirva linhas antigas.
+@st.cache_resource(ttl=3600, max_entries=8)
+def get_recorte_sql(anos, filtros, versao):
+    """Linhas do estado de filtro ({dimensão: valor}, 'Todos' = sem filtro) lidas do banco, somente leitura."""
+    df_final = _fatos_sql(sql_provider.obter_engine(), anos, filtros)
+    df_final.attrs['versao_dados'] = versao
+    return congelar_dataset(df_final)
+
+@st.cache_data(ttl=3600, max_entries=4)
+def get_relatorio_memoria(anos=None):
+    return relatorio_memoria(get_data(anos))
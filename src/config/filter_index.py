@@ -0,0 +1,78 @@
+# src/config/filter_index.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Dimensões da cascata de filtros da sidebar, na ordem em que aparecem
+DIMENSOES_FILTRO = ['ano', 'mes_ano', 'regiao', 'filial']
+
+def _posicoes_por_valor(serie):
+    """
+    Mapeia cada valor da coluna para o array (ordenado) das posições das linhas
+    que o contêm. Linhas com valor nulo não entram em nenhum grupo.
+    """
+    codigos, valores = pd.factorize(serie, sort=True)
+    ordem = np.argsort(codigos, kind='stable')
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    inicio = int((codigos < 0).sum())  # nulos (código -1) ficam no começo da ordenação
+
+    posicoes = {}
+    for valor, contagem in zip(valores.tolist(), contagens):
+        grupo = ordem[inicio:inicio + contagem]
+        grupo.flags.writeable = False
+        posicoes[valor] = grupo
+        inicio += contagem
+    return posicoes
+
+def _opcoes_por_pai(df, pai, filho):
+    """Lista ordenada dos valores de `filho` presentes em cada valor de `pai`."""
+    pares = df[[pai, filho]].drop_duplicates().dropna()
+    return {
+        valor_pai: sorted(grupo[filho].tolist())
+        for valor_pai, grupo in pares.groupby(pai, observed=True)
+    }
+
+def construir_indice_filtros(df):
+    """
+    Pré-calcula, para cada dimensão da cascata, as posições das linhas por valor
+    e as opções de cada selectbox, para que a aplicação dos filtros não precise
+    varrer nem copiar o DataFrame a cada interação.
+    """
+    return {
+        'total_linhas': len(df),
+        'posicoes': {dim: _posicoes_por_valor(df[dim]) for dim in DIMENSOES_FILTRO},
+        'opcoes': {
+            'anos': sorted(df['ano'].dropna().unique().tolist(), reverse=True),
+            'meses_por_ano': _opcoes_por_pai(df, 'ano', 'mes_ano'),
+            'regioes': sorted(df['regiao'].dropna().unique().tolist()),
+            'filiais': sorted(df['filial'].dropna().unique().tolist()),
+            'filiais_por_regiao': _opcoes_por_pai(df, 'regiao', 'filial'),
+        },
+    }
+
+@st.cache_resource(max_entries=4)
+def obter_indice_filtros(_df, versao):
+    """Índice de filtros do dataset, construído uma única vez por versão dos dados."""
+    return construir_indice_filtros(_df)
+
+def resolver_filtros(indice, filtros):
+    """
+    Cruza as posições dos valores selecionados ({dimensão: valor}, 'Todos' = sem
+    filtro). Retorna as posições das linhas em ordem, ou None quando nenhum filtro
+    está ativo (o DataFrame completo deve ser usado como está).
+    """
+    resultado = None
+    for dim, valor in filtros.items():
+        if valor == 'Todos':
+            continue
+        posicoes = indice['posicoes'][dim].get(valor, np.empty(0, dtype=np.intp))
+        if resultado is None:
+            resultado = posicoes
+        else:
+            resultado = np.intersect1d(resultado, posicoes, assume_unique=True)
+    return resultado
+
+def aplicar_filtros(df, indice, filtros):
+    """Recorte do DataFrame correspondente aos filtros, via posições pré-calculadas."""
+    posicoes = resolver_filtros(indice, filtros)
+    return df if posicoes is None else df.iloc[posicoes]
@@ -0,0 +1,516 @@
+# src/config/kpi_engine.py
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from src.config.monthly_cube import somar_por, contar_placas, km_por_placa, rotulo_placa
+from src.config.series_mensais import (
+    SeriesMensais, atualizar_series, desvios_moveis, estatisticas_janela, medias_moveis, posicao_mes, valores_coluna
+)
+
+# --- MOTOR DE KPIs ---
+# Cálculo dos indicadores dos painéis sem nenhuma chamada ao Streamlit: as
+# funções recebem o histórico filtrado ou o recorte do cubo mensal e devolvem
+# dataclasses imutáveis (ou None quando não há o que calcular). Como não
+# dependem da sessão, os resultados podem ser memorizados pela chave de filtros
+# e calculados em outros processos; as funções exibir_* de calculations.py só
+# desenham o que recebem daqui.
+
+# Componentes do custo da frota: nome exibido -> coluna do cubo
+COLUNAS_CUSTO_RESUMO = {
+    'Combustível': 'custo_combustivel', 'Manutenção': 'custo_manutencao_geral',
+    'Pneus': 'custo_rodas_pneus', 'Lataria': 'custo_lataria_pintura', 'Arla': 'custo_arla'
+}
+# Colunas de custo dos KPIs de performance (Visão Geral, Manutenção e Combustível)
+COLUNAS_PERFORMANCE = ['custo_frota_total', 'valor', 'custo_combustivel_total']
+# Janela (em meses) da média móvel do custo por km nas tendências mensais
+JANELA_MEDIA_MOVEL = 3
+# Colunas da série mensal das tendências
+COLUNAS_TENDENCIA = ['custo_frota_total', 'custo_manutencao', 'custo_combustivel', 'total_km', 'custo_por_km']
+
+# --- VISÃO RESUMIDA ---
+
+@dataclass(frozen=True)
+class ResumoExecutivo:
+    """Números da Visão Resumida. Os dicionários de custo são indexados pelos nomes de COLUNAS_CUSTO_RESUMO."""
+    data_min: pd.Timestamp
+    data_max: pd.Timestamp
+    custo_total: float
+    custos_segmentados: dict
+    contagem_veiculos: int
+    total_registros: int
+    # Grupos ordenados pelo número de veículos: ((grupo, veículos), ...)
+    veiculos_por_grupo: tuple
+    meses_visiveis: int
+    # Mês do último dado do recorte e o anterior, sobre o cubo completo
+    custos_mes_atual: dict
+    custos_mes_anterior: dict
+    variacoes_mes_anterior: dict
+    # Estimativa anual (só com mais de um mês visível)
+    projecao_anual: Optional[float]
+    projecoes_componentes: dict
+    # Custo total, veículos e custo médio por grupo na ordem Leve, Médio, Pesado, Caminhão, outros
+    custo_por_grupo: Optional[pd.DataFrame]
+    # Custo total e componentes por filial, do maior para o menor
+    gastos_por_filial: pd.DataFrame
+
+def calcular_delta(atual, anterior):
+    """Variação percentual; 100% quando só o valor atual é positivo."""
+    if anterior > 0:
+        return ((atual - anterior) / anterior) * 100
+    elif atual > 0:
+        return 100.0
+    return 0.0
+
+def ordem_grupo(grupo):
+    """Posição do grupo de veículo na ordem lógica: 1 Leve, 2 Médio, 3 Pesado, 4 Caminhão, 5 outros."""
+    grupo_lower = str(grupo).lower()
+    if 'leve' in grupo_lower:
+        return 1
+    elif 'médio' in grupo_lower or 'medio' in grupo_lower:
+        return 2
+    elif 'pesado' in grupo_lower:
+        return 3
+    elif 'caminhão' in grupo_lower or 'caminhao' in grupo_lower:
+        return 4
+    return 5
+
+def calcular_resumo_executivo(cubo_filtrado, cubo_completo):
+    """
+    Totais, variações vs. mês anterior, estimativa anual e quebras por grupo e
+    filial da Visão Resumida. None se o recorte não tem dados.
+    """
+    celulas = cubo_filtrado['celulas']
+    if celulas.empty:
+        return None
+
+    data_min = celulas['data_min'].min()
+    data_max = celulas['data_max'].max()
+    custo_total = celulas['custo_frota_total'].sum()
+    meses_visiveis = celulas['mes_ano'].nunique()
+
+    # Mês atual e anterior (a partir do último dado do recorte) vêm do cubo completo
+    mes_atual_data = data_max.replace(day=1)
+    mes_anterior_data = (mes_atual_data - timedelta(days=1)).replace(day=1)
+    celulas_completo = cubo_completo['celulas']
+    celulas_mes_atual = celulas_completo[celulas_completo['mes_ano'] == mes_atual_data.strftime('%Y-%m')]
+    celulas_mes_anterior = celulas_completo[celulas_completo['mes_ano'] == mes_anterior_data.strftime('%Y-%m')]
+    custos_atuais = {nome: celulas_mes_atual[coluna].sum() for nome, coluna in COLUNAS_CUSTO_RESUMO.items()}
+    custos_anteriores = {nome: celulas_mes_anterior[coluna].sum() for nome, coluna in COLUNAS_CUSTO_RESUMO.items()}
+
+    projecao_anual, projecoes_componentes = None, {}
+    if meses_visiveis > 1:
+        projecao_anual = (custo_total / meses_visiveis) * 12
+        projecoes_componentes = {nome: (custos_atuais[nome] / meses_visiveis) * 12 for nome in COLUNAS_CUSTO_RESUMO}
+
+    veiculos_por_grupo = contar_placas(cubo_filtrado, 'grupocorreto').to_dict()
+
+    custo_por_grupo = None
+    if 'grupocorreto' in celulas.columns:
+        custo_por_grupo = somar_por(cubo_filtrado, 'grupocorreto', ['custo_frota_total']).rename(columns={'custo_frota_total': 'CustoTotal'})
+        custo_por_grupo['NumVeiculos'] = contar_placas(cubo_filtrado, 'grupocorreto')
+        custo_por_grupo = custo_por_grupo.reset_index()
+        custo_por_grupo['CustoMedio'] = custo_por_grupo.apply(lambda row: row['CustoTotal'] / row['NumVeiculos'] if row['NumVeiculos'] > 0 else 0, axis=1)
+        # astype(str): em colunas categóricas o apply devolveria outra categórica e a ordenação sairia errada
+        custo_por_grupo['ordem'] = custo_por_grupo['grupocorreto'].astype(str).apply(ordem_grupo)
+        custo_por_grupo = custo_por_grupo.sort_values('ordem')
+
+    # Custo total e os cinco componentes de todas as filiais numa única agregação
+    gastos_por_filial = somar_por(
+        cubo_filtrado, 'filial', ['custo_frota_total'] + list(COLUNAS_CUSTO_RESUMO.values())
+    ).sort_values('custo_frota_total', ascending=False)
+
+    return ResumoExecutivo(
+        data_min=data_min,
+        data_max=data_max,
+        custo_total=custo_total,
+        custos_segmentados={nome: celulas[coluna].sum() for nome, coluna in COLUNAS_CUSTO_RESUMO.items()},
+        contagem_veiculos=contar_placas(cubo_filtrado),
+        total_registros=int(celulas['n_registros'].sum()),
+        veiculos_por_grupo=tuple(sorted(veiculos_por_grupo.items(), key=lambda x: x[1], reverse=True)),
+        meses_visiveis=meses_visiveis,
+        custos_mes_atual=custos_atuais,
+        custos_mes_anterior=custos_anteriores,
+        variacoes_mes_anterior={nome: calcular_delta(custos_atuais[nome], custos_anteriores[nome]) for nome in COLUNAS_CUSTO_RESUMO},
+        projecao_anual=projecao_anual,
+        projecoes_componentes=projecoes_componentes,
+        custo_por_grupo=custo_por_grupo,
+        gastos_por_filial=gastos_por_filial,
+    )
+
+# --- PERFORMANCE MENSAL ---
+
+@dataclass(frozen=True)
+class KpisPerformance:
+    """KPIs de performance do mês selecionado de uma coluna de custo (vs. mês anterior e médias de 3/6/12 meses)."""
+    custo_mes_atual: float
+    custo_mes_anterior: float
+    diff_mes_anterior: float
+    var_perc_mes_anterior: float
+    media_3_meses: float
+    media_6_meses: float
+    media_12_meses: float
+    diff_media_3_meses: float
+    diff_media_6_meses: float
+    diff_media_12_meses: float
+    var_perc_media_3m: float
+    var_perc_media_6m: float
+    var_perc_media_12m: float
+    custo_dia_util_atual: float
+    custo_dia_util_anterior: float
+    diff_dia_util_anterior: float
+    media_dia_util_3m: float
+    diff_media_dia_util_3m: float
+    tendencia: str
+    total_veiculos: int
+    custo_por_veiculo: float
+
+def agregar_historico_mensal(df_historico, colunas_custo):
+    """
+    Série mensal (índice 'AAAA-MM' em ordem cronológica) usada pelos KPIs de performance:
+    soma de cada coluna de custo, Dias Úteis da primeira linha do mês, primeiro
+    Dias Úteis não nulo do mês e número de placas distintas.
+    """
+    grupos = df_historico.groupby('mes_ano', observed=True)
+    mensal = grupos[colunas_custo].sum()
+    mensal['placas'] = grupos['Placa'].nunique()
+    if 'Dias Úteis' in df_historico.columns:
+        primeira_linha = df_historico.drop_duplicates('mes_ano').set_index('mes_ano')['Dias Úteis']
+        mensal['dias_uteis_primeira_linha'] = primeira_linha
+        mensal['dias_uteis'] = grupos['Dias Úteis'].first()
+    mensal.index = mensal.index.astype(str)
+    return mensal.sort_index()
+
+def _kpis_performance_coluna(mensal, data_base, coluna_custo):
+    """KPIs de performance de uma coluna de custo, a partir da série mensal."""
+    mes_atual = data_base.strftime('%Y-%m')
+    mes_anterior = (data_base - relativedelta(months=1)).strftime('%Y-%m')
+    tres_meses_atras = (data_base - relativedelta(months=3)).strftime('%Y-%m')
+    seis_meses_atras = (data_base - relativedelta(months=6)).strftime('%Y-%m')
+    doze_meses_atras = (data_base - relativedelta(months=12)).strftime('%Y-%m')
+    tem_dias_uteis = 'dias_uteis' in mensal.columns
+
+    # Janelas: fatias da série mensal (meses em [início, mês selecionado))
+    def janela(inicio):
+        return mensal[(mensal.index >= inicio) & (mensal.index < mes_atual)]
+    ultimos_3_meses = janela(tres_meses_atras)
+
+    # Cálculos de custos
+    custo_mes_atual = mensal[coluna_custo].get(mes_atual, 0.0)
+    custo_mes_anterior = mensal[coluna_custo].get(mes_anterior, 0.0)
+    custo_ultimos_3_meses = ultimos_3_meses[coluna_custo].sum()
+    custo_ultimos_6_meses = janela(seis_meses_atras)[coluna_custo].sum()
+    custo_ultimos_12_meses = janela(doze_meses_atras)[coluna_custo].sum()
+
+    # Médias
+    media_3_meses = custo_ultimos_3_meses / 3 if custo_ultimos_3_meses > 0 else 0
+    media_6_meses = custo_ultimos_6_meses / 6 if custo_ultimos_6_meses > 0 else 0
+    media_12_meses = custo_ultimos_12_meses / 12 if custo_ultimos_12_meses > 0 else 0
+
+    # Dias úteis do mês: valor da primeira linha do mês (22 se ausente)
+    def dias_uteis_do_mes(mes):
+        if tem_dias_uteis and mes in mensal.index:
+            dias_uteis_value = mensal.at[mes, 'dias_uteis_primeira_linha']
+            return dias_uteis_value if pd.notna(dias_uteis_value) else 22  # Default para mês com 22 dias úteis
+        return 22  # Default
+
+    dias_uteis_atual = dias_uteis_do_mes(mes_atual)
+    dias_uteis_anterior = dias_uteis_do_mes(mes_anterior)
+
+    custo_dia_util_atual = custo_mes_atual / dias_uteis_atual if dias_uteis_atual > 0 else 0
+    custo_dia_util_anterior = custo_mes_anterior / dias_uteis_anterior if dias_uteis_anterior > 0 else 0
+
+    # Médias por dia útil - verificação mais robusta
+    if tem_dias_uteis and not ultimos_3_meses.empty:
+        soma_dias_uteis_3m = ultimos_3_meses['dias_uteis'].fillna(22).sum()  # Preencher valores nulos com 22
+    else:
+        soma_dias_uteis_3m = 66  # 3 meses * 22 dias úteis
+
+    media_dia_util_3m = custo_ultimos_3_meses / soma_dias_uteis_3m if soma_dias_uteis_3m > 0 else 0
+
+    # Cálculo de variação percentual
+    def variacao(referencia):
+        return ((custo_mes_atual - referencia) / referencia * 100) if referencia > 0 else 0
+
+    # Tendência (últimos 3 meses)
+    tendencia_meses = ultimos_3_meses[coluna_custo].values
+    tendencia = "Crescente" if len(tendencia_meses) > 1 and np.mean(np.diff(tendencia_meses)) > 0 else "Decrescente"
+
+    total_veiculos = mensal['placas'].get(mes_atual, 0)
+
+    return KpisPerformance(
+        custo_mes_atual=custo_mes_atual,
+        custo_mes_anterior=custo_mes_anterior,
+        diff_mes_anterior=custo_mes_atual - custo_mes_anterior,
+        var_perc_mes_anterior=variacao(custo_mes_anterior),
+        media_3_meses=media_3_meses,
+        media_6_meses=media_6_meses,
+        media_12_meses=media_12_meses,
+        diff_media_3_meses=custo_mes_atual - media_3_meses,
+        diff_media_6_meses=custo_mes_atual - media_6_meses,
+        diff_media_12_meses=custo_mes_atual - media_12_meses,
+        var_perc_media_3m=variacao(media_3_meses),
+        var_perc_media_6m=variacao(media_6_meses),
+        var_perc_media_12m=variacao(media_12_meses),
+        custo_dia_util_atual=custo_dia_util_atual,
+        custo_dia_util_anterior=custo_dia_util_anterior,
+        diff_dia_util_anterior=custo_dia_util_atual - custo_dia_util_anterior,
+        media_dia_util_3m=media_dia_util_3m,
+        diff_media_dia_util_3m=custo_dia_util_atual - media_dia_util_3m,
+        tendencia=tendencia,
+        total_veiculos=total_veiculos,
+        custo_por_veiculo=custo_mes_atual / total_veiculos if total_veiculos > 0 else 0,
+    )
+
+def calcular_kpis_performance(historico_mensal, ano_selecionado, mes_selecionado, coluna_custo):
+    """
+    KPIs de performance do mês selecionado (vs. mês anterior e médias de 3/6/12 meses),
+    a partir da série mensal do histórico (agregar_historico_mensal, com as colunas de custo).
+    `coluna_custo` pode ser uma coluna ou uma lista de colunas; com lista, retorna
+    {coluna: KpisPerformance}.
+    """
+    if mes_selecionado == 'Todos' or ano_selecionado == 'Todos':
+        return None
+    data_base = pd.to_datetime(f"{mes_selecionado}-01")
+    colunas_custo = [coluna_custo] if isinstance(coluna_custo, str) else list(coluna_custo)
+
+    kpis = {coluna: _kpis_performance_coluna(historico_mensal, data_base, coluna) for coluna in colunas_custo}
+    return kpis[coluna_custo] if isinstance(coluna_custo, str) else kpis
+
+@dataclass(frozen=True)
+class VariabilidadeCusto:
+    """Variabilidade e tendência da série mensal de custo (coeficiente de variação, amplitude e regressão linear)."""
+    coeficiente_variacao: float
+    # 'Estável' (CV < 15%), 'Moderada' (< 30%) ou 'Instável'
+    classificacao_cv: str
+    custo_max: float
+    custo_min: float
+    amplitude: float
+    inclinacao: float
+    r_quadrado: float
+    tendencia: str
+    # 'Forte' (R² > 0.5), 'Moderada' (> 0.2) ou 'Fraca'
+    forca_tendencia: str
+
+@dataclass(frozen=True)
+class EvolucaoPerformance:
+    """Últimos 12 meses de uma coluna de custo com médias móveis e, com mais de um mês, a variabilidade."""
+    # Colunas: mes_ano, a coluna de custo, Media_Movel_3M, Desvio_Movel_3M e Media_Movel_6M
+    evolucao_mensal: pd.DataFrame
+    variabilidade: Optional[VariabilidadeCusto]
+
+def series_historico(historico_mensal, colunas_custo=COLUNAS_PERFORMANCE, series_anterior=None):
+    """
+    Séries mensais (series_mensais.SeriesMensais) das colunas de custo da série mensal
+    do histórico (agregar_historico_mensal). Com a série da versão anterior dos dados,
+    só os meses novos ou alterados são acumulados.
+    """
+    return atualizar_series(series_anterior, historico_mensal[list(colunas_custo)])
+
+def calcular_evolucao_performance(series, mes_selecionado, coluna_custo):
+    """
+    Série a partir de 11 meses antes do selecionado, médias móveis de 3 e 6 meses,
+    desvio móvel de 3 meses e análise de variabilidade, lidas das séries mensais do
+    histórico (series_historico).
+    """
+    doze_meses_atras = (pd.to_datetime(f"{mes_selecionado}-01") - relativedelta(months=11)).strftime('%Y-%m')
+    inicio = posicao_mes(series, doze_meses_atras)
+
+    evolucao_mensal = pd.DataFrame({
+        'mes_ano': series.meses[inicio:],
+        coluna_custo: valores_coluna(series, coluna_custo)[inicio:],
+        'Media_Movel_3M': medias_moveis(series, coluna_custo, 3, inicio),
+        'Desvio_Movel_3M': desvios_moveis(series, coluna_custo, 3, inicio),
+        'Media_Movel_6M': medias_moveis(series, coluna_custo, 6, inicio),
+    })
+
+    if len(evolucao_mensal) < 2:
+        return EvolucaoPerformance(evolucao_mensal=evolucao_mensal, variabilidade=None)
+
+    # Coeficiente de variação e tendência pela regressão linear sobre os meses
+    estatisticas = estatisticas_janela(series, coluna_custo, inicio)
+    cv = estatisticas.coeficiente_variacao
+    classificacao_cv = "Estável" if cv < 15 else "Moderada" if cv < 30 else "Instável"
+    slope, r_squared = estatisticas.inclinacao, estatisticas.r_quadrado
+    forca_tendencia = "Forte" if r_squared > 0.5 else "Moderada" if r_squared > 0.2 else "Fraca"
+
+    return EvolucaoPerformance(
+        evolucao_mensal=evolucao_mensal,
+        variabilidade=VariabilidadeCusto(
+            coeficiente_variacao=cv,
+            classificacao_cv=classificacao_cv,
+            custo_max=estatisticas.maximo,
+            custo_min=estatisticas.minimo,
+            amplitude=estatisticas.maximo - estatisticas.minimo,
+            inclinacao=slope,
+            r_quadrado=r_squared,
+            tendencia="Crescente" if slope > 0 else "Decrescente",
+            forca_tendencia=forca_tendencia,
+        ),
+    )
+
+# --- TENDÊNCIAS MENSAIS ---
+
+@dataclass(frozen=True)
+class TendenciasMensais:
+    """Custos, km, veículos e custo por km de cada mês do recorte, em ordem cronológica."""
+    # Colunas: mes_ano, custo_frota_total, custo_manutencao, custo_combustivel, total_km,
+    # qtd_veiculos, custo_por_km e media_movel_custo_km (janela de JANELA_MEDIA_MOVEL meses)
+    custos_mensais: pd.DataFrame
+    # Séries mensais de COLUNAS_TENDENCIA (médias, desvios e regressão de qualquer janela)
+    series: SeriesMensais
+    janela_media_movel: int = JANELA_MEDIA_MOVEL
+
+def calcular_tendencias_mensais(cubo_filtrado, series_anterior=None):
+    """
+    Série mensal do recorte do cubo para as tendências comparativas. None com menos de dois meses.
+    Com as séries da versão anterior dos dados, só os meses novos ou alterados são acumulados.
+    """
+    celulas = cubo_filtrado['celulas']
+    if celulas.empty or celulas['mes_ano'].nunique() < 2:
+        return None
+
+    custos_mensais = somar_por(
+        cubo_filtrado, 'mes_ano', ['custo_frota_total', 'valor', 'custo_combustivel_total', 'total_km']
+    ).rename(columns={'valor': 'custo_manutencao', 'custo_combustivel_total': 'custo_combustivel'})
+    custos_mensais['qtd_veiculos'] = contar_placas(cubo_filtrado, 'mes_ano')
+    custos_mensais = custos_mensais.reset_index()
+
+    # Custo por KM (meses sem km ficam com 0)
+    custos_mensais['custo_por_km'] = custos_mensais['custo_frota_total'] / custos_mensais['total_km']
+    custos_mensais['custo_por_km'] = custos_mensais['custo_por_km'].replace([pd.NA, float('inf'), -float('inf')], 0)
+
+    custos_mensais = custos_mensais.sort_values('mes_ano', ascending=True)
+    series = atualizar_series(series_anterior, custos_mensais.set_index('mes_ano')[COLUNAS_TENDENCIA])
+    custos_mensais['media_movel_custo_km'] = medias_moveis(
+        series, 'custo_por_km', JANELA_MEDIA_MOVEL, min_periodos=JANELA_MEDIA_MOVEL
+    )
+    return TendenciasMensais(custos_mensais=custos_mensais, series=series)
+
+# --- KPIs OPERACIONAIS ---
+
+@dataclass(frozen=True)
+class KpisOperacionais:
+    """KPIs operacionais da aba Visão Geral. Campos opcionais ficam None quando não há dados."""
+    custo_total: float
+    custo_por_km: float
+    custo_por_dia_util: float
+    media_dias_uteis: float
+    total_dias_operacao: float
+    media_manutencao_por_km: float
+    total_categorias_contrato: int
+    # Eficiência de combustível (Km/L)
+    media_km_por_litro: Optional[float] = None
+    melhor_eficiencia_veiculo: Optional[str] = None
+    melhor_eficiencia_valor: Optional[float] = None
+    pior_eficiencia_veiculo: Optional[str] = None
+    pior_eficiencia_valor: Optional[float] = None
+    # Quilometragem por veículo
+    km_medio_por_veiculo: Optional[float] = None
+    total_km_frota: Optional[float] = None
+    veiculo_mais_rodou: Optional[str] = None
+    km_veiculo_mais_rodou: Optional[float] = None
+    # Contratos
+    contrato_maior_custo: Optional[str] = None
+    custo_contrato_maior: Optional[float] = None
+    percentual_contrato_maior: str = ""
+    contrato_mais_ativo: Optional[str] = None
+    num_veiculos_mais_ativo: Optional[int] = None
+    percentual_frota_ativa: str = ""
+    # Regiões
+    regiao_mais_eficiente: Optional[str] = None
+    custo_regiao_mais_eficiente: Optional[float] = None
+
+def calcular_kpis_operacionais(cubo_filtrado):
+    """
+    Calcula os KPIs operacionais a partir do recorte do cubo mensal: um único
+    total das células e um agrupamento por contrato, região e mês.
+    """
+    celulas = cubo_filtrado['celulas']
+    kpis = {}
+
+    # Totais do recorte (uma soma por coluna)
+    totais = celulas[['custo_frota_total', 'total_km', 'kml_soma', 'kml_contagem',
+                      'manutencao_por_km_soma', 'manutencao_por_km_contagem']].sum()
+    custo_total = totais['custo_frota_total']
+    total_km = totais['total_km']
+    total_veiculos_frota = contar_placas(cubo_filtrado)
+
+    # KPI 1: Eficiência de combustível (média e extremos guardados por célula)
+    if totais['kml_contagem'] > 0:
+        celulas_kml = celulas[celulas['kml_contagem'] > 0]
+        kpis['media_km_por_litro'] = totais['kml_soma'] / totais['kml_contagem']
+
+        # Melhor eficiência (MAIOR valor de Km/L; empate: primeira linha, como o idxmax)
+        melhor = celulas_kml.sort_values(['kml_max', 'pos_kml_max'], ascending=[False, True]).iloc[0]
+        kpis['melhor_eficiencia_veiculo'] = rotulo_placa(cubo_filtrado, int(melhor['placa_kml_max']))
+        kpis['melhor_eficiencia_valor'] = melhor['kml_max']
+
+        # Pior eficiência (MENOR valor de Km/L)
+        pior = celulas_kml.sort_values(['kml_min', 'pos_kml_min']).iloc[0]
+        kpis['pior_eficiencia_veiculo'] = rotulo_placa(cubo_filtrado, int(pior['placa_kml_min']))
+        kpis['pior_eficiencia_valor'] = pior['kml_min']
+
+    # KPI 2: Custo por Km
+    custo_por_km = custo_total / total_km if total_km > 0 else 0
+
+    # KPI 3: Quilometragem média por veículo
+    km_por_veiculo = km_por_placa(cubo_filtrado)
+    if not km_por_veiculo.empty:
+        kpis['km_medio_por_veiculo'] = km_por_veiculo.mean()
+        kpis['total_km_frota'] = km_por_veiculo.sum()
+        if km_por_veiculo.max() > 0:
+            kpis['veiculo_mais_rodou'] = km_por_veiculo.idxmax()
+            kpis['km_veiculo_mais_rodou'] = km_por_veiculo.max()
+
+    # KPI 4 e 5: Dias úteis (primeiro valor de cada mês) e custo por dia útil
+    dias_uteis_por_mes = celulas.sort_values('pos_dias_uteis').groupby('mes_ano', observed=True)['dias_uteis'].first()
+    dias_uteis_por_mes = pd.to_numeric(dias_uteis_por_mes, errors='coerce').fillna(0)
+    media_dias_uteis = dias_uteis_por_mes.mean() if not dias_uteis_por_mes.empty else 0
+    total_dias_operacao = dias_uteis_por_mes.sum() if not dias_uteis_por_mes.empty else 0
+    custo_por_dia_util = custo_total / total_dias_operacao if total_dias_operacao > 0 else 0
+
+    # KPI 6 e 7: Contratos - custo e atividade (número de veículos) num único agrupamento
+    por_contrato = somar_por(cubo_filtrado, 'contrato_agrupado', ['custo_frota_total'])
+    por_contrato['veiculos'] = contar_placas(cubo_filtrado, 'contrato_agrupado')
+
+    custo_por_contrato = por_contrato['custo_frota_total'].sort_values(ascending=False)
+    if not custo_por_contrato.empty and custo_por_contrato.iloc[0] > 0:
+        kpis['contrato_maior_custo'] = custo_por_contrato.index[0]
+        kpis['custo_contrato_maior'] = custo_por_contrato.iloc[0]
+        if custo_total > 0:
+            percentual = (kpis['custo_contrato_maior'] / custo_total) * 100
+            kpis['percentual_contrato_maior'] = f"{percentual:.1f}% do custo total"
+
+    veiculos_por_contrato = por_contrato['veiculos'].sort_values(ascending=False)
+    if not veiculos_por_contrato.empty:
+        kpis['contrato_mais_ativo'] = veiculos_por_contrato.index[0]
+        kpis['num_veiculos_mais_ativo'] = veiculos_por_contrato.iloc[0]
+        if total_veiculos_frota > 0:
+            percentual_frota = (kpis['num_veiculos_mais_ativo'] / total_veiculos_frota) * 100
+            kpis['percentual_frota_ativa'] = f"Utilizou {percentual_frota:.1f}% da frota"
+
+    # KPI 8: Custo de Manutenção por Km (média dos valores informados)
+    contagem_manutencao = totais['manutencao_por_km_contagem']
+    media_manutencao_por_km = totais['manutencao_por_km_soma'] / contagem_manutencao if contagem_manutencao > 0 else 0
+
+    # KPI 9: Eficiência Regional - região com o menor custo por km (ignora regiões sem km)
+    eficiencia_regional = somar_por(cubo_filtrado, 'regiao', ['custo_frota_total', 'total_km'])
+    eficiencia_regional = eficiencia_regional[eficiencia_regional['total_km'] > 0]
+    if not eficiencia_regional.empty:
+        custo_por_km_regional = eficiencia_regional['custo_frota_total'] / eficiencia_regional['total_km']
+        kpis['regiao_mais_eficiente'] = custo_por_km_regional.idxmin()
+        kpis['custo_regiao_mais_eficiente'] = custo_por_km_regional.min()
+
+    return KpisOperacionais(
+        custo_total=custo_total,
+        custo_por_km=custo_por_km,
+        custo_por_dia_util=custo_por_dia_util,
+        media_dias_uteis=media_dias_uteis,
+        total_dias_operacao=total_dias_operacao,
+        media_manutencao_por_km=media_manutencao_por_km,
+        total_categorias_contrato=int(celulas['contrato_agrupado'].nunique()),
+        **kpis
+    )
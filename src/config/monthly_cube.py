@@ -0,0 +1,216 @@
+# src/config/monthly_cube.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Grão do cubo: toda agregação dos painéis é uma combinação destas dimensões
+DIMENSOES_CUBO = ['mes_ano', 'regiao', 'filial', 'grupocorreto', 'contrato_agrupado', 'TP.Comb']
+
+# Colunas de custo e quilometragem somadas em cada célula
+COLUNAS_SOMA = [
+    'valor', 'custo_combustivel', 'custo_arla', 'custo_combustivel_total', 'custo_frota_total',
+    'custo_manutencao_geral', 'custo_rodas_pneus', 'custo_lataria_pintura',
+    'total_km', 'KM_Rodados', 'litros_combustivel'
+]
+
+def _codigos(serie):
+    """Códigos inteiros (-1 = nulo) e rótulos de uma coluna, na ordem das categorias."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codigos, rotulos = pd.factorize(serie, sort=True)
+    return codigos, pd.Index(rotulos)
+
+def _agregar_validos(valores, celula, n_celulas, agregacoes):
+    """Agrega por célula apenas os valores não nulos; o índice de cada valor é a posição da linha."""
+    validos = ~np.isnan(valores)
+    serie = pd.Series(valores[validos], index=np.flatnonzero(validos))
+    resultado = serie.groupby(celula[validos]).agg(agregacoes)
+    return resultado.reindex(range(n_celulas))
+
+def construir_cubo_mensal(df):
+    """
+    Agrega o dataset no grão (mes_ano, regiao, filial, grupocorreto, contrato_agrupado, TP.Comb).
+
+    Retorna um dicionário com:
+      - 'celulas': uma linha por combinação observada, com as somas de custo/km,
+        número de registros, período (data mín./máx.) e os agregados de Km/L,
+        Man/Km e Dias Úteis necessários aos KPIs;
+      - 'placas': pares (célula, placa) com o km somado, que permitem contar
+        placas distintas e somar km por veículo em qualquer recorte do cubo;
+      - 'rotulos_placa': rótulos correspondentes aos códigos de placa.
+    As posições guardadas (pos_*) são as das linhas no DataFrame de origem, usadas
+    para desempatar como o idxmax/first fariam sobre as linhas.
+    """
+    grupos = df.groupby(DIMENSOES_CUBO, observed=True, dropna=False, sort=True)
+    celula = grupos.ngroup().to_numpy()
+    n_celulas = grupos.ngroups
+    primeira_linha = np.unique(celula, return_index=True)[1]
+
+    celulas = df[DIMENSOES_CUBO + ['ano']].iloc[primeira_linha].reset_index(drop=True)
+    celulas['n_registros'] = np.bincount(celula, minlength=n_celulas)
+
+    colunas_soma = [col for col in COLUNAS_SOMA if col in df.columns]
+    somas = df[colunas_soma].groupby(celula).sum()
+    celulas[colunas_soma] = somas.to_numpy()
+
+    periodo = df['data'].groupby(celula).agg(['min', 'max'])
+    celulas['data_min'] = periodo['min'].to_numpy()
+    celulas['data_max'] = periodo['max'].to_numpy()
+
+    # Km/L: média (soma/contagem) e os extremos com a posição da primeira ocorrência
+    codigos_placa, rotulos_placa = _codigos(df['Placa'])
+    kml = _agregar_validos(df['media_km_litro_ajustado'].to_numpy(dtype=float), celula, n_celulas,
+                           ['sum', 'count', 'max', 'idxmax', 'min', 'idxmin'])
+    celulas['kml_soma'] = kml['sum'].fillna(0).to_numpy()
+    celulas['kml_contagem'] = kml['count'].fillna(0).astype(int).to_numpy()
+    for extremo in ('max', 'min'):
+        posicao = kml[f'idx{extremo}'].to_numpy()
+        celulas[f'kml_{extremo}'] = kml[extremo].to_numpy()
+        celulas[f'pos_kml_{extremo}'] = posicao
+        celulas[f'placa_kml_{extremo}'] = np.where(
+            np.isnan(posicao), -1, codigos_placa[np.nan_to_num(posicao).astype(int)]
+        )
+
+    manutencao = _agregar_validos(df['manutencao_por_km'].to_numpy(dtype=float), celula, n_celulas, ['sum', 'count'])
+    celulas['manutencao_por_km_soma'] = manutencao['sum'].fillna(0).to_numpy()
+    celulas['manutencao_por_km_contagem'] = manutencao['count'].fillna(0).astype(int).to_numpy()
+
+    # Dias Úteis: primeiro valor não nulo da célula (e sua posição, para o "first" por mês)
+    dias_uteis = pd.to_numeric(df['Dias Úteis'], errors='coerce').to_numpy(dtype=float)
+    validos = ~np.isnan(dias_uteis)
+    posicao = pd.Series(np.flatnonzero(validos)).groupby(celula[validos]).min().reindex(range(n_celulas)).to_numpy()
+    celulas['pos_dias_uteis'] = posicao
+    celulas['dias_uteis'] = np.where(np.isnan(posicao), np.nan, dias_uteis[np.nan_to_num(posicao).astype(int)])
+
+    com_placa = codigos_placa >= 0
+    placas = (
+        pd.DataFrame({
+            'celula': celula[com_placa],
+            'placa': codigos_placa[com_placa],
+            'km': df['total_km'].to_numpy()[com_placa],
+        })
+        .groupby(['celula', 'placa'], sort=True)['km'].sum()
+        .reset_index()
+    )
+
+    return {'celulas': celulas, 'placas': placas, 'rotulos_placa': rotulos_placa}
+
+# Agregados por (célula, placa) de que construir_cubo_agregado precisa, além das
+# somas de COLUNAS_SOMA e do número de registros: {rótulo: (função, coluna)}
+MEDIDAS_CUBO = {
+    'data_min': ('min', 'data'),
+    'data_max': ('max', 'data'),
+    'kml_soma': ('sum', 'media_km_litro_ajustado'),
+    'kml_contagem': ('count', 'media_km_litro_ajustado'),
+    'kml_max': ('max', 'media_km_litro_ajustado'),
+    'kml_min': ('min', 'media_km_litro_ajustado'),
+    'manutencao_por_km_soma': ('sum', 'manutencao_por_km'),
+    'manutencao_por_km_contagem': ('count', 'manutencao_por_km'),
+    'dias_uteis': ('min', 'Dias Úteis'),
+}
+
+def construir_cubo_agregado(agregado):
+    """
+    Mesmo cubo de construir_cubo_mensal, a partir de agregados já somados por
+    (DIMENSOES_CUBO, ano, Placa): n_registros, as somas de COLUNAS_SOMA e as
+    medidas de MEDIDAS_CUBO (ex.: calculados no banco com FONTE_DADOS=sql).
+    Sem as linhas de origem, as posições de desempate (pos_*) são as das linhas
+    do agregado em ordem de placa, e Dias Úteis é o menor valor da placa no mês.
+    """
+    agregado = agregado.sort_values(DIMENSOES_CUBO + ['Placa'], kind='stable').reset_index(drop=True)
+    grupos = agregado.groupby(DIMENSOES_CUBO, observed=True, dropna=False, sort=True)
+    celula = grupos.ngroup().to_numpy()
+    n_celulas = grupos.ngroups
+    primeira_linha = np.unique(celula, return_index=True)[1]
+
+    celulas = agregado[DIMENSOES_CUBO + ['ano']].iloc[primeira_linha].reset_index(drop=True)
+    colunas_soma = [col for col in COLUNAS_SOMA if col in agregado.columns]
+    somas = ['n_registros'] + colunas_soma
+    celulas[somas] = agregado[somas].groupby(celula).sum().to_numpy()
+    celulas['n_registros'] = celulas['n_registros'].astype(int)
+    celulas['data_min'] = agregado['data_min'].groupby(celula).min().to_numpy()
+    celulas['data_max'] = agregado['data_max'].groupby(celula).max().to_numpy()
+
+    codigos_placa, rotulos_placa = _codigos(agregado['Placa'])
+    contagens = agregado[['kml_soma', 'kml_contagem', 'manutencao_por_km_soma', 'manutencao_por_km_contagem']].groupby(celula).sum()
+    celulas['kml_soma'] = contagens['kml_soma'].to_numpy()
+    celulas['kml_contagem'] = contagens['kml_contagem'].astype(int).to_numpy()
+    for extremo in ('max', 'min'):
+        kml = _agregar_validos(agregado[f'kml_{extremo}'].to_numpy(dtype=float), celula, n_celulas,
+                               [extremo, f'idx{extremo}'])
+        posicao = kml[f'idx{extremo}'].to_numpy()
+        celulas[f'kml_{extremo}'] = kml[extremo].to_numpy()
+        celulas[f'pos_kml_{extremo}'] = posicao
+        celulas[f'placa_kml_{extremo}'] = np.where(
+            np.isnan(posicao), -1, codigos_placa[np.nan_to_num(posicao).astype(int)]
+        )
+    celulas['manutencao_por_km_soma'] = contagens['manutencao_por_km_soma'].to_numpy()
+    celulas['manutencao_por_km_contagem'] = contagens['manutencao_por_km_contagem'].astype(int).to_numpy()
+
+    dias_uteis = agregado['dias_uteis'].to_numpy(dtype=float)
+    validos = ~np.isnan(dias_uteis)
+    posicao = pd.Series(np.flatnonzero(validos)).groupby(celula[validos]).min().reindex(range(n_celulas)).to_numpy()
+    celulas['pos_dias_uteis'] = posicao
+    celulas['dias_uteis'] = np.where(np.isnan(posicao), np.nan, dias_uteis[np.nan_to_num(posicao).astype(int)])
+
+    com_placa = codigos_placa >= 0
+    placas = (
+        pd.DataFrame({
+            'celula': celula[com_placa],
+            'placa': codigos_placa[com_placa],
+            'km': agregado['total_km'].to_numpy()[com_placa],
+        })
+        .groupby(['celula', 'placa'], sort=True)['km'].sum()
+        .reset_index()
+    )
+
+    return {'celulas': celulas, 'placas': placas, 'rotulos_placa': rotulos_placa}
+
+@st.cache_resource(max_entries=4)
+def obter_cubo_mensal(_df, versao):
+    """Cubo mensal do dataset, construído uma única vez por versão dos dados."""
+    return construir_cubo_mensal(_df)
+
+def recortar_cubo(cubo, filtros):
+    """Recorte do cubo para os filtros da sidebar ({dimensão: valor}, 'Todos' = sem filtro)."""
+    celulas = cubo['celulas']
+    mascara = np.ones(len(celulas), dtype=bool)
+    for dim, valor in filtros.items():
+        if valor != 'Todos':
+            mascara &= (celulas[dim] == valor).to_numpy()
+    if mascara.all():
+        return cubo
+
+    celulas = celulas[mascara]
+    placas = cubo['placas']
+    placas = placas[np.isin(placas['celula'].to_numpy(), celulas.index.to_numpy())]
+    return {'celulas': celulas, 'placas': placas, 'rotulos_placa': cubo['rotulos_placa']}
+
+def rotulo_placa(cubo, codigo):
+    """Placa correspondente a um código do cubo (NaN para código -1)."""
+    return cubo['rotulos_placa'][codigo] if codigo >= 0 else np.nan
+
+def somar_por(cubo, por, colunas):
+    """Equivalente a df.groupby(por, observed=True)[colunas].sum() sobre as linhas do recorte."""
+    return cubo['celulas'].groupby(por, observed=True)[colunas].sum()
+
+def contar_placas(cubo, por=None):
+    """
+    Placas distintas do recorte: total (por=None) ou por dimensão, como o
+    groupby(por, observed=True)['Placa'].nunique() sobre as linhas.
+    """
+    placas = cubo['placas']
+    if por is None:
+        return int(np.unique(placas['placa'].to_numpy()).size)
+
+    grupos = cubo['celulas'].groupby(por, observed=True).size().index
+    chave = cubo['celulas'][por].loc[placas['celula'].to_numpy()].reset_index(drop=True)
+    contagem = placas['placa'].reset_index(drop=True).groupby(chave, observed=True).nunique()
+    return contagem.reindex(grupos, fill_value=0)
+
+def km_por_placa(cubo):
+    """Km somado por veículo no recorte, na ordem das placas (groupby('Placa')['total_km'].sum())."""
+    km = cubo['placas'].groupby('placa', sort=True)['km'].sum()
+    km.index = cubo['rotulos_placa'][km.index.to_numpy()]
+    km.index.name = 'Placa'
+    return km
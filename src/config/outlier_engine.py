@@ -0,0 +1,85 @@
+# src/config/outlier_engine.py
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# --- OUTLIERS DE CUSTO POR VEÍCULO ---
+# O custo total de cada veículo é somado uma única vez; cada veículo entra então
+# numa tabela longa com uma linha por segmento de comparação (a frota inteira,
+# o grupo, a filial e o modelo dele), e um único groupby(...).quantile calcula
+# Q1, mediana e Q3 de todos os grupos de todos os segmentos. As cercas de IQR
+# (Q1 - 1,5·IQR e Q3 + 1,5·IQR) classificam todos os veículos em todos os
+# segmentos de uma vez. Os outliers são da frota inteira: a classificação é
+# feita uma vez por período (ano e mês) sobre todos os veículos e memorizada
+# pela chave do período; região e filial só escolhem quais veículos exibir
+# (recortar_outliers), sem mudar as cercas. Sem chamadas ao Streamlit: o
+# resultado é imutável e pode ser compartilhado entre as sessões.
+
+# Segmentos de comparação: nome exibido -> coluna do veículo (None = frota inteira)
+SEGMENTOS_OUTLIER = {'Frota': None, 'Grupo': 'grupocorreto', 'Filial': 'filial', 'Modelo': 'Modelo'}
+# Atributos de cada veículo (primeiro valor não nulo no recorte)
+ATRIBUTOS_VEICULO = ['Modelo', 'Marca', 'grupocorreto', 'regiao', 'filial', 'Motorista Principal']
+FATOR_IQR = 1.5
+
+@dataclass(frozen=True)
+class OutliersCusto:
+    """Custo por veículo e a classificação de cada veículo em cada segmento de comparação."""
+    # Uma linha por veículo: Placa, ATRIBUTOS_VEICULO e custo_frota_total
+    veiculos: pd.DataFrame
+    # Uma linha por (segmento, veículo): segmento, grupo, Placa, custo_frota_total, q1, mediana,
+    # q3, limite_inferior, limite_superior, veiculos_grupo e situacao ('alto', 'baixo' ou 'normal')
+    classificacao: pd.DataFrame
+
+def totais_por_veiculo(df):
+    """Custo total e atributos de cada veículo, num único agrupamento por placa."""
+    agregacoes = {col: 'first' for col in ATRIBUTOS_VEICULO if col in df.columns}
+    agregacoes['custo_frota_total'] = 'sum'
+    return df.groupby('Placa', observed=True).agg(agregacoes).reset_index()
+
+def detectar_outliers(df, segmentos=SEGMENTOS_OUTLIER):
+    """Cercas de IQR de todos os grupos de cada segmento e a situação de cada veículo das linhas em cada um."""
+    return classificar_veiculos(totais_por_veiculo(df), segmentos)
+
+def classificar_veiculos(veiculos, segmentos=SEGMENTOS_OUTLIER):
+    """Classificação dos veículos (no formato de totais_por_veiculo) em cada grupo de cada segmento."""
+
+    # Tabela longa: o veículo repetido em cada segmento, com o grupo a que pertence nele
+    longa = pd.concat([
+        pd.DataFrame({
+            'segmento': segmento,
+            'grupo': segmento if coluna is None else veiculos[coluna].astype(object),
+            'Placa': veiculos['Placa'],
+            'custo_frota_total': veiculos['custo_frota_total'],
+        })
+        for segmento, coluna in segmentos.items()
+    ], ignore_index=True)
+
+    # Quartis de todos os grupos de todos os segmentos numa única passada
+    grupos = longa.groupby(['segmento', 'grupo'], dropna=False, sort=False)['custo_frota_total']
+    cercas = grupos.quantile([0.25, 0.5, 0.75]).unstack()
+    cercas.columns = ['q1', 'mediana', 'q3']
+    iqr = cercas['q3'] - cercas['q1']
+    cercas['limite_inferior'] = cercas['q1'] - FATOR_IQR * iqr
+    cercas['limite_superior'] = cercas['q3'] + FATOR_IQR * iqr
+    cercas['veiculos_grupo'] = grupos.size()
+
+    classificacao = longa.merge(cercas.reset_index(), on=['segmento', 'grupo'], how='left')
+    custo = classificacao['custo_frota_total']
+    classificacao['situacao'] = np.select(
+        [custo > classificacao['limite_superior'], custo < classificacao['limite_inferior']],
+        ['alto', 'baixo'], default='normal'
+    )
+    return OutliersCusto(veiculos=veiculos, classificacao=classificacao)
+
+def recortar_outliers(outliers, placas):
+    """Só os veículos das `placas` (as do estado de filtro), com as cercas calculadas na frota inteira."""
+    veiculos = outliers.veiculos[outliers.veiculos['Placa'].isin(placas)].reset_index(drop=True)
+    classificacao = outliers.classificacao[outliers.classificacao['Placa'].isin(placas)].reset_index(drop=True)
+    return OutliersCusto(veiculos=veiculos, classificacao=classificacao)
+
+def outliers_do_segmento(outliers, segmento):
+    """Classificação dos veículos no segmento, com os atributos de cada um."""
+    classificacao = outliers.classificacao
+    return classificacao[classificacao['segmento'] == segmento].merge(
+        outliers.veiculos.drop(columns='custo_frota_total'), on='Placa', how='left'
+    )
@@ -0,0 +1,99 @@
+# src/config/page_cache.py
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+import numpy as np
+import pandas as pd
+from plotly.basedatatypes import BaseFigure
+from src.config.filter_index import DIMENSOES_FILTRO
+
+# --- MEMO DAS PÁGINAS POR ESTADO DE FILTRO ---
+# Agregados e figuras prontas de cada página ficam num LRU do processo, com a
+# chave (cálculo, versão dos dados, filtros normalizados). Voltar a uma página
+# ou a uma combinação de filtros já vista não recalcula nada: só desenha.
+# O LRU é limitado pela memória estimada dos valores (MEMO_PAGINAS_MB no .env);
+# os valores são compartilhados entre as sessões e não devem ser alterados.
+LIMITE_MEMO_MB = float(os.getenv('MEMO_PAGINAS_MB', '256'))
+
+_itens = OrderedDict()
+_trava = threading.Lock()
+_contadores = {'acertos': 0, 'faltas': 0, 'descartes': 0, 'bytes': 0}
+
+def _normalizar(valor):
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+def chave_memo(versao, filtros):
+    """Chave do estado de filtro: versão dos dados e o valor de cada dimensão, em ordem fixa."""
+    return (versao,) + tuple(_normalizar(filtros.get(dim, 'Todos')) for dim in DIMENSOES_FILTRO)
+
+def _tamanho(obj):
+    """Memória estimada (bytes) de um valor memorizado."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, BaseFigure):
+        # Dados dos traços e layout como a figura os guarda (arrays pelo nbytes), sem serializá-la
+        return _tamanho(obj._data) + _tamanho(obj._layout)
+    if is_dataclass(obj):
+        return sys.getsizeof(obj) + sum(_tamanho(getattr(obj, campo.name)) for campo in fields(obj))
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_tamanho(chave) + _tamanho(valor) for chave, valor in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_tamanho(item) for item in obj)
+    return sys.getsizeof(obj)
+
+def memorizar(nome, chave, calcular, *args, **kwargs):
+    """
+    Resultado de calcular(*args, **kwargs) memorizado por (nome, chave). A chave
+    deve identificar tudo de que o resultado depende (em geral, chave_filtros);
+    os argumentos não entram nela. Valores maiores que o limite não são guardados.
+    """
+    item = (nome, chave)
+    with _trava:
+        if item in _itens:
+            _itens.move_to_end(item)
+            _contadores['acertos'] += 1
+            return _itens[item][0]
+        _contadores['faltas'] += 1
+
+    # Calculado fora da trava: sessões com outros filtros não esperam por este cálculo
+    valor = calcular(*args, **kwargs)
+    tamanho = _tamanho(valor)
+    limite = LIMITE_MEMO_MB * 1024 ** 2
+    if tamanho > limite:
+        return valor
+
+    with _trava:
+        if item in _itens:
+            _contadores['bytes'] -= _itens.pop(item)[1]
+        _itens[item] = (valor, tamanho)
+        _contadores['bytes'] += tamanho
+        while _contadores['bytes'] > limite:
+            _, (_, tamanho_descartado) = _itens.popitem(last=False)
+            _contadores['bytes'] -= tamanho_descartado
+            _contadores['descartes'] += 1
+    return valor
+
+def limpar_memo():
+    with _trava:
+        _itens.clear()
+        _contadores.update(acertos=0, faltas=0, descartes=0, bytes=0)
+
+def estatisticas_memo():
+    """Acertos, faltas, descartes (LRU), itens e memória ocupada do memo do processo."""
+    with _trava:
+        consultas = _contadores['acertos'] + _contadores['faltas']
+        return {
+            'acertos': _contadores['acertos'],
+            'faltas': _contadores['faltas'],
+            'taxa_acerto': _contadores['acertos'] / consultas if consultas else 0.0,
+            'descartes': _contadores['descartes'],
+            'itens': len(_itens),
+            'memoria_mb': _contadores['bytes'] / 1024 ** 2,
+            'limite_mb': LIMITE_MEMO_MB,
+        }
@@ -0,0 +1,134 @@
+# src/config/render_timing.py
+import time
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# --- TEMPOS DE RENDERIZAÇÃO DAS PÁGINAS ---
+# Cada rerun mede a página selecionada em seções (funções exibir_* e blocos
+# marcados com `secao`) e gráficos (chamadas de `plotly_chart`). O tempo de
+# cálculo é separado do de serialização das figuras (st.plotly_chart converte
+# a figura em JSON para o navegador). As amostras ficam no session_state,
+# limitadas às últimas MAX_AMOSTRAS por item, para os percentis entre reruns.
+CHAVE_SESSAO = '_tempos_renderizacao'
+MAX_AMOSTRAS = 200
+PERCENTIS = (50, 90, 99)
+
+# Medição do rerun em andamento (cada sessão roda o script na sua própria thread)
+_estado = threading.local()
+
+def _rerun():
+    return getattr(_estado, 'rerun', None)
+
+def _abrir_quadro(nome):
+    agora = time.perf_counter()
+    return {'nome': nome, 'inicio': agora, 'marca': agora, 'serializacao': 0.0}
+
+def _registrar(rerun, nome, tipo, computo, serializacao):
+    rerun['registros'].append({
+        'secao': nome, 'tipo': tipo, 'computo': computo, 'serializacao': serializacao
+    })
+
+def iniciar_pagina(pagina):
+    """Começa a medição da página do rerun atual (descarta a de um rerun interrompido)."""
+    _estado.rerun = {'pagina': pagina, 'registros': [], 'pilha': [_abrir_quadro(pagina)]}
+
+def finalizar_pagina():
+    """
+    Fecha a medição da página: registra o total (com o tempo fora das seções e
+    gráficos) e acumula as amostras do rerun no session_state.
+    """
+    rerun = _rerun()
+    if rerun is None:
+        return
+    _estado.rerun = None
+    pagina = rerun['pilha'][0]
+    total = time.perf_counter() - pagina['inicio']
+    _registrar(rerun, 'Total da página', 'página', total - pagina['serializacao'], pagina['serializacao'])
+
+    paginas = st.session_state.setdefault(CHAVE_SESSAO, {})
+    medida = paginas.setdefault(rerun['pagina'], {'ordem': [], 'itens': {}})
+    medida['ordem'] = []
+    for registro in rerun['registros']:
+        chave = (registro['secao'], registro['tipo'])
+        if chave not in medida['ordem']:
+            medida['ordem'].append(chave)
+        item = medida['itens'].setdefault(chave, {
+            'computo': deque(maxlen=MAX_AMOSTRAS), 'serializacao': deque(maxlen=MAX_AMOSTRAS)
+        })
+        item['computo'].append(registro['computo'])
+        item['serializacao'].append(registro['serializacao'])
+
+@contextmanager
+def secao(nome):
+    """
+    Mede um trecho da página. A serialização dos gráficos feitos dentro dele
+    é descontada do tempo de cálculo e somada à das seções que o contêm.
+    """
+    rerun = _rerun()
+    if rerun is None:
+        yield
+        return
+    quadro = _abrir_quadro(nome)
+    rerun['pilha'].append(quadro)
+    try:
+        yield
+    finally:
+        fim = time.perf_counter()
+        rerun['pilha'].pop()
+        _registrar(rerun, nome, 'seção', fim - quadro['inicio'] - quadro['serializacao'], quadro['serializacao'])
+        pai = rerun['pilha'][-1]
+        pai['serializacao'] += quadro['serializacao']
+        pai['marca'] = fim
+
+def cronometrar_secao(funcao):
+    """Decorador: cada chamada da função é uma seção com o nome dela."""
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        with secao(funcao.__name__):
+            return funcao(*args, **kwargs)
+    return envolvida
+
+def plotly_chart(fig, nome=None, **kwargs):
+    """
+    st.plotly_chart medido. O preparo do gráfico é o tempo desde o início da seção
+    (ou o fim do gráfico/seção anterior nela), já que as figuras são montadas logo
+    antes de serem exibidas; a serialização é o tempo da própria chamada.
+    """
+    rerun = _rerun()
+    if rerun is None:
+        return st.plotly_chart(fig, **kwargs)
+    quadro = rerun['pilha'][-1]
+    inicio = time.perf_counter()
+    resultado = st.plotly_chart(fig, **kwargs)
+    fim = time.perf_counter()
+
+    nome = nome or fig.layout.title.text or 'gráfico'
+    _registrar(rerun, f"{quadro['nome']} › {nome}", 'gráfico', inicio - quadro['marca'], fim - inicio)
+    quadro['serializacao'] += fim - inicio
+    quadro['marca'] = fim
+    return resultado
+
+def obter_tempos_pagina(pagina):
+    """
+    Tempos da página em ms (último rerun e percentis das amostras guardadas),
+    na ordem de execução do último rerun. DataFrame vazio se ela não foi medida.
+    """
+    medida = st.session_state.get(CHAVE_SESSAO, {}).get(pagina, {'ordem': [], 'itens': {}})
+    linhas = []
+    for nome, tipo in medida['ordem']:
+        item = medida['itens'][(nome, tipo)]
+        computo = np.array(item['computo']) * 1000
+        serializacao = np.array(item['serializacao']) * 1000
+        linha = {'secao': nome, 'tipo': tipo, 'amostras': len(computo),
+                 'computo_ms': computo[-1], 'serializacao_ms': serializacao[-1]}
+        for p in PERCENTIS:
+            linha[f'computo_p{p}'] = np.percentile(computo, p)
+        for p in PERCENTIS:
+            linha[f'serializacao_p{p}'] = np.percentile(serializacao, p)
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
@@ -0,0 +1,202 @@
+# src/config/series_mensais.py
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+
+# --- SÉRIES MENSAIS COM ESTATÍSTICAS DE JANELA ---
+# Cada série guarda, por coluna de custo, as somas acumuladas mês a mês de y,
+# y² e x·y (x = posição do mês), além da contagem de meses válidos. Com elas,
+# média, desvio, coeficiente de variação e a regressão linear (inclinação e R²)
+# de qualquer janela de meses saem em O(1), e as médias e desvios móveis de
+# todos os meses em O(n), sem refazer rolling/linregress a cada página.
+# Os valores são deslocados pelo primeiro mês válido de cada coluna antes de
+# acumular (as estatísticas não mudam com o deslocamento e as somas ficam
+# pequenas, sem cancelamento numérico). Meses sem valor (NaN) ficam de fora,
+# como no rolling do pandas.
+# Quando os dados ganham um mês novo (ou o último é revisado), a série é
+# atualizada a partir do primeiro mês alterado: os acumulados anteriores são
+# reaproveitados. As séries não são alteradas depois de criadas, então podem
+# ser compartilhadas entre sessões e memorizadas.
+
+@dataclass(frozen=True)
+class SeriesMensais:
+    """Valores mensais (meses 'AAAA-MM' em ordem) de várias colunas, com as somas acumuladas."""
+    meses: tuple
+    colunas: tuple
+    # (meses, colunas)
+    valores: np.ndarray
+    # Deslocamento de cada coluna (primeiro valor válido)
+    referencia: np.ndarray
+    # Acumulados (meses + 1, colunas); a linha 0 é zero e a linha i soma os meses [0, i)
+    validos: np.ndarray
+    soma: np.ndarray
+    soma_quadrados: np.ndarray
+    soma_xy: np.ndarray
+
+@dataclass(frozen=True)
+class EstatisticasJanela:
+    """Estatísticas de uma coluna numa janela de meses (meses sem valor ignorados)."""
+    meses: int
+    media: float
+    desvio: float
+    # Desvio / média, em %; 0 quando a média não é positiva
+    coeficiente_variacao: float
+    maximo: float
+    minimo: float
+    # Regressão linear do valor sobre a posição do mês (R² = 0 sem variação)
+    inclinacao: float
+    r_quadrado: float
+
+def _acumular(valores, referencia, posicao_inicial, base):
+    """Acumulados dos meses a partir de `posicao_inicial`, continuando a linha `base` dos anteriores."""
+    validos = ~np.isnan(valores)
+    desvios = np.where(validos, valores - referencia, 0.0)
+    posicoes = np.arange(posicao_inicial, posicao_inicial + len(valores), dtype=float)[:, None]
+    termos = (validos, desvios, desvios ** 2, desvios * posicoes)
+    return [np.vstack([linha_base, linha_base + np.cumsum(termo, axis=0)]) for linha_base, termo in zip(base, termos)]
+
+def _montar(meses, colunas, valores, referencia, acumulados):
+    validos, soma, soma_quadrados, soma_xy = acumulados
+    return SeriesMensais(
+        meses=tuple(meses), colunas=tuple(colunas), valores=valores, referencia=referencia,
+        validos=validos, soma=soma, soma_quadrados=soma_quadrados, soma_xy=soma_xy
+    )
+
+def construir_series(mensal):
+    """Séries do DataFrame mensal (índice = mês 'AAAA-MM' em ordem cronológica, uma coluna por série)."""
+    valores = mensal.to_numpy(dtype=float)
+    validos = ~np.isnan(valores)
+    primeiro_valido = validos.argmax(axis=0)
+    referencia = np.where(validos.any(axis=0), valores[primeiro_valido, np.arange(valores.shape[1])], 0.0)
+    zeros = [np.zeros(valores.shape[1])] * 4
+    acumulados = _acumular(valores, referencia, 0, zeros)
+    return _montar(mensal.index.astype(str), mensal.columns, valores, referencia, acumulados)
+
+def atualizar_series(series, mensal):
+    """
+    Séries do DataFrame mensal reaproveitando `series` (a versão anterior dos
+    mesmos dados): só os meses a partir do primeiro novo ou alterado são
+    acumulados de novo. Sem `series`, com outras colunas ou outro primeiro mês,
+    constrói do zero.
+    """
+    meses = tuple(mensal.index.astype(str))
+    if (series is None or tuple(mensal.columns) != series.colunas or not meses
+            or not series.meses or meses[0] != series.meses[0]):
+        return construir_series(mensal)
+
+    valores = mensal.to_numpy(dtype=float)
+    comuns = min(len(meses), len(series.meses))
+    iguais = (np.asarray(meses[:comuns]) == np.asarray(series.meses[:comuns])) & (
+        (valores[:comuns] == series.valores[:comuns]) | (np.isnan(valores[:comuns]) & np.isnan(series.valores[:comuns]))
+    ).all(axis=1)
+    posicao = comuns if iguais.all() else int(np.argmin(iguais))
+    if posicao == len(meses) == len(series.meses):
+        return series
+    if posicao == 0:
+        return construir_series(mensal)
+
+    anteriores = [series.validos, series.soma, series.soma_quadrados, series.soma_xy]
+    base = [acumulado[posicao] for acumulado in anteriores]
+    novos = _acumular(valores[posicao:], series.referencia, posicao, base)
+    acumulados = [np.vstack([acumulado[:posicao], novo]) for acumulado, novo in zip(anteriores, novos)]
+    return _montar(meses, series.colunas, valores, series.referencia, acumulados)
+
+def posicao_mes(series, mes):
+    """Posição do primeiro mês da série igual ou posterior a `mes` ('AAAA-MM')."""
+    return int(np.searchsorted(np.asarray(series.meses, dtype=object), mes, side='left')) if series.meses else 0
+
+def valores_coluna(series, coluna):
+    return series.valores[:, series.colunas.index(coluna)]
+
+def _somas_janelas(series, coluna, inicios, fins):
+    j = series.colunas.index(coluna)
+    return (
+        series.validos[fins, j] - series.validos[inicios, j],
+        series.soma[fins, j] - series.soma[inicios, j],
+        series.soma_quadrados[fins, j] - series.soma_quadrados[inicios, j],
+        series.referencia[j],
+    )
+
+def _janelas_moveis(series, janela, inicio):
+    """Limites [início, fim) da janela móvel de cada mês a partir de `inicio`, sem voltar antes dele."""
+    fins = np.arange(inicio + 1, len(series.meses) + 1)
+    return np.maximum(fins - janela, inicio), fins
+
+def medias_moveis(series, coluna, janela, inicio=0, min_periodos=1):
+    """Média móvel de `janela` meses de cada mês a partir de `inicio` (como rolling(janela, min_periods).mean() da fatia)."""
+    inicios, fins = _janelas_moveis(series, janela, inicio)
+    contagem, soma, _, referencia = _somas_janelas(series, coluna, inicios, fins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = referencia + soma / contagem
+    return np.where(contagem >= max(min_periodos, 1), medias, np.nan)
+
+def desvios_moveis(series, coluna, janela, inicio=0, min_periodos=2):
+    """Desvio padrão móvel (amostral) de `janela` meses de cada mês a partir de `inicio`."""
+    inicios, fins = _janelas_moveis(series, janela, inicio)
+    contagem, soma, soma_quadrados, _ = _somas_janelas(series, coluna, inicios, fins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variancias = np.maximum(soma_quadrados - soma ** 2 / contagem, 0.0) / (contagem - 1)
+    return np.where(contagem >= max(min_periodos, 2), np.sqrt(variancias), np.nan)
+
+def estatisticas_janela(series, coluna, inicio=0, fim=None):
+    """Média, desvio, CV, extremos e regressão linear da coluna nos meses [inicio, fim). None sem meses válidos."""
+    fim = len(series.meses) if fim is None else fim
+    j = series.colunas.index(coluna)
+    n = series.validos[fim, j] - series.validos[inicio, j]
+    if n == 0:
+        return None
+    soma = series.soma[fim, j] - series.soma[inicio, j]
+    soma_quadrados = series.soma_quadrados[fim, j] - series.soma_quadrados[inicio, j]
+    soma_xy = series.soma_xy[fim, j] - series.soma_xy[inicio, j]
+
+    # Somas dos quadrados centradas (invariantes ao deslocamento)
+    syy = max(soma_quadrados - soma ** 2 / n, 0.0)
+    media = series.referencia[j] + soma / n
+    desvio = np.sqrt(syy / (n - 1)) if n > 1 else np.nan
+
+    # Regressão sobre as posições dos meses válidos
+    janela = series.valores[inicio:fim, j]
+    validos = ~np.isnan(janela)
+    posicoes = np.arange(inicio, fim, dtype=float)[validos]
+    sxx = ((posicoes - posicoes.mean()) ** 2).sum()
+    sxy = soma_xy - posicoes.sum() * soma / n
+    inclinacao = sxy / sxx if sxx > 0 else np.nan
+    r_quadrado = min(sxy ** 2 / (sxx * syy), 1.0) if sxx > 0 and syy > 0 else 0.0
+
+    return EstatisticasJanela(
+        meses=int(n),
+        media=media,
+        desvio=desvio,
+        coeficiente_variacao=(desvio / media) * 100 if media > 0 and n > 1 else 0.0,
+        maximo=np.nanmax(janela),
+        minimo=np.nanmin(janela),
+        inclinacao=inclinacao,
+        r_quadrado=r_quadrado,
+    )
+
+# --- ÚLTIMA SÉRIE POR ESTADO DE FILTRO ---
+# Guarda a série mais recente de cada (nome, filtros), sem a versão dos dados:
+# quando a versão muda (mês novo na planilha ou no banco), a nova série parte
+# da anterior em vez de ser recalculada. Limitado às MAX_SERIES mais recentes.
+MAX_SERIES = 512
+
+_ultimas = OrderedDict()
+_trava = threading.Lock()
+
+def ultima_series(nome, chave):
+    """Última série guardada para `nome` e a chave de filtros (o primeiro elemento, a versão, é ignorado)."""
+    with _trava:
+        return _ultimas.get((nome, tuple(chave[1:])))
+
+def guardar_series(nome, chave, series):
+    with _trava:
+        item = (nome, tuple(chave[1:]))
+        _ultimas[item] = series
+        _ultimas.move_to_end(item)
+        while len(_ultimas) > MAX_SERIES:
+            _ultimas.popitem(last=False)
+
+def limpar_series():
+    with _trava:
+        _ultimas.clear()
@@ -0,0 +1,188 @@
+# src/config/sql_provider.py
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import sqlalchemy as sa
+import streamlit as st
+
+# --- CONEXÃO (configurada pelo .env) ---
+# SQL_URL tem prioridade (ex.: sqlite:///data/frota.db para desenvolvimento local);
+# sem ela, a URL do SQL Server é montada a partir de SQL_SERVIDOR, SQL_BANCO,
+# SQL_USUARIO/SQL_SENHA (ou autenticação integrada) e SQL_DRIVER.
+DRIVER_PADRAO = 'ODBC Driver 17 for SQL Server'
+TAMANHO_LOTE = 50_000
+
+def url_conexao():
+    url = os.getenv('SQL_URL')
+    if url:
+        return sa.engine.make_url(url)
+
+    consulta = {'driver': os.getenv('SQL_DRIVER', DRIVER_PADRAO)}
+    usuario = os.getenv('SQL_USUARIO')
+    if not usuario:
+        consulta['Trusted_Connection'] = 'yes'
+    return sa.engine.URL.create(
+        'mssql+pyodbc',
+        username=usuario,
+        password=os.getenv('SQL_SENHA'),
+        host=os.getenv('SQL_SERVIDOR'),
+        database=os.getenv('SQL_BANCO'),
+        query=consulta,
+    )
+
+@st.cache_resource
+def obter_engine():
+    """Engine com pool de conexões, compartilhada por todas as sessões do app."""
+    url = url_conexao()
+    opcoes = {'pool_pre_ping': True, 'pool_recycle': int(os.getenv('SQL_POOL_RECYCLE', 1800))}
+    if url.get_backend_name() != 'sqlite':
+        opcoes['pool_size'] = int(os.getenv('SQL_POOL_SIZE', 5))
+        opcoes['max_overflow'] = int(os.getenv('SQL_POOL_MAX_OVERFLOW', 10))
+    if url.get_backend_name() == 'mssql':
+        opcoes['fast_executemany'] = True
+    return sa.create_engine(url, **opcoes)
+
+# --- TABELA DE FATOS ---
+# Mesmas colunas do df_final do pipeline da planilha (uma linha por registro do BD)
+def tabela_fatos():
+    return sa.table(os.getenv('SQL_TABELA', 'frota_custos'), schema=os.getenv('SQL_SCHEMA') or None)
+
+COLUNAS_TEXTO = [
+    'grupocorreto', 'regiao', 'filial', 'contrato', 'contrato_agrupado', 'mes_ano', 'Placa',
+    'Modelo', 'Marca', 'TP.Comb', 'TP.Rota', 'Roteiro Principal', 'Motorista Principal',
+    'motivo_ajuste_kml'
+]
+
+def _tipar_lote(lote):
+    """Restaura os tipos do df_final (o driver devolve datas como texto no SQLite e NULLs como None)."""
+    lote['data'] = pd.to_datetime(lote['data'])
+    lote['ano'] = lote['ano'].astype('int32')
+    numericas = [col for col in lote.columns if col not in COLUNAS_TEXTO + ['data', 'ano']]
+    lote[numericas] = lote[numericas].apply(pd.to_numeric, errors='coerce').astype('float64')
+    return lote
+
+def _predicados(anos=None, filtros=None):
+    """
+    Cláusulas WHERE para os anos pedidos e os filtros da sidebar
+    ({'ano'|'mes_ano'|'regiao'|'filial': valor}, 'Todos' = sem filtro).
+    """
+    clausulas = []
+    if anos is not None:
+        clausulas.append(sa.column('ano').in_([int(ano) for ano in anos]))
+    for dim, valor in (filtros or {}).items():
+        if valor != 'Todos':
+            clausulas.append(sa.column(dim) == (int(valor) if dim == 'ano' else str(valor)))
+    return clausulas
+
+def anos_disponiveis(engine):
+    consulta = sa.select(sa.column('ano')).select_from(tabela_fatos()).distinct().order_by(sa.column('ano'))
+    with engine.connect() as conn:
+        return [int(ano) for ano in conn.execute(consulta).scalars()]
+
+def assinatura_dados(engine, anos=None):
+    """
+    Identifica a versão do recorte no banco (contagem, período e soma de valor),
+    para invalidar os caches derivados quando a tabela mudar.
+    """
+    consulta = (
+        sa.select(sa.func.count(), sa.func.min(sa.column('data')), sa.func.max(sa.column('data')),
+                  sa.func.sum(sa.column('valor')))
+        .select_from(tabela_fatos())
+        .where(*_predicados(anos))
+    )
+    with engine.connect() as conn:
+        resumo = conn.execute(consulta).one()
+    return 'sql-' + hashlib.sha256(repr(tuple(resumo)).encode()).hexdigest()[:16]
+
+def ler_fatos_em_lotes(engine, anos=None, filtros=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Itera os registros do recorte pedido, com os filtros aplicados no banco, em
+    DataFrames tipados de até `tamanho_lote` linhas (cursor no servidor).
+    """
+    consulta = (
+        sa.select(sa.literal_column('*'))
+        .select_from(tabela_fatos())
+        .where(*_predicados(anos, filtros))
+        .order_by(sa.column('ano'))
+    )
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for lote in pd.read_sql(consulta, conn, chunksize=tamanho_lote):
+            yield _tipar_lote(lote)
+
+def _colunas_do_lote(lote):
+    """Cada coluna do lote num array próprio (texto como Categorical), sem referência ao bloco do lote."""
+    return {
+        col: pd.Categorical(lote[col].astype(object)) if col in COLUNAS_TEXTO else lote[col].to_numpy(copy=True)
+        for col in lote.columns
+    }
+
+def ler_fatos(engine, anos=None, filtros=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Registros do recorte pedido, com os filtros aplicados no banco. Cada lote é
+    tipado, repartido em buffers por coluna (texto já compactado em categorias)
+    e descartado; no final as colunas são montadas uma a uma, então o pico de
+    memória fica perto do tamanho do DataFrame resultante.
+    """
+    buffers = {}
+    for lote in ler_fatos_em_lotes(engine, anos, filtros, tamanho_lote):
+        for col, valores in _colunas_do_lote(lote).items():
+            buffers.setdefault(col, []).append(valores)
+    colunas = {}
+    for col in list(buffers):
+        partes = buffers.pop(col)
+        if len(partes) == 1:
+            colunas[col] = partes[0]
+        elif isinstance(partes[0], pd.Categorical):
+            colunas[col] = union_categoricals(partes)
+        else:
+            colunas[col] = np.concatenate(partes)
+    return pd.DataFrame(colunas, copy=False)
+
+FUNCOES_AGREGACAO = {'sum': sa.func.sum, 'count': sa.func.count, 'min': sa.func.min, 'max': sa.func.max}
+
+def agregar_mensal(engine, colunas, por=('mes_ano',), anos=None, filtros=None, medidas=None):
+    """
+    Somas mensais calculadas no banco: uma linha por combinação de `por`
+    (por padrão, o mes_ano), com as colunas pedidas somadas, o número
+    de registros, o de placas distintas e as `medidas` extras
+    ({rótulo: (função, coluna)}, funções de FUNCOES_AGREGACAO). Como no groupby
+    do pandas, somas e contagens sem valores dão 0; min/max sem valores, NaN.
+    min/max de colunas de texto devolvem o próprio texto.
+    """
+    medidas = medidas or {}
+    dimensoes = [sa.column(dim) for dim in por]
+    consulta = (
+        sa.select(
+            *dimensoes,
+            *[sa.func.sum(sa.column(col)).label(col) for col in colunas],
+            sa.func.count().label('n_registros'),
+            sa.func.count(sa.distinct(sa.column('Placa'))).label('placas'),
+            *[FUNCOES_AGREGACAO[funcao](sa.column(col)).label(rotulo) for rotulo, (funcao, col) in medidas.items()],
+        )
+        .select_from(tabela_fatos())
+        .where(*_predicados(anos, filtros))
+        .group_by(*dimensoes)
+        .order_by(*dimensoes)
+    )
+    with engine.connect() as conn:
+        agregado = pd.read_sql(consulta, conn)
+
+    # Mesmos tipos do df_final (o SQLite devolve datas como texto)
+    for rotulo, (funcao, col) in medidas.items():
+        if col == 'data':
+            agregado[rotulo] = pd.to_datetime(agregado[rotulo])
+        elif col not in COLUNAS_TEXTO or funcao == 'count':
+            agregado[rotulo] = pd.to_numeric(agregado[rotulo], errors='coerce').astype('float64')
+    somas = list(colunas) + [rotulo for rotulo, (funcao, _) in medidas.items() if funcao in ('sum', 'count')]
+    agregado[somas] = agregado[somas].apply(pd.to_numeric, errors='coerce').fillna(0.0)
+    if 'ano' in por:
+        agregado['ano'] = agregado['ano'].astype('int32')
+    return agregado
+
+def publicar_dataset(df_final, engine, tamanho_lote=TAMANHO_LOTE):
+    """Grava o df_final do pipeline da planilha na tabela de fatos (substituindo o conteúdo)."""
+    tabela = tabela_fatos()
+    df_final.to_sql(tabela.name, engine, schema=tabela.schema, if_exists='replace',
+                    index=False, chunksize=tamanho_lote)
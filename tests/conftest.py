@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Os testes importam os módulos como o app (src.config..., benchmarks...), a partir da raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
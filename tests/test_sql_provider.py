@@ -0,0 +1,163 @@
+# tests/test_sql_provider.py
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+from benchmarks.gerador_frota import gerar_df_final
+from src.config import sql_provider
+from src.config.base_painel import _veiculos_sql
+from src.config.data_provider import _fatos_sql, converter_para_categorico
+from src.config.kpi_engine import COLUNAS_PERFORMANCE, agregar_historico_mensal, calcular_kpis_operacionais
+from src.config.monthly_cube import (
+    COLUNAS_SOMA, DIMENSOES_CUBO, MEDIDAS_CUBO, construir_cubo_agregado, construir_cubo_mensal
+)
+from src.config.outlier_engine import ATRIBUTOS_VEICULO, classificar_veiculos, detectar_outliers, totais_por_veiculo
+
+# Banco SQLite em memória no lugar do SQL Server, com o df_final do pipeline da
+# planilha (frota sintética dos benchmarks) publicado na tabela de fatos.
+N_LINHAS = 6_000
+ORDEM = ['ano', 'data', 'Placa', 'valor', 'custo_frota_total', 'total_km', 'litros_combustivel']
+
+
+@pytest.fixture(scope='module')
+def df_final():
+    return gerar_df_final(N_LINHAS)
+
+
+def _banco(df):
+    engine = sa.create_engine('sqlite://')
+    sql_provider.publicar_dataset(df, engine)
+    return engine
+
+
+@pytest.fixture(scope='module')
+def engine(df_final):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.delenv('SQL_SCHEMA', raising=False)
+        mp.delenv('SQL_TABELA', raising=False)
+        yield _banco(df_final)
+
+
+def _ordenar(df):
+    df = df.copy()
+    for col in df.select_dtypes(include='category').columns:
+        df[col] = df[col].astype(object)
+    return df.sort_values(ORDEM, kind='stable').reset_index(drop=True)
+
+
+def _recorte(df, filtros):
+    mascara = np.ones(len(df), dtype=bool)
+    for dim, valor in filtros.items():
+        if valor != 'Todos':
+            mascara &= (df[dim] == valor).to_numpy()
+    return df[mascara]
+
+
+def test_anos_disponiveis(engine, df_final):
+    assert sql_provider.anos_disponiveis(engine) == sorted(int(ano) for ano in df_final['ano'].unique())
+
+
+def test_ler_fatos_sem_filtros_reproduz_o_df_final(engine, df_final):
+    lido = _fatos_sql(engine, None)
+    assert list(lido.columns) == list(df_final.columns)
+    assert dict(lido.dtypes.astype(str)) == dict(df_final.dtypes.astype(str))
+    pd.testing.assert_frame_equal(_ordenar(lido), _ordenar(df_final))
+
+
+def test_ler_fatos_em_lotes_pequenos(engine, df_final):
+    # Vários lotes por consulta: as colunas de texto são unidas com union_categoricals
+    lido = sql_provider.ler_fatos(engine, tamanho_lote=500)
+    assert len(lido) == len(df_final)
+    assert isinstance(lido['Placa'].dtype, pd.CategoricalDtype)
+    assert set(lido['Placa'].dropna()) == set(df_final['Placa'].dropna().astype(str))
+    assert np.isclose(lido['custo_frota_total'].sum(), df_final['custo_frota_total'].sum())
+
+
+@pytest.mark.parametrize('dimensoes', [['ano'], ['ano', 'mes_ano', 'regiao'], ['regiao', 'filial']])
+def test_ler_fatos_com_filtros(engine, df_final, dimensoes):
+    # Valores da primeira linha nas dimensões filtradas; as demais ficam em 'Todos'
+    linha = df_final.iloc[0]
+    filtros = {dim: linha[dim] if dim in dimensoes else 'Todos' for dim in ['ano', 'mes_ano', 'regiao', 'filial']}
+    esperado = _recorte(df_final, filtros)
+    lido = _fatos_sql(engine, None, filtros)
+    assert len(esperado) > 0
+    pd.testing.assert_frame_equal(_ordenar(lido), _ordenar(esperado), check_dtype=False)
+
+
+def test_ler_fatos_sem_linhas_mantem_as_colunas(engine, df_final):
+    lido = sql_provider.ler_fatos(engine, anos=[1999])
+    assert lido.empty
+    assert list(lido.columns) == list(df_final.columns)
+
+
+def test_agregar_mensal(engine, df_final):
+    filtros = {'ano': 'Todos', 'mes_ano': 'Todos', 'regiao': 'SUL', 'filial': 'Todos'}
+    agregado = sql_provider.agregar_mensal(engine, COLUNAS_PERFORMANCE, anos=[2024, 2025], filtros=filtros)
+
+    linhas = _recorte(df_final[df_final['ano'].isin([2024, 2025])], filtros)
+    grupos = linhas.groupby('mes_ano', observed=True)
+    esperado = grupos[COLUNAS_PERFORMANCE].sum()
+    esperado.index = esperado.index.astype(str)
+
+    assert agregado['mes_ano'].tolist() == esperado.index.tolist()
+    np.testing.assert_allclose(agregado[COLUNAS_PERFORMANCE].to_numpy(), esperado.to_numpy())
+    assert agregado['n_registros'].tolist() == grupos.size().tolist()
+    assert agregado['placas'].tolist() == grupos['Placa'].nunique().tolist()
+
+
+def test_agregar_mensal_com_medidas_reproduz_o_historico(engine, df_final):
+    agregado = sql_provider.agregar_mensal(engine, COLUNAS_PERFORMANCE, medidas={'dias_uteis': ('min', 'Dias Úteis')})
+    esperado = agregar_historico_mensal(df_final, COLUNAS_PERFORMANCE)
+    # Na frota sintética, Dias Úteis é o mesmo em todas as linhas do mês
+    np.testing.assert_allclose(agregado['dias_uteis'].to_numpy(), esperado['dias_uteis'].to_numpy())
+    np.testing.assert_allclose(agregado['placas'].to_numpy(), esperado['placas'].to_numpy())
+
+
+def test_cubo_agregado_no_banco_igual_ao_cubo_do_df(engine, df_final):
+    agregado = sql_provider.agregar_mensal(
+        engine, COLUNAS_SOMA, por=DIMENSOES_CUBO + ['ano', 'Placa'], medidas=MEDIDAS_CUBO
+    )
+    cubo_sql = construir_cubo_agregado(converter_para_categorico(agregado))
+    cubo_df = construir_cubo_mensal(df_final)
+
+    celulas_sql, celulas_df = cubo_sql['celulas'], cubo_df['celulas']
+    assert len(celulas_sql) == len(celulas_df)
+    for dim in DIMENSOES_CUBO:
+        assert celulas_sql[dim].astype(str).tolist() == celulas_df[dim].astype(str).tolist()
+    colunas = COLUNAS_SOMA + ['n_registros', 'kml_soma', 'kml_contagem', 'kml_max', 'kml_min', 'dias_uteis']
+    np.testing.assert_allclose(celulas_sql[colunas].to_numpy(dtype=float), celulas_df[colunas].to_numpy(dtype=float))
+    assert (celulas_sql['data_min'] == celulas_df['data_min']).all()
+    pd.testing.assert_frame_equal(cubo_sql['placas'], cubo_df['placas'], check_dtype=False)
+    assert calcular_kpis_operacionais(cubo_sql) == calcular_kpis_operacionais(cubo_df)
+
+
+def test_outliers_do_periodo_no_banco_iguais_aos_do_df(engine, df_final):
+    periodo = {'ano': 2025, 'mes_ano': 'Todos'}
+    veiculos = _veiculos_sql(engine, None, periodo)
+    linhas = _recorte(df_final, periodo)
+    esperado = totais_por_veiculo(linhas)
+
+    assert veiculos['Placa'].tolist() == esperado['Placa'].astype(str).tolist()
+    np.testing.assert_allclose(veiculos['custo_frota_total'].to_numpy(), esperado['custo_frota_total'].to_numpy())
+    # min/max de texto devolvem texto; o atributo é o maior valor do veículo no período
+    maiores = linhas[ATRIBUTOS_VEICULO].astype(object).groupby(linhas['Placa'], observed=True).max()
+    assert veiculos[ATRIBUTOS_VEICULO].astype(str).values.tolist() == maiores.astype(str).values.tolist()
+
+    situacao_sql = classificar_veiculos(veiculos).classificacao
+    situacao_df = detectar_outliers(linhas).classificacao
+    frota_sql, frota_df = (c[c['segmento'] == 'Frota'] for c in (situacao_sql, situacao_df))
+    assert frota_sql['situacao'].tolist() == frota_df['situacao'].tolist()
+
+
+def test_assinatura_dados_muda_com_a_tabela(df_final, monkeypatch):
+    monkeypatch.delenv('SQL_SCHEMA', raising=False)
+    monkeypatch.delenv('SQL_TABELA', raising=False)
+    engine = _banco(df_final.head(500))
+    assinatura = sql_provider.assinatura_dados(engine)
+    assert sql_provider.assinatura_dados(engine) == assinatura
+    assert sql_provider.assinatura_dados(engine, anos=[2024]) != assinatura
+
+    with engine.begin() as conn:
+        conn.execute(sa.text(f"UPDATE {sql_provider.tabela_fatos().name} SET valor = valor + 1"))
+    assert sql_provider.assinatura_dados(engine) != assinatura